@@ -3,7 +3,7 @@
 环境变量、API密钥等配置
 """
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import Dict, List, Optional
 
 class Settings(BaseSettings):
     # API 配置
@@ -19,12 +19,50 @@ class Settings(BaseSettings):
     # Redis 配置
     redis_url: str = "redis://localhost:6379"
     redis_db: int = 0
+    # 会话状态编码：json / msgpack；压缩：none / zlib / zstd / lz4（超过阈值字节才压缩）
+    session_state_encoding: str = "msgpack"
+    session_state_compression: str = "zstd"
+    session_state_compress_threshold: int = 512
     
     # DeepSeek API 配置
     deepseek_api_key: Optional[str] = None
+    deepseek_api_keys: Optional[str] = None  # 密钥池：多个密钥用逗号分隔
     deepseek_base_url: str = "https://api.deepseek.com"
     deepseek_model: str = "deepseek-chat"  # 默认模型
     
+    # LLM 对冲请求配置（仅用于候选问题、信息抽取等短小的非流式调用；
+    # 候选问题默认走流式生成，见 candidate_question_streaming）
+    llm_hedge_enabled: bool = True
+    llm_hedge_percentile: float = 0.9  # 主请求超过该分位延迟后发出对冲请求
+    llm_hedge_budget_ratio: float = 0.1  # 对冲请求最多占可对冲调用的比例
+    
+    # 密钥池冷却时间（秒）
+    llm_key_rate_limit_cooldown: float = 30.0  # 429 且响应未给出 retry-after 时的冷却时间
+    llm_key_auth_cooldown: float = 600.0  # 认证失败后的冷却时间
+    
+    # 自适应超时配置：超时 = 调用点延迟的 timeout_percentile 分位数 × timeout_multiplier
+    timeout_percentile: float = 0.99
+    timeout_multiplier: float = 1.5
+    # 调用点超时覆盖（JSON），例如 {"bocha_search": [30, 3, 30]}，依次为默认值、下限、上限
+    timeout_bounds: Dict[str, List[float]] = {}
+    
+    # 请求级时间预算（秒）：路由内所有下游调用共享，客户端断开或超时后取消剩余工作
+    request_timeout_interactive: float = 90.0  # /ai/chat、/memories 等交互请求
+    request_timeout_search: float = 300.0  # /search/family
+    request_timeout_report: float = 600.0  # /generate/*、/export/*
+    request_timeout_batch: float = 300.0  # /ai/batch 批量导入访谈
+    request_timeout_cohort: float = 3600.0  # /cohort/batch 宗亲批量生成报告
+    request_disconnect_poll_interval: float = 1.0  # 检测客户端断开的间隔
+    ws_idle_timeout: float = 900.0  # /ai/ws 连接空闲（未收到回答）多久后关闭，释放内存中的会话状态
+    
+    # 出站 HTTP 连接池（博查搜索、即梦图片、PDF 图片下载共用）
+    http_max_connections: int = 100
+    http_max_keepalive_connections: int = 20
+    http_default_timeout: float = 30.0
+    # 启动预热：失败只记录日志，不阻止服务启动
+    warmup_on_startup: bool = True
+    warmup_timeout: float = 5.0  # 每项预热的最长等待时间（秒）
+    
     # 博查API配置（联网搜索）
     bocha_api_key: Optional[str] = None
     bocha_api_base_url: str = "https://api.bochaai.com/v1"
@@ -42,6 +80,30 @@ class Settings(BaseSettings):
     # 其他配置
     session_expire_seconds: int = 3600  # 会话过期时间（秒）
     min_questions: int = 5  # 最少问答轮数（至少问5轮）
+    # 问题库：按 FLOW 步骤、语气和用户分组预生成的问题模板，首问直接从中取用
+    question_bank_enabled: bool = True
+    question_bank_size: int = 12  # 每个问题库的模板数
+    question_bank_ttl: int = 7 * 24 * 3600  # 问题库在 Redis 中的过期时间（秒），超过未刷新则退回兜底问法
+    question_bank_refresh_interval: float = 24 * 3600  # 后台刷新间隔（秒），0 表示只用脚本手动刷新
+    question_bank_refresh_concurrency: int = 4  # 刷新时同时生成的问题库数
+    # 流式生成候选问题，第一个可用问题完整后即停止生成。流式调用不做对冲：
+    # 开启时候选问题的尾延迟靠提前返回压低，llm_hedge_* 只作用于信息抽取；关闭时候选问题恢复对冲
+    candidate_question_streaming: bool = True
+    question_dedup_threshold: float = 0.45  # 候选问题与已问问题的字符二元组相似度达到该值即视为重复
+    memory_cards_max: int = 12  # 增量合并后最多保留的记忆卡片数
+    batch_max_pairs: int = 500  # /ai/batch 单次最多导入的问答数
+    batch_extract_max_chars: int = 12000  # 批量抽取时每次提示词中访谈记录的最大字符数
+    cohort_max_members: int = 1000  # /cohort/batch 单次最多导入的成员数
+    cohort_search_concurrency: int = 2  # 同时进行的分组搜索数
+    cohort_report_concurrency: int = 4  # 同时生成的个人报告数
+    report_chapter_retries: int = 2  # 报告单个章节生成失败后的重试次数（只重试该章节）
+    report_chapter_min_chars: int = 80  # 章节正文少于该字数视为生成失败
+    timeline_coverage_threshold: float = 0.75  # 本地推导的时间轴主题覆盖率低于该值时调用 LLM 补充空档
+    timeline_gap_years: int = 300  # 相邻事件相隔超过该年数视为年代空档
+    timeline_min_events: int = 3  # 时间轴至少包含的事件数
+    timeline_max_events: int = 20  # 时间轴最多包含的事件数
+    clan_graph_enabled: bool = True  # 全局宗族图谱：同姓且籍贯或堂号相符的会话引用已有宗族节点，不再重复分析和搜索
+    clan_reuse_ttl: float = 30 * 24 * 3600  # 宗族节点的分析和搜索结果可直接复用的时长（秒），过期后重新分析并刷新节点
     
     class Config:
         env_file = ".env"
@@ -1,27 +1,37 @@
 """
 数据库依赖注入
-MongoDB 和 Redis 连接管理
+MongoDB、Redis 和出站 HTTP 连接池管理
+motor / redis / httpx 在第一次建立连接时才导入，缩短应用启动时间
 """
-from motor.motor_asyncio import AsyncIOMotorClient
-from redis import asyncio as aioredis
 from app.config import settings
-from typing import Optional
+from typing import TYPE_CHECKING, Optional
 import logging
 
+if TYPE_CHECKING:
+    import httpx
+    from motor.motor_asyncio import AsyncIOMotorClient
+    from redis import asyncio as aioredis
+
 logger = logging.getLogger(__name__)
 
 # MongoDB 客户端
-_mongodb_client: Optional[AsyncIOMotorClient] = None
+_mongodb_client: Optional["AsyncIOMotorClient"] = None
 _mongodb_db = None
 
 # Redis 客户端
-_redis_client: Optional[aioredis.Redis] = None
+_redis_client: Optional["aioredis.Redis"] = None
+# 二进制 Redis 客户端（不做 UTF-8 解码，用于 msgpack / 压缩后的会话状态）
+_redis_binary_client: Optional["aioredis.Redis"] = None
+
+# 出站 HTTP 客户端（博查搜索、即梦图片等共用一个连接池）
+_http_client: Optional["httpx.AsyncClient"] = None
 
 
-async def get_mongodb_client() -> AsyncIOMotorClient:
+async def get_mongodb_client() -> "AsyncIOMotorClient":
     """获取 MongoDB 客户端"""
     global _mongodb_client
     if _mongodb_client is None:
+        from motor.motor_asyncio import AsyncIOMotorClient
         _mongodb_client = AsyncIOMotorClient(settings.mongodb_url)
         logger.info(f"Connected to MongoDB: {settings.mongodb_url}")
     return _mongodb_client
@@ -36,10 +46,11 @@ async def get_mongodb_db():
     return _mongodb_db
 
 
-async def get_redis() -> aioredis.Redis:
+async def get_redis() -> "aioredis.Redis":
     """获取 Redis 客户端"""
     global _redis_client
     if _redis_client is None:
+        from redis import asyncio as aioredis
         _redis_client = await aioredis.from_url(
             settings.redis_url,
             db=settings.redis_db,
@@ -49,14 +60,49 @@ async def get_redis() -> aioredis.Redis:
     return _redis_client
 
 
+async def get_redis_binary() -> "aioredis.Redis":
+    """获取返回原始字节的 Redis 客户端"""
+    global _redis_binary_client
+    if _redis_binary_client is None:
+        from redis import asyncio as aioredis
+        _redis_binary_client = await aioredis.from_url(
+            settings.redis_url,
+            db=settings.redis_db,
+            decode_responses=False
+        )
+    return _redis_binary_client
+
+
+async def get_http_client() -> "httpx.AsyncClient":
+    """获取共享的出站 HTTP 客户端（超时由调用方按请求传入）"""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        import httpx
+        _http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=settings.http_max_connections,
+                max_keepalive_connections=settings.http_max_keepalive_connections,
+            ),
+            timeout=settings.http_default_timeout,
+        )
+    return _http_client
+
+
 async def close_db_connections():
-    """关闭数据库连接"""
-    global _mongodb_client, _redis_client
+    """关闭数据库连接和 HTTP 连接池"""
+    global _mongodb_client, _mongodb_db, _redis_client, _redis_binary_client, _http_client
     if _mongodb_client:
         _mongodb_client.close()
         _mongodb_client = None
+        _mongodb_db = None
     if _redis_client:
         await _redis_client.close()
         _redis_client = None
+    if _redis_binary_client:
+        await _redis_binary_client.close()
+        _redis_binary_client = None
+    if _http_client:
+        await _http_client.aclose()
+        _http_client = None
     logger.info("Database connections closed")
 
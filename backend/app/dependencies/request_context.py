@@ -0,0 +1,124 @@
+"""
+请求上下文依赖注入
+在路由中创建请求级的截止时间和取消上下文：客户端断开连接或时间预算用完时，
+取消该请求尚未完成的搜索 / LLM 调用，释放 worker 和第三方 API 配额
+"""
+import asyncio
+import time
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Optional
+
+from fastapi import Request
+
+from app.config import settings
+from app.utils import deadline
+from app.utils.deadline import DeadlineExceeded
+from app.utils.logger import logger
+
+
+class RequestCancelled(Exception):
+    """客户端已断开连接，请求被取消"""
+
+
+def cancellation_status(exc: Exception) -> int:
+    """取消 / 超出预算对应的状态码：客户端断开 499（沿用 nginx 的约定），预算用完 504"""
+    return 499 if isinstance(exc, RequestCancelled) else 504
+
+
+_current_context: ContextVar[Optional["RequestContext"]] = ContextVar("request_context", default=None)
+
+
+class RequestContext:
+    """单个请求的截止时间与取消状态"""
+
+    def __init__(self, request: Optional[Request] = None, timeout: Optional[float] = None):
+        self.request = request
+        # 与外层（X-Request-Timeout 头）已设置的截止时间取更早者
+        outer = deadline.get_deadline()
+        own = time.monotonic() + timeout if timeout is not None else None
+        candidates = [d for d in (outer, own) if d is not None]
+        self.deadline: Optional[float] = min(candidates) if candidates else None
+        self.cancel_reason: Optional[str] = None
+
+    def remaining(self) -> Optional[float]:
+        if self.deadline is None:
+            return None
+        return self.deadline - time.monotonic()
+
+    @property
+    def cancelled(self) -> bool:
+        return self.cancel_reason is not None
+
+    def check(self, stage: str = "") -> None:
+        """检查点：请求已取消或预算已用完时抛出异常，避免继续做无用功"""
+        if self.cancel_reason == "disconnected":
+            raise RequestCancelled(f"客户端已断开连接{f'（{stage}）' if stage else ''}")
+        left = self.remaining()
+        if self.cancel_reason == "deadline" or (left is not None and left <= 0):
+            raise DeadlineExceeded(f"请求时间预算已用完{f'（{stage}）' if stage else ''}")
+
+    async def _watch(self, task: asyncio.Task) -> None:
+        """监视客户端连接和截止时间，必要时取消任务"""
+        poll = settings.request_disconnect_poll_interval
+        while not task.done():
+            left = self.remaining()
+            await asyncio.sleep(poll if left is None else max(0.0, min(poll, left)))
+            if task.done():
+                return
+            left = self.remaining()
+            if left is not None and left <= 0:
+                self.cancel_reason = "deadline"
+            elif self.request is not None and await self.request.is_disconnected():
+                self.cancel_reason = "disconnected"
+            if self.cancel_reason:
+                logger.info(f"取消请求剩余工作: {self.cancel_reason} ({self.request.url.path if self.request else ''})")
+                task.cancel()
+                return
+
+    async def run(self, awaitable: Awaitable[Any]) -> Any:
+        """
+        在该上下文中执行路由的业务逻辑
+        下游服务通过 contextvars 拿到截止时间（网关超时、checkpoint 检查）
+        """
+        token = _current_context.set(self)
+        try:
+            with deadline.deadline_scope(self.remaining()):
+                task = asyncio.ensure_future(awaitable)
+                watcher = asyncio.create_task(self._watch(task))
+                try:
+                    return await task
+                except asyncio.CancelledError:
+                    if self.cancel_reason:
+                        self.check()
+                    raise
+                finally:
+                    watcher.cancel()
+        finally:
+            _current_context.reset(token)
+
+
+def current_context() -> Optional[RequestContext]:
+    """当前请求上下文（不在请求中时为 None）"""
+    return _current_context.get()
+
+
+def checkpoint(stage: str = "") -> None:
+    """
+    服务层检查点：在开始昂贵的下一阶段（搜索、LLM、写库）前调用
+    请求已取消或预算用完时抛出 RequestCancelled / DeadlineExceeded
+    """
+    ctx = _current_context.get()
+    if ctx is not None:
+        ctx.check(stage)
+    else:
+        deadline.check(stage)
+
+
+def request_context(timeout: Optional[float] = None) -> Callable[[Request], RequestContext]:
+    """
+    生成 FastAPI 依赖：为路由创建带时间预算的请求上下文
+    用法：ctx: RequestContext = Depends(request_context(settings.request_timeout_report))
+    """
+    def _dependency(request: Request) -> RequestContext:
+        return RequestContext(request, timeout)
+    return _dependency
@@ -0,0 +1,182 @@
+"""
+应用资源容器
+在应用生命周期（lifespan）内统一创建、预热和关闭 MongoDB、Redis、LLM 客户端和出站 HTTP 连接池，
+并通过 FastAPI 依赖把共享的服务实例注入到路由
+"""
+import asyncio
+from contextlib import asynccontextmanager
+from functools import cached_property
+from typing import List, Optional
+
+from fastapi import FastAPI
+
+from app.config import settings
+from app.dependencies.db import (
+    close_db_connections,
+    get_http_client,
+    get_mongodb_db,
+    get_redis,
+    get_redis_binary,
+)
+from app.repositories.clan_repository import clan_repository
+from app.repositories.question_bank_repository import question_bank_repository
+from app.repositories.report_repository import report_repository
+from app.repositories.session_repository import session_repository
+from app.services.ai_service import AIService
+from app.services.cohort_service import CohortService
+from app.services.gateway_service import GatewayService
+from app.services.graph_service import GraphService
+from app.services.output_service import OutputService
+from app.services.search_service import SearchService
+from app.utils.logger import logger
+
+
+class Resources:
+    """
+    进程内共享的服务实例（所有服务共用同一个 GatewayService）
+    服务在第一次被用到时才构建，导入应用和启动时不做多余的初始化
+    """
+
+    def __init__(self):
+        self._background_tasks: List[asyncio.Task] = []
+
+    @cached_property
+    def gateway_service(self) -> GatewayService:
+        return GatewayService()
+
+    @cached_property
+    def graph_service(self) -> GraphService:
+        return GraphService()
+
+    @cached_property
+    def ai_service(self) -> AIService:
+        return AIService(gateway_service=self.gateway_service)
+
+    @cached_property
+    def search_service(self) -> SearchService:
+        return SearchService(gateway_service=self.gateway_service)
+
+    @cached_property
+    def output_service(self) -> OutputService:
+        return OutputService(
+            ai_service=self.ai_service,
+            graph_service=self.graph_service,
+            gateway_service=self.gateway_service,
+            search_service=self.search_service,
+        )
+
+    @cached_property
+    def cohort_service(self) -> CohortService:
+        return CohortService(
+            ai_service=self.ai_service,
+            search_service=self.search_service,
+            output_service=self.output_service,
+        )
+
+    async def startup(self) -> None:
+        """建立并预热连接；任何一项失败都只记录警告，不阻止启动"""
+        if not settings.warmup_on_startup:
+            return
+        timeout = settings.warmup_timeout
+        try:
+            db = await get_mongodb_db()
+            await asyncio.wait_for(db.command("ping"), timeout)
+            # 建索引同样受预热超时约束，MongoDB 响应慢时不阻塞启动
+            await asyncio.wait_for(asyncio.gather(
+                session_repository.ensure_indexes(),
+                report_repository.ensure_indexes(),
+                clan_repository.ensure_indexes(),
+            ), timeout)
+        except Exception as e:
+            logger.warning(f"MongoDB 预热失败（不影响启动）: {e!r}")
+        try:
+            redis = await get_redis()
+            await asyncio.wait_for(redis.ping(), timeout)
+            # 会话状态使用的二进制客户端是独立的连接池
+            redis_binary = await get_redis_binary()
+            await asyncio.wait_for(redis_binary.ping(), timeout)
+        except Exception as e:
+            logger.warning(f"Redis 预热失败（不影响启动）: {e}")
+        try:
+            await get_http_client()
+            self.gateway_service.warm_up()
+        except Exception as e:
+            logger.warning(f"LLM / HTTP 客户端预热失败（不影响启动）: {e}")
+        logger.info("Application resources warmed up")
+        if settings.question_bank_enabled and settings.question_bank_refresh_interval > 0:
+            self._background_tasks.append(asyncio.create_task(self._refresh_question_bank_loop()))
+
+    async def _refresh_question_bank_loop(self) -> None:
+        """后台定期刷新问题库（多进程部署时每个周期只有一个进程真正调用 LLM）"""
+        interval = settings.question_bank_refresh_interval
+        while True:
+            try:
+                if await question_bank_repository.claim_refresh(interval):
+                    await self.ai_service.refresh_question_bank()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"问题库后台刷新失败: {e}")
+            await asyncio.sleep(interval)
+
+    async def shutdown(self) -> None:
+        """停止后台任务，关闭 LLM 客户端、HTTP 连接池和数据库连接"""
+        for task in self._background_tasks:
+            task.cancel()
+        await asyncio.gather(*self._background_tasks, return_exceptions=True)
+        self._background_tasks = []
+        try:
+            if "gateway_service" in self.__dict__:
+                await self.gateway_service.aclose()
+        except Exception as e:
+            logger.warning(f"关闭 LLM 客户端失败: {e}")
+        await close_db_connections()
+
+
+_resources: Optional[Resources] = None
+
+
+def get_resources() -> Resources:
+    """获取资源容器（未经过 lifespan 启动时按需创建，例如测试中）"""
+    global _resources
+    if _resources is None:
+        _resources = Resources()
+    return _resources
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """FastAPI lifespan：启动时预热，关闭时释放连接"""
+    resources = get_resources()
+    await resources.startup()
+    try:
+        yield
+    finally:
+        await resources.shutdown()
+
+
+# --------------------------
+# FastAPI 依赖
+# --------------------------
+def get_gateway_service() -> GatewayService:
+    return get_resources().gateway_service
+
+
+def get_ai_service() -> AIService:
+    return get_resources().ai_service
+
+
+def get_search_service() -> SearchService:
+    return get_resources().search_service
+
+
+def get_graph_service() -> GraphService:
+    return get_resources().graph_service
+
+
+def get_output_service() -> OutputService:
+    return get_resources().output_service
+
+
+def get_cohort_service() -> CohortService:
+    return get_resources().cohort_service
@@ -2,15 +2,23 @@
 FastAPI 应用入口文件
 启动服务器
 """
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from app.config import settings
-from app.routers import user, ai_chat, search, generate, export, gateway, health, session, memories
+from app.dependencies.request_context import RequestCancelled, cancellation_status
+from app.dependencies.resources import lifespan
+from app.utils.deadline import DeadlineExceeded, deadline_scope
+from app.utils.serialization import FastJSONResponse
+from app.routers import user, ai_chat, search, generate, export, gateway, health, session, memories, cohort
 
 app = FastAPI(
     title="RootJourney API",
     description="家族历史探索平台 API",
-    version="1.0.0"
+    version="1.0.0",
+    # 启动时预热 MongoDB / Redis / LLM / HTTP 连接池，关闭时统一释放
+    lifespan=lifespan,
+    # 响应体使用 orjson（未安装时退回标准库）序列化
+    default_response_class=FastJSONResponse
 )
 
 # 配置CORS - 允许前端访问
@@ -29,6 +37,28 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def request_deadline(request: Request, call_next):
+    """
+    请求时间预算：客户端可通过 X-Request-Timeout 头（秒）声明愿意等待的时间，
+    该请求内的所有下游调用（LLM、搜索、图片）的超时都不会超过剩余预算
+    """
+    budget = None
+    header = request.headers.get("x-request-timeout")
+    if header:
+        try:
+            budget = max(0.0, float(header))
+        except ValueError:
+            budget = None
+    with deadline_scope(budget):
+        return await call_next(request)
+
+@app.exception_handler(RequestCancelled)
+@app.exception_handler(DeadlineExceeded)
+async def request_aborted(request: Request, exc: Exception):
+    """客户端断开或时间预算用完：各路由直接抛出，这里统一转换为 499 / 504"""
+    return FastJSONResponse(status_code=cancellation_status(exc), content={"detail": str(exc)})
+
 # 注册路由
 app.include_router(user.router)
 app.include_router(ai_chat.router)
@@ -37,6 +67,7 @@ app.include_router(generate.router)
 app.include_router(export.router)
 app.include_router(session.router)  # 会话管理（查看和保存档案）
 app.include_router(memories.router)  # 记忆总结
+app.include_router(cohort.router)  # 宗亲批量导入和报告
 app.include_router(health.router)  # 健康检查和测试
 
 @app.get("/")
@@ -0,0 +1,313 @@
+"""
+宗族图谱数据访问层
+跨会话共享、去重的宗族和人物节点：同一支宗族（如琅琊王氏）按 (姓氏, 郡望 / 地区) 得到固定的规范 ID，
+只做一次大家族分析和历史搜索，之后同姓且籍贯或堂号相符的会话直接引用已有节点；
+会话与宗族的关联单独存放在 clan_links 中，可以反查同一宗族下的全部会话
+"""
+import re
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from app.dependencies.db import get_mongodb_db
+from app.repositories.session_repository import ASCENDING, DESCENDING
+from app.utils.date_extraction import get_date_extractor
+from app.utils.fingerprint import fingerprint
+from app.utils.logger import logger
+
+
+CLANS = "clans"
+CLAN_PERSONS = "clan_persons"
+CLAN_LINKS = "clan_links"
+
+# 集合 -> [(索引键, 索引名)]
+CLAN_INDEXES: Dict[str, List[Tuple[List[Tuple[str, int]], str]]] = {
+    # 按姓氏 + 地区 / 堂号查宗族，也支持只按地区或堂号查
+    CLANS: [
+        ([("surname", ASCENDING), ("region_keys", ASCENDING)], "surname_region"),
+        ([("surname", ASCENDING), ("halls", ASCENDING)], "surname_hall"),
+        ([("region_keys", ASCENDING)], "region"),
+        ([("halls", ASCENDING)], "hall"),
+    ],
+    CLAN_PERSONS: [
+        ([("clan_id", ASCENDING), ("start", ASCENDING)], "clan_start"),
+        ([("name", ASCENDING)], "name"),
+    ],
+    # 某宗族下的会话（按关联时间倒序）、某会话关联的宗族
+    CLAN_LINKS: [
+        ([("clan_id", ASCENDING), ("linked_at", DESCENDING)], "clan_linked_at"),
+        ([("session_id", ASCENDING)], "session"),
+    ],
+}
+
+# 三个字的省级地名，其余省级地名取前两个字
+_LONG_PROVINCES = ("黑龙江", "内蒙古")
+_REGION_SPLIT_RE = re.compile(r"[、，,/;；\s]+|以及")
+_ADMIN_SUFFIX_RE = re.compile(r"特别行政区|自治区|自治州|地区|省|市|县")
+# 名称中紧挨“X氏”前的两个字视为郡望（琅琊王氏、太原王氏），这些词和含虚词的除外（“历史上的陈氏”）
+_NOT_CHORONYMS = {"历史", "著名", "中国", "古代", "当地", "本地", "一支", "家族", "传统", "江南", "南方", "北方"}
+_FUNCTION_CHARS = set("的之是个和与在为了于属即如这那")
+# 堂号：明确说“堂号”的，或紧跟在“X氏”后的“XX堂”
+_HALL_RE = re.compile(r"堂号[^。！？\n，,；;]{0,6}?([一-鿿]{2})堂|氏([一-鿿]{2})堂")
+
+
+def _normalize_region(region: str) -> str:
+    return _ADMIN_SUFFIX_RE.sub("", (region or "").strip())
+
+
+def _province(region: str) -> str:
+    return region[:3] if region.startswith(_LONG_PROVINCES) else region[:2]
+
+
+def split_regions(regions: Iterable[str]) -> Tuple[List[str], List[str]]:
+    """把籍贯 / 主要地区拆成 (去掉行政区划后缀的地名, 所在省份)，都去重保序；“山东省临沂市” -> 山东临沂 / 山东"""
+    places: List[str] = []
+    provinces: List[str] = []
+    for region in regions:
+        for part in _REGION_SPLIT_RE.split(str(region or "")):
+            place = _normalize_region(part)
+            if len(place) < 2:
+                continue
+            if place not in places:
+                places.append(place)
+            province = _province(place)
+            if province not in provinces:
+                provinces.append(province)
+    return places, provinces
+
+
+def region_keys(regions: Iterable[str]) -> List[str]:
+    """宗族节点上用于索引查询的地区键：地名本身和所在省份"""
+    places, provinces = split_regions(regions)
+    return list(dict.fromkeys(places + provinces))
+
+
+def extract_halls(texts: Iterable[str]) -> List[str]:
+    """文本中提到的堂号（只保留堂名前两个字，如“三槐堂” -> 三槐），去重保序"""
+    halls: List[str] = []
+    for text in texts:
+        for m in _HALL_RE.finditer(text or ""):
+            hall = m.group(1) or m.group(2)
+            if hall not in halls:
+                halls.append(hall)
+    return halls
+
+
+def clan_key(surname: str, family_name: str, regions: Sequence[str] = ()) -> Tuple[str, str, str]:
+    """
+    宗族的规范键 (姓氏, 郡望, 地区)
+    名称中能解析出郡望时（“琅琊王氏家族” -> 琅琊）按郡望区分支派，地区留空；
+    否则按主要地区的第一个省份区分（“王氏家族” + 山东 -> (王, "", 山东)）
+    """
+    family_name = family_name or ""
+    surname = (surname or "").strip()
+    if not surname:
+        m = re.search(r"([一-鿿])氏", family_name)
+        surname = m.group(1) if m else ""
+    choronym = ""
+    if surname:
+        m = re.search(r"([一-鿿]{2})" + re.escape(surname) + "氏", family_name)
+        if m and m.group(1) not in _NOT_CHORONYMS and not _FUNCTION_CHARS & set(m.group(1)):
+            choronym = m.group(1)
+    if choronym:
+        return surname, choronym, ""
+    _, provinces = split_regions(regions)
+    return surname, "", provinces[0] if provinces else ""
+
+
+def clan_id(surname: str, family_name: str, regions: Sequence[str] = ()) -> str:
+    """宗族的规范 ID：同一规范键在任何会话、任何进程中都得到同一个 ID"""
+    return "clan_" + fingerprint(*clan_key(surname, family_name, regions))[:16]
+
+
+def person_id(clan: str, name: str) -> str:
+    """人物的规范 ID：同一宗族下同名的人物视为同一人"""
+    return "person_" + fingerprint(clan, (name or "").strip())[:16]
+
+
+def rank_clans(
+    clans: Iterable[Dict[str, Any]],
+    regions: Iterable[str] = (),
+    halls: Iterable[str] = (),
+) -> List[Tuple[int, Dict[str, Any]]]:
+    """
+    按与用户的相符程度给候选宗族打分并排序（分高在前，同分时关联会话多的在前）
+    堂号相符 +3，具体地名相符 +2，只有省份相符 +1；一项都不符的不返回
+    """
+    places, provinces = split_regions(regions)
+    places = [p for p in places if p not in provinces]
+    halls = set(halls)
+    ranked = []
+    for clan in clans:
+        keys = set(clan.get("region_keys") or [])
+        score = 3 if halls & set(clan.get("halls") or []) else 0
+        if keys & set(places):
+            score += 2
+        elif keys & set(provinces):
+            score += 1
+        if score:
+            ranked.append((score, clan))
+    ranked.sort(key=lambda item: (-item[0], -(item[1].get("session_count") or 0)))
+    return ranked
+
+
+class ClanRepository:
+    """clans / clan_persons / clan_links 集合访问类"""
+
+    async def _db(self):
+        return await get_mongodb_db()
+
+    async def ensure_indexes(self) -> None:
+        """创建宗族、人物和会话关联的查询索引（幂等）"""
+        db = await self._db()
+        for collection, indexes in CLAN_INDEXES.items():
+            for keys, name in indexes:
+                await db[collection].create_index(keys, name=name, background=True)
+        logger.info("Clan indexes ensured")
+
+    async def get_clan(self, clan: str) -> Optional[Dict[str, Any]]:
+        db = await self._db()
+        return await db[CLANS].find_one({"_id": clan})
+
+    async def find_clans(
+        self,
+        surname: str,
+        regions: Iterable[str] = (),
+        halls: Iterable[str] = (),
+        fresh_after: Optional[float] = None,
+        limit: int = 20,
+    ) -> List[Dict[str, Any]]:
+        """
+        同姓且地区或堂号至少一项相符的宗族节点（走 surname_region / surname_hall 索引）
+        fresh_after: 只返回该时间戳之后更新过分析结果的节点
+        """
+        keys, halls = region_keys(regions), list(halls)
+        conditions: List[Dict[str, Any]] = []
+        if keys:
+            conditions.append({"region_keys": {"$in": keys}})
+        if halls:
+            conditions.append({"halls": {"$in": halls}})
+        if not surname or not conditions:
+            return []
+        query: Dict[str, Any] = {"surname": surname, "$or": conditions}
+        if fresh_after is not None:
+            query["updated_ts"] = {"$gte": fresh_after}
+        db = await self._db()
+        return await db[CLANS].find(query).limit(limit).to_list(length=limit)
+
+    async def save_clan(
+        self,
+        surname: str,
+        family: Dict[str, Any],
+        history: List[Dict[str, Any]],
+        halls: Iterable[str] = (),
+    ) -> str:
+        """
+        写入（或刷新）一个宗族节点及其历史人物，返回规范 ID
+        分析结果和搜索结果以最新一次为准；名称、地区和堂号只增不减
+        """
+        family_name = family.get("family_name", "")
+        regions = [r for r in family.get("main_regions") or [] if r]
+        key = clan_key(surname, family_name, regions)
+        cid = clan_id(surname, family_name, regions)
+        now = datetime.now().isoformat()
+        db = await self._db()
+        await db[CLANS].update_one(
+            {"_id": cid},
+            {
+                "$set": {"family": family, "history": history, "updated_at": now, "updated_ts": time.time()},
+                "$setOnInsert": {
+                    "surname": key[0], "choronym": key[1], "region": key[2],
+                    "session_count": 0, "created_at": now,
+                },
+                "$addToSet": {
+                    "names": family_name,
+                    "regions": {"$each": regions},
+                    "region_keys": {"$each": region_keys(regions)},
+                    "halls": {"$each": list(halls)},
+                },
+            },
+            upsert=True,
+        )
+        await self.save_persons(cid, family.get("famous_figures") or [])
+        return cid
+
+    async def save_persons(self, clan: str, figures: List[Dict[str, Any]]) -> List[str]:
+        """历史人物节点（按宗族 + 姓名去重），附上朝代对应的公历区间，便于按年代查询"""
+        from pymongo import UpdateOne
+        figures = [f for f in figures if isinstance(f, dict) and (f.get("name") or "").strip()]
+        if not figures:
+            return []
+        spans = get_date_extractor().extract_batch([f.get("dynasty_period") or "" for f in figures])
+        now = datetime.now().isoformat()
+        operations, ids = [], []
+        for figure, mentions in zip(figures, spans):
+            pid = person_id(clan, figure["name"])
+            ids.append(pid)
+            fields = {k: v for k, v in figure.items() if k not in ("_id", "clan_id")}
+            if mentions:
+                fields.update(start=mentions[0].start, end=mentions[0].end)
+            operations.append(UpdateOne(
+                {"_id": pid},
+                {"$set": {**fields, "name": figure["name"].strip(), "clan_id": clan, "updated_at": now}},
+                upsert=True,
+            ))
+        db = await self._db()
+        await db[CLAN_PERSONS].bulk_write(operations, ordered=False)
+        return ids
+
+    async def link_sessions(self, session_ids: Sequence[str], families: Iterable[Dict[str, Any]]) -> int:
+        """
+        把会话关联到宗族节点（families 中带 clan_id 的大家族），重复关联不产生新记录；
+        返回新增的关联数，并按新增数累加宗族的 session_count
+        """
+        from pymongo import UpdateOne
+        refs = [f for f in families if f.get("clan_id")]
+        if not session_ids or not refs:
+            return 0
+        now = datetime.now().isoformat()
+        operations, targets = [], []
+        for session_id in session_ids:
+            for family in refs:
+                operations.append(UpdateOne(
+                    {"_id": f"{session_id}:{family['clan_id']}"},
+                    {"$setOnInsert": {
+                        "session_id": session_id,
+                        "clan_id": family["clan_id"],
+                        "family_name": family.get("family_name", ""),
+                        "relevance": family.get("relevance"),
+                        "match_basis": family.get("match_basis"),
+                        "linked_at": now,
+                    }},
+                    upsert=True,
+                ))
+                targets.append(family["clan_id"])
+        db = await self._db()
+        result = await db[CLAN_LINKS].bulk_write(operations, ordered=False)
+        added: Dict[str, int] = {}
+        for index in result.upserted_ids:
+            added[targets[index]] = added.get(targets[index], 0) + 1
+        if added:
+            await db[CLANS].bulk_write(
+                [UpdateOne({"_id": cid}, {"$inc": {"session_count": n}}) for cid, n in added.items()],
+                ordered=False,
+            )
+        return sum(added.values())
+
+    async def sessions_for_clan(self, clan: str, limit: int = 100) -> List[str]:
+        """关联到该宗族的会话（最近关联的在前）"""
+        db = await self._db()
+        cursor = db[CLAN_LINKS].find({"clan_id": clan}, {"session_id": 1}).sort("linked_at", DESCENDING).limit(limit)
+        return [doc["session_id"] async for doc in cursor]
+
+    async def clans_for_session(self, session_id: str) -> List[Dict[str, Any]]:
+        """会话关联的宗族节点"""
+        db = await self._db()
+        links = await db[CLAN_LINKS].find({"session_id": session_id}, {"clan_id": 1}).to_list(length=None)
+        ids: Set[str] = {link["clan_id"] for link in links}
+        if not ids:
+            return []
+        return await db[CLANS].find({"_id": {"$in": list(ids)}}).to_list(length=None)
+
+
+clan_repository = ClanRepository()
@@ -0,0 +1,141 @@
+"""
+问题库数据访问层
+按 (FLOW 步骤, 语气, 用户分组) 在 Redis 中存放离线生成的问题模板：
+question_bank:{step}:{tone}:{bucket} 为模板列表，同名 :cursor 键为轮换计数器
+"""
+import re
+import time
+from typing import Any, Dict, List, Optional
+
+from app.config import settings
+from app.dependencies.db import get_redis
+from app.utils.logger import logger
+from app.utils.near_duplicate import NearDuplicateIndex
+
+
+KEY_PREFIX = "question_bank"
+
+# 用户分组：按出生年份粗分年龄段（问法的称呼、回忆方式不同）
+BUCKETS = ("young", "middle", "senior", "unknown")
+TONES = ("warm", "neutral")
+
+# 模板中的占位符：{name}、{birth_place}
+_PLACEHOLDER_RE = re.compile(r"\{(\w+)\}")
+_YEAR_RE = re.compile(r"(?<!\d)(19\d{2}|20\d{2})(?!\d)")
+
+
+def profile_bucket(profile: Dict[str, Any], now_year: Optional[int] = None) -> str:
+    """按出生年份把用户分到 young（<30 岁）/ middle（30-59 岁）/ senior（60 岁以上）/ unknown"""
+    match = _YEAR_RE.search(str(profile.get("birth_date") or ""))
+    if not match:
+        return "unknown"
+    age = (now_year or time.localtime().tm_year) - int(match.group(1))
+    if age < 0:
+        return "unknown"
+    if age < 30:
+        return "young"
+    if age < 60:
+        return "middle"
+    return "senior"
+
+
+def personalize(template: str, profile: Dict[str, Any]) -> Optional[str]:
+    """
+    用用户资料填充模板中的 {name} / {birth_place}
+    模板用到的字段缺失或含未知占位符时返回 None，由调用方换下一个模板
+    """
+    values = {
+        "name": (profile.get("name") or "").strip(),
+        "birth_place": (profile.get("birth_place") or "").strip(),
+    }
+    for field in _PLACEHOLDER_RE.findall(template):
+        if not values.get(field):
+            return None
+    return _PLACEHOLDER_RE.sub(lambda m: values[m.group(1)], template)
+
+
+def _key(step: str, tone: str, bucket: str) -> str:
+    return f"{KEY_PREFIX}:{step}:{tone}:{bucket}"
+
+
+class QuestionBankRepository:
+    """Redis 问题库访问类"""
+
+    async def _redis(self):
+        return await get_redis()
+
+    async def replace(self, step: str, tone: str, bucket: str, templates: List[str]) -> int:
+        """整体替换一个问题库（事务内删除再写入，读取方不会看到半更新的列表）"""
+        templates = [t for t in dict.fromkeys(t.strip() for t in templates) if t]
+        if not templates:
+            return 0
+        key = _key(step, tone, bucket)
+        r = await self._redis()
+        pipe = r.pipeline(transaction=True)
+        pipe.delete(key)
+        pipe.rpush(key, *templates)
+        pipe.expire(key, settings.question_bank_ttl)
+        await pipe.execute()
+        return len(templates)
+
+    async def rotate(self, step: str, tone: str, bucket: str) -> List[str]:
+        """
+        取出问题库，并按轮换计数器旋转顺序（一次往返）
+        同一个库的连续调用会从不同的模板开始，避免所有用户看到同一个问题
+        """
+        key = _key(step, tone, bucket)
+        r = await self._redis()
+        pipe = r.pipeline(transaction=False)
+        pipe.incr(f"{key}:cursor")
+        pipe.lrange(key, 0, -1)
+        cursor, templates = await pipe.execute()
+        if not templates:
+            return []
+        start = int(cursor) % len(templates)
+        return templates[start:] + templates[:start]
+
+    async def claim_refresh(self, interval: float) -> bool:
+        """
+        多个进程共用问题库：每个刷新周期只允许一个进程刷新
+        返回 True 表示本进程获得了本周期的刷新权
+        """
+        r = await self._redis()
+        return bool(await r.set(f"{KEY_PREFIX}:refresh_lock", str(time.time()), nx=True, ex=max(1, int(interval))))
+
+    async def sizes(self) -> Dict[str, int]:
+        """各问题库的模板数（运维查看）"""
+        r = await self._redis()
+        out: Dict[str, int] = {}
+        async for key in r.scan_iter(match=f"{KEY_PREFIX}:*"):
+            if key.endswith((":cursor", ":refresh_lock")):
+                continue
+            out[key] = await r.llen(key)
+        return out
+
+
+question_bank_repository = QuestionBankRepository()
+
+
+async def pick_question(
+    step: str,
+    tone: str,
+    profile: Dict[str, Any],
+    avoid: Optional[List[str]] = None,
+) -> Optional[str]:
+    """
+    从问题库中取一个个性化后的问题（先查用户所在分组，再查 unknown 分组）
+    问题库为空、Redis 不可用或没有可用模板时返回 None
+    """
+    avoid_index = NearDuplicateIndex(avoid or [])
+    buckets = [profile_bucket(profile)]
+    if buckets[0] != "unknown":
+        buckets.append("unknown")
+    try:
+        for bucket in buckets:
+            for template in await question_bank_repository.rotate(step, tone, bucket):
+                q = personalize(template, profile)
+                if q and not avoid_index.is_duplicate(q):
+                    return q
+    except Exception as e:
+        logger.warning(f"读取问题库失败（使用兜底问法）：{e}")
+    return None
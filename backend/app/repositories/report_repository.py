@@ -0,0 +1,150 @@
+"""
+报告数据访问层
+报告正文、时间轴、搜索结果和生成的图片分别存放在独立集合中，按 (session_id, version) 定位，
+会话文档只保留 report_version / report_ready 等小字段；保存图片只对 assets 集合做 $set，
+不再整体重写报告
+"""
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from app.dependencies.db import get_mongodb_db
+from app.repositories.session_repository import ASCENDING, DESCENDING
+from app.utils.logger import logger
+
+
+# 报告各部分所在的集合
+REPORTS = "reports"
+TIMELINES = "timelines"
+SEARCH_RESULTS = "search_results"
+ASSETS = "assets"
+
+# report_data 中存放到 search_results 集合的字段
+_SEARCH_FIELDS = ("possible_families", "family_histories", "search_summary")
+
+
+def _doc_id(session_id: str, version: int) -> str:
+    return f"{session_id}:{version}"
+
+
+class ReportRepository:
+    """reports / timelines / search_results / assets 集合访问类"""
+
+    async def _db(self):
+        return await get_mongodb_db()
+
+    async def ensure_indexes(self) -> None:
+        """每个集合按 (session_id, version) 建唯一索引（幂等）"""
+        db = await self._db()
+        for name in (REPORTS, TIMELINES, SEARCH_RESULTS, ASSETS):
+            await db[name].create_index(
+                [("session_id", ASCENDING), ("version", DESCENDING)],
+                name="session_version",
+                unique=True,
+                background=True,
+            )
+        logger.info("Report indexes ensured")
+
+    async def _next_version(self, session_id: str) -> int:
+        """在会话文档上原子递增报告版本号"""
+        from pymongo import ReturnDocument
+        db = await self._db()
+        session = await db.sessions.find_one_and_update(
+            {"_id": session_id},
+            {"$inc": {"report_version": 1}},
+            projection={"report_version": 1},
+            return_document=ReturnDocument.AFTER,
+        )
+        if not session:
+            raise ValueError(f"Session {session_id} not found")
+        return int(session["report_version"])
+
+    async def save_report(self, session_id: str, report_data: Dict[str, Any]) -> int:
+        """
+        保存一份新版本的报告，返回版本号
+        正文、时间轴、搜索结果分别写入各自集合；会话文档只记录版本号
+        """
+        version = await self._next_version(session_id)
+        db = await self._db()
+        now = datetime.now().isoformat()
+        key = {"_id": _doc_id(session_id, version), "session_id": session_id, "version": version}
+
+        report_doc = {
+            k: v for k, v in report_data.items()
+            if k not in _SEARCH_FIELDS and k != "timeline"
+        }
+        await db[REPORTS].replace_one({"_id": key["_id"]}, {**report_doc, **key, "created_at": now}, upsert=True)
+        await db[SEARCH_RESULTS].replace_one(
+            {"_id": key["_id"]},
+            {**{k: report_data.get(k) for k in _SEARCH_FIELDS}, **key, "created_at": now},
+            upsert=True,
+        )
+        await db[TIMELINES].replace_one(
+            {"_id": key["_id"]},
+            {**(report_data.get("timeline") or {"events": []}), **key, "created_at": now},
+            upsert=True,
+        )
+        return version
+
+    async def save_images(self, session_id: str, version: int, image_urls: List[str]) -> None:
+        """保存该版本报告的图片 URL（$set 替换上次生成的图片，不重写报告）"""
+        db = await self._db()
+        await db[ASSETS].update_one(
+            {"_id": _doc_id(session_id, version)},
+            {
+                "$set": {"images": list(image_urls), "images_generated_at": datetime.now().isoformat()},
+                "$setOnInsert": {"session_id": session_id, "version": version},
+            },
+            upsert=True,
+        )
+
+    async def get_possible_families(self, session_id: str, version: int) -> List[Dict[str, Any]]:
+        """只读取该版本搜索结果中的大家族列表"""
+        db = await self._db()
+        doc = await db[SEARCH_RESULTS].find_one(
+            {"_id": _doc_id(session_id, version)}, {"possible_families": 1}
+        )
+        return (doc or {}).get("possible_families") or []
+
+    async def get_report(self, session_id: str, version: int, include_timeline: bool = True) -> Optional[Dict[str, Any]]:
+        """
+        组装指定版本的完整报告（与旧版 sessions.report 结构一致）
+        include_timeline: 不需要时间轴时（如生成图片）可以跳过读取
+        """
+        db = await self._db()
+        doc_id = _doc_id(session_id, version)
+        report = await db[REPORTS].find_one({"_id": doc_id}, {"_id": 0, "created_at": 0})
+        if not report:
+            return None
+
+        search = await db[SEARCH_RESULTS].find_one({"_id": doc_id}, {"_id": 0}) or {}
+        for field in _SEARCH_FIELDS:
+            report[field] = search.get(field)
+
+        if include_timeline:
+            timeline = await db[TIMELINES].find_one(
+                {"_id": doc_id}, {"_id": 0, "session_id": 0, "version": 0, "created_at": 0}
+            )
+            report["timeline"] = timeline or {"events": []}
+
+        assets = await db[ASSETS].find_one({"_id": doc_id}, {"images": 1, "images_generated_at": 1})
+        if assets and assets.get("images"):
+            report["images"] = assets["images"]
+            report["images_generated_at"] = assets.get("images_generated_at")
+        return report
+
+
+async def load_session_report(session: Dict[str, Any], include_timeline: bool = True) -> Optional[Dict[str, Any]]:
+    """
+    读取会话当前版本的报告
+    兼容旧数据：没有 report_version 时直接使用会话文档内嵌的 report
+    """
+    version = session.get("report_version")
+    if version:
+        report = await report_repository.get_report(session["_id"], version, include_timeline)
+        if report:
+            return report
+    return session.get("report")
+
+
+# 全局实例
+report_repository = ReportRepository()
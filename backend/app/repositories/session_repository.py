@@ -0,0 +1,236 @@
+"""
+会话数据访问层
+统一 sessions 集合的读写：启动时创建索引，按使用场景只取需要的字段，
+避免热路径每次都把完整报告、时间轴、图片等大字段从 MongoDB 读出来
+"""
+import base64
+import json
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from app.dependencies.db import get_mongodb_db
+from app.utils.logger import logger
+
+# 与 pymongo.ASCENDING / DESCENDING 相同；不在模块级导入 pymongo，缩短启动时间
+ASCENDING, DESCENDING = 1, -1
+
+
+# 各使用场景需要的字段（MongoDB projection）
+PROJECTIONS: Dict[str, Optional[Dict[str, int]]] = {
+    # 完整文档（仅在确实需要时使用）
+    "full": None,
+    # 只判断会话是否存在
+    "exists": {"_id": 1},
+    # 搜索、报告、时间轴：收集的数据和用户信息，不含报告
+    "collected": {
+        "family_graph": 1,
+        "collected_data": 1,
+        "user_input": 1,
+        "user_profile": 1,
+        "archive_title": 1,
+        # 生成报告时与上一版本比较输入指纹
+        "report_version": 1,
+    },
+    # 已保存的记忆卡片
+    "memories": {"memories": 1},
+    # 图谱更新
+    "graph": {"family_graph": 1},
+    # 图谱时间轴：用户信息、图谱和报告中的大家族分析
+    # （report 仅用于兼容报告拆分前的旧数据）
+    "graph_timeline": {"user_input": 1, "family_graph": 1, "report_version": 1, "report.possible_families": 1},
+    # 会话详情接口
+    "detail": {
+        "user_input": 1,
+        "user_profile": 1,
+        "family_graph": 1,
+        "collected_data": 1,
+        "created_at": 1,
+        "updated_at": 1,
+    },
+    # 报告与档案信息（报告正文在 reports 等集合中，按 report_version 读取）
+    "report": {
+        "report_version": 1,
+        "report": 1,
+        "archived": 1,
+        "archive_title": 1,
+        "archive_notes": 1,
+        "archived_at": 1,
+        "user_input.name": 1,
+    },
+    # 归档操作
+    "archive": {"user_input.name": 1, "archive_title": 1},
+    # 会话列表
+    "listing": {
+        "user_input.name": 1,
+        "created_at": 1,
+        "archived": 1,
+        "archive_title": 1,
+        "archive_notes": 1,
+        "archived_at": 1,
+        "report_ready": 1,
+        "report_version": 1,
+        "report_generated_at": 1,
+    },
+}
+
+# 启动时创建的索引：(字段列表, 索引名)
+# 列表按 (created_at, _id) 倒序做 keyset 分页，索引末尾带上 _id 保证翻页不需要内存排序
+SESSION_INDEXES = [
+    ([("user_input.user_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)], "user_created_at"),
+    ([("archived", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)], "archived_created_at"),
+    ([("created_at", DESCENDING), ("_id", DESCENDING)], "created_at"),
+]
+
+# 列表排序：创建时间倒序，相同时间按 _id 倒序
+LISTING_SORT = [("created_at", DESCENDING), ("_id", DESCENDING)]
+
+
+class InvalidCursor(ValueError):
+    """分页游标无法解析"""
+
+
+def encode_cursor(session: Dict[str, Any]) -> str:
+    """把一页最后一条会话的 (created_at, _id) 编码为不透明游标"""
+    raw = json.dumps([session.get("created_at"), session["_id"]], ensure_ascii=False)
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> Tuple[Optional[str], str]:
+    """解析游标，返回 (created_at, _id)"""
+    try:
+        created_at, session_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except Exception as e:
+        raise InvalidCursor(f"Invalid cursor: {cursor}") from e
+    if not isinstance(session_id, str) or not (created_at is None or isinstance(created_at, str)):
+        raise InvalidCursor(f"Invalid cursor: {cursor}")
+    return created_at, session_id
+
+
+def keyset_query(query: Dict[str, Any], cursor: Optional[str]) -> Dict[str, Any]:
+    """
+    在筛选条件上加上 keyset 条件：只取排在游标之后的会话
+    倒序时没有 created_at 的旧会话排在最后，这里一并考虑
+    """
+    if not cursor:
+        return dict(query)
+    created_at, session_id = decode_cursor(cursor)
+    if created_at is None:
+        after = {"created_at": None, "_id": {"$lt": session_id}}
+    else:
+        after = {"$or": [
+            {"created_at": {"$lt": created_at}},
+            {"created_at": created_at, "_id": {"$lt": session_id}},
+            {"created_at": None},
+        ]}
+    return {"$and": [query, after]} if query else after
+
+
+def extract_collected_data(session: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    从会话文档中取出 collected_data（兼容多种存储格式）
+    - 新格式：family_graph.collected_data
+    - 旧格式：family_graph 直接就是 collected_data
+    - 备用：顶层 collected_data 字段
+    """
+    family_graph = session.get("family_graph", {})
+    if isinstance(family_graph, dict) and "collected_data" in family_graph:
+        return family_graph.get("collected_data", {}) or {}
+    if isinstance(family_graph, dict) and family_graph:
+        return family_graph
+    return session.get("collected_data", {}) or {}
+
+
+class SessionRepository:
+    """sessions 集合访问类"""
+
+    async def _collection(self):
+        db = await get_mongodb_db()
+        return db.sessions
+
+    async def ensure_indexes(self) -> None:
+        """创建会话列表查询所需的索引（幂等）"""
+        collection = await self._collection()
+        for keys, name in SESSION_INDEXES:
+            await collection.create_index(keys, name=name, background=True)
+        logger.info(f"Session indexes ensured: {[name for _, name in SESSION_INDEXES]}")
+
+    async def get(self, session_id: str, view: str = "full") -> Optional[Dict[str, Any]]:
+        """
+        按场景读取会话
+        view: PROJECTIONS 中的场景名
+        """
+        if view not in PROJECTIONS:
+            raise KeyError(f"Unknown session view: {view}")
+        collection = await self._collection()
+        return await collection.find_one({"_id": session_id}, PROJECTIONS[view])
+
+    async def update(
+        self,
+        session_id: str,
+        fields: Dict[str, Any],
+        upsert: bool = False,
+        unset: Optional[List[str]] = None,
+    ):
+        """$set 更新会话字段，并刷新 updated_at；unset 中的字段会被删除"""
+        now = datetime.now().isoformat()
+        update: Dict[str, Any] = {"$set": {**fields, "updated_at": now}}
+        if unset:
+            update["$unset"] = {field: "" for field in unset}
+        if upsert:
+            update["$setOnInsert"] = {"created_at": now}
+        collection = await self._collection()
+        return await collection.update_one({"_id": session_id}, update, upsert=upsert)
+
+    async def insert_many(self, documents: List[Dict[str, Any]]) -> None:
+        """批量创建会话（documents 需自带 _id），统一补上 created_at / updated_at"""
+        if not documents:
+            return
+        now = datetime.now().isoformat()
+        for doc in documents:
+            doc.setdefault("created_at", now)
+            doc.setdefault("updated_at", now)
+        collection = await self._collection()
+        await collection.insert_many(documents, ordered=False)
+
+    async def list_page(
+        self,
+        query: Dict[str, Any],
+        limit: int = 50,
+        cursor: Optional[str] = None,
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        按 (created_at, _id) 倒序分页列出会话（只取列表字段）
+        返回 (本页会话, 下一页游标)，没有下一页时游标为 None
+        """
+        collection = await self._collection()
+        find_cursor = (
+            collection.find(keyset_query(query, cursor), PROJECTIONS["listing"])
+            .sort(LISTING_SORT)
+            .limit(limit + 1)
+        )
+        sessions = await find_cursor.to_list(length=limit + 1)
+        if len(sessions) > limit:
+            sessions = sessions[:limit]
+            return sessions, encode_cursor(sessions[-1])
+        return sessions, None
+
+    async def iter_listing(
+        self,
+        query: Dict[str, Any],
+        cursor: Optional[str] = None,
+        batch_size: int = 500,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        逐条遍历全部匹配的会话（用于导出）
+        按批次 keyset 翻页，内存占用与总数无关
+        """
+        while True:
+            sessions, cursor = await self.list_page(query, batch_size, cursor)
+            for session in sessions:
+                yield session
+            if cursor is None:
+                return
+
+
+# 全局实例
+session_repository = SessionRepository()
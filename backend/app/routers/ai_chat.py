@@ -1,16 +1,21 @@
 """
 AI问答路由
 """
-from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
-from typing import Optional
+import asyncio
+
+from fastapi import APIRouter, Depends, HTTPException, WebSocket, WebSocketDisconnect
+from pydantic import BaseModel, Field
+from typing import Any, Dict, List, Optional
 from app.services.ai_service import AIService
+from app.config import settings
+from app.dependencies.request_context import RequestContext, RequestCancelled, cancellation_status, request_context
+from app.dependencies.resources import get_ai_service
+from app.utils.deadline import DeadlineExceeded
+from app.utils import serialization
 from app.utils.logger import logger
 
 router = APIRouter(prefix="/ai", tags=["ai"])
 
-ai_service = AIService()
-
 
 class ChatRequest(BaseModel):
     """聊天请求模型"""
@@ -24,14 +29,39 @@ class ChatResponse(BaseModel):
     status: str  # "continue" or "complete"
 
 
+class InterviewPair(BaseModel):
+    """访谈中的一轮问答"""
+    question: str = ""
+    answer: str
+
+
+class BatchRequest(BaseModel):
+    """批量导入访谈请求模型"""
+    session_id: str
+    pairs: List[InterviewPair] = Field(..., min_length=1, max_length=settings.batch_max_pairs)
+
+
+class BatchResponse(BaseModel):
+    """批量导入访谈响应模型"""
+    status: str  # "continue" or "complete"
+    question: Optional[str] = None
+    step: str
+    imported: int
+    extracted: Dict[str, Any]
+
+
 @router.post("/chat", response_model=ChatResponse)
-async def chat_response(request: ChatRequest):
+async def chat_response(
+    request: ChatRequest,
+    ctx: RequestContext = Depends(request_context(settings.request_timeout_interactive)),
+    ai_service: AIService = Depends(get_ai_service)
+):
     """
     AI问答接口
     输入用户回答，AI生成下一个问题或结束收集
     """
     try:
-        result = await ai_service.process_answer(request.session_id, request.answer)
+        result = await ctx.run(ai_service.process_answer(request.session_id, request.answer))
         
         # process_answer 返回字典，包含 status, question, step
         if isinstance(result, dict):
@@ -46,6 +76,8 @@ async def chat_response(request: ChatRequest):
             return ChatResponse(status="complete")
         
         return ChatResponse(question=result, status="continue")
+    except (RequestCancelled, DeadlineExceeded):
+        raise
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
@@ -53,8 +85,146 @@ async def chat_response(request: ChatRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/batch", response_model=BatchResponse)
+async def batch_import(
+    request: BatchRequest,
+    ctx: RequestContext = Depends(request_context(settings.request_timeout_batch)),
+    ai_service: AIService = Depends(get_ai_service)
+):
+    """
+    批量导入访谈
+    一次提交整段 (问题, 回答) 列表：只做一次批量信息抽取并合并到已收集数据，不逐轮生成追问
+    """
+    try:
+        pairs = [pair.model_dump() for pair in request.pairs]
+        result = await ctx.run(ai_service.process_batch(request.session_id, pairs))
+        return BatchResponse(**result)
+    except (RequestCancelled, DeadlineExceeded):
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error importing interview batch: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.websocket("/ws/{session_id}")
+async def chat_websocket(
+    websocket: WebSocket,
+    session_id: str,
+    ai_service: AIService = Depends(get_ai_service)
+):
+    """
+    WebSocket 问答通道
+    连接建立时读取一次会话状态并保存在内存中，此后每轮只写回 Redis，不再读取。
+
+    客户端发送：{"answer": "..."}（也可直接发送文本）
+    服务端发送：
+    - {"type": "question", "question": ..., "step": ...}：当前问题（连接建立时和每轮结束时）
+    - {"type": "token", "text": ...}：下一个问题的流式片段，以随后的 question 消息为准
+    - {"type": "complete", "step": "complete", "message": ...}：收集完成，随后关闭连接
+    - {"type": "error", "code": ..., "detail": ...}：本轮失败（499/504/500），连接保持
+    """
+    await websocket.accept()
+    try:
+        state = await ai_service.load_state(session_id)
+    except ValueError as e:
+        await websocket.send_json({"type": "error", "code": 404, "detail": str(e)})
+        await websocket.close(code=4404)
+        return
+
+    async def send_token(text: str) -> None:
+        await websocket.send_json({"type": "token", "text": text})
+
+    async def reload_state() -> Optional[Dict[str, Any]]:
+        """本轮失败后重新读取状态；会话已过期或读取失败时发送错误并关闭连接，返回 None"""
+        try:
+            return await ai_service.load_state(session_id)
+        except ValueError as e:
+            await websocket.send_json({"type": "error", "code": 404, "detail": str(e)})
+            await websocket.close(code=4404)
+        except Exception as e:
+            logger.error(f"Error reloading websocket chat state: {e}")
+            await websocket.send_json({"type": "error", "code": 500, "detail": str(e)})
+            await websocket.close(code=1011)
+        return None
+
+    try:
+        await websocket.send_json({
+            "type": "question",
+            "question": ai_service.current_question(state),
+            "step": state.get("step"),
+        })
+        while True:
+            try:
+                message = await asyncio.wait_for(websocket.receive_text(), timeout=settings.ws_idle_timeout)
+            except asyncio.TimeoutError:
+                await websocket.close(code=1000, reason="idle timeout")
+                return
+            try:
+                answer = _parse_ws_answer(message)
+            except ValueError as e:
+                await websocket.send_json({"type": "error", "code": 400, "detail": str(e)})
+                continue
+
+            # 每轮使用独立的时间预算（与 POST /ai/chat 相同）
+            ctx = RequestContext(timeout=settings.request_timeout_interactive)
+            try:
+                result = await ctx.run(
+                    ai_service.process_answer(session_id, answer, state=state, on_token=send_token)
+                )
+            except (RequestCancelled, DeadlineExceeded) as e:
+                code = cancellation_status(e)
+                await websocket.send_json({"type": "error", "code": code, "detail": str(e)})
+                # 本轮可能只更新了一半内存状态，以 Redis 中最后一次写入的为准
+                state = await reload_state()
+                if state is None:
+                    return
+                continue
+            except WebSocketDisconnect:
+                raise
+            except Exception as e:
+                logger.error(f"Error processing websocket chat: {e}")
+                await websocket.send_json({"type": "error", "code": 500, "detail": str(e)})
+                state = await reload_state()
+                if state is None:
+                    return
+                continue
+
+            if result.get("status") == "complete" or result.get("question") is None:
+                await websocket.send_json({
+                    "type": "complete",
+                    "step": "complete",
+                    "message": result.get("message"),
+                })
+                await websocket.close(code=1000)
+                return
+            await websocket.send_json({
+                "type": "question",
+                "question": result["question"],
+                "step": result.get("step"),
+                "message": result.get("message"),
+            })
+    except WebSocketDisconnect:
+        logger.debug(f"WebSocket chat disconnected: {session_id}")
+
+
+def _parse_ws_answer(message: str) -> str:
+    """解析客户端消息：JSON 对象取 answer 字段，否则整条文本就是回答"""
+    text = message.strip()
+    if not text.startswith("{"):
+        return message
+    try:
+        payload = serialization.loads(text)
+    except ValueError:
+        return message
+    if not isinstance(payload, dict) or not isinstance(payload.get("answer"), str):
+        raise ValueError("消息格式错误：应为 {\"answer\": \"...\"}")
+    return payload["answer"]
+
+
 @router.get("/question/{session_id}")
-async def get_question(session_id: str):
+async def get_question(session_id: str, ai_service: AIService = Depends(get_ai_service)):
     """
     获取当前问题
     用于获取初始问题或重新获取问题
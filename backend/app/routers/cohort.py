@@ -0,0 +1,55 @@
+"""
+宗亲批量路由
+整批导入宗亲会成员并批量生成报告
+"""
+from fastapi import APIRouter, Depends, HTTPException
+from pydantic import BaseModel, Field
+from typing import Any, Dict, List, Optional
+from app.models.user import UserInput
+from app.services.cohort_service import CohortService
+from app.config import settings
+from app.dependencies.request_context import RequestContext, RequestCancelled, request_context
+from app.dependencies.resources import get_cohort_service
+from app.utils.deadline import DeadlineExceeded
+from app.utils.logger import logger
+
+router = APIRouter(prefix="/cohort", tags=["cohort"])
+
+
+class CohortMember(UserInput):
+    """宗亲成员（可单独指定姓氏，默认从姓名中取，复姓取前两个字）"""
+    surname: Optional[str] = None
+
+
+class CohortRequest(BaseModel):
+    """宗亲批量请求模型"""
+    members: List[CohortMember] = Field(..., min_length=1, max_length=settings.cohort_max_members)
+    generate_reports: bool = True
+
+
+class CohortResponse(BaseModel):
+    """宗亲批量响应模型"""
+    session_ids: List[str]
+    groups: List[Dict[str, Any]]
+    reports: List[Dict[str, Any]]
+
+
+@router.post("/batch", response_model=CohortResponse)
+async def cohort_batch(
+    request: CohortRequest,
+    ctx: RequestContext = Depends(request_context(settings.request_timeout_cohort)),
+    cohort_service: CohortService = Depends(get_cohort_service)
+):
+    """
+    宗亲批量导入
+    批量创建会话，按姓氏 + 籍贯分组，每组只搜索一次，再并发生成每个成员的报告
+    """
+    try:
+        profiles = [member.model_dump() for member in request.members]
+        result = await ctx.run(cohort_service.run(profiles, generate_reports=request.generate_reports))
+        return CohortResponse(**result)
+    except (RequestCancelled, DeadlineExceeded):
+        raise
+    except Exception as e:
+        logger.error(f"Error running cohort batch: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
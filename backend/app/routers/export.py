@@ -1,28 +1,37 @@
 """
 导出路由
 """
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException
 from app.services.output_service import OutputService
 # 视频生成功能已移除
+from app.config import settings
+from app.dependencies.request_context import RequestContext, RequestCancelled, request_context
+from app.dependencies.resources import get_output_service
+from app.utils.deadline import DeadlineExceeded
 from app.utils.logger import logger
 
 router = APIRouter(prefix="/export", tags=["export"])
 
-output_service = OutputService()
-
 
 @router.get("/{type}")
-async def export_output(session_id: str, type: str):
+async def export_output(
+    session_id: str,
+    type: str,
+    ctx: RequestContext = Depends(request_context(settings.request_timeout_report)),
+    output_service: OutputService = Depends(get_output_service)
+):
     """
     导出输出
     支持 pdf 和 video 两种类型
     """
     try:
         if type == "pdf":
-            pdf_url = await output_service.export_pdf(session_id)
+            pdf_url = await ctx.run(output_service.export_pdf(session_id))
             return {"url": pdf_url, "type": "pdf"}
         else:
             raise HTTPException(status_code=400, detail=f"Unsupported export type: {type}. Only 'pdf' is supported.")
+    except (RequestCancelled, DeadlineExceeded):
+        raise
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
@@ -1,20 +1,23 @@
 """
 生成输出路由
 """
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
 from typing import Optional
 from app.services.output_service import OutputService
+from app.config import settings
+from app.dependencies.request_context import RequestContext, RequestCancelled, request_context
+from app.dependencies.resources import get_output_service
+from app.utils.deadline import DeadlineExceeded
 from app.utils.logger import logger
 
 router = APIRouter(prefix="/generate", tags=["generate"])
 
-output_service = OutputService()
-
 
 class ReportRequest(BaseModel):
     """生成报告请求模型"""
     session_id: str
+    force: bool = False  # 忽略上一版本，全部重新生成（默认输入未变化时直接返回上一版本）
 
 
 class TimelineRequest(BaseModel):
@@ -36,7 +39,11 @@ class ImageGenerationRequest(BaseModel):
 
 
 @router.post("/report")
-async def generate_report(request: ReportRequest):
+async def generate_report(
+    request: ReportRequest,
+    ctx: RequestContext = Depends(request_context(settings.request_timeout_report)),
+    output_service: OutputService = Depends(get_output_service)
+):
     """
     生成家族报告
     返回包含文字和图片的完整报告
@@ -44,7 +51,7 @@ async def generate_report(request: ReportRequest):
     报告生成后，会话会自动标记为可归档状态
     """
     try:
-        report = await output_service.generate_report(request.session_id)
+        report = await ctx.run(output_service.generate_report(request.session_id, force=request.force))
         
         # 报告生成成功，返回成功消息
         return {
@@ -52,6 +59,8 @@ async def generate_report(request: ReportRequest):
             "message": "报告生成成功！您可以查看报告，或将其保存为档案。",
             "can_archive": True
         }
+    except (RequestCancelled, DeadlineExceeded):
+        raise
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
@@ -62,14 +71,20 @@ async def generate_report(request: ReportRequest):
 
 
 @router.post("/timeline")
-async def generate_timeline(request: TimelineRequest):
+async def generate_timeline(
+    request: TimelineRequest,
+    ctx: RequestContext = Depends(request_context(settings.request_timeout_report)),
+    output_service: OutputService = Depends(get_output_service)
+):
     """
     生成时间轴
     支持多轴设计，可锁定特定家族查看时间线
     """
     try:
-        timeline_data = await output_service.build_timeline(request.session_id, request.family_filter)
+        timeline_data = await ctx.run(output_service.build_timeline(request.session_id, request.family_filter))
         return {"timeline": timeline_data}
+    except (RequestCancelled, DeadlineExceeded):
+        raise
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
@@ -78,14 +93,20 @@ async def generate_timeline(request: TimelineRequest):
 
 
 @router.post("/biography")
-async def generate_biography(request: BiographyRequest):
+async def generate_biography(
+    request: BiographyRequest,
+    ctx: RequestContext = Depends(request_context(settings.request_timeout_report)),
+    output_service: OutputService = Depends(get_output_service)
+):
     """
     生成个人传记
     整合用户输入和推测家族轨迹，生成融入家族叙事的个人故事
     """
     try:
-        bio = await output_service.generate_bio(request.session_id)
+        bio = await ctx.run(output_service.generate_bio(request.session_id))
         return {"biography": bio}
+    except (RequestCancelled, DeadlineExceeded):
+        raise
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
@@ -94,7 +115,11 @@ async def generate_biography(request: BiographyRequest):
 
 
 @router.post("/images")
-async def generate_images(request: ImageGenerationRequest):
+async def generate_images(
+    request: ImageGenerationRequest,
+    ctx: RequestContext = Depends(request_context(settings.request_timeout_report)),
+    output_service: OutputService = Depends(get_output_service)
+):
     """
     基于报告生成图片（使用即梦4.0）
     根据已生成的家族报告，生成1-2张相关的图片
@@ -109,17 +134,19 @@ async def generate_images(request: ImageGenerationRequest):
                 detail="num_images must be between 1 and 2"
             )
         
-        image_urls = await output_service.generate_images_from_report(
+        image_urls = await ctx.run(output_service.generate_images_from_report(
             session_id=request.session_id,
             num_images=request.num_images,
             size=request.size
-        )
+        ))
         
         return {
             "images": image_urls,
             "count": len(image_urls),
             "session_id": request.session_id
         }
+    except (RequestCancelled, DeadlineExceeded):
+        raise
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
@@ -1,17 +1,19 @@
 """
 健康检查和 API 连接状态检查路由
 """
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException
 from typing import Dict, Any
 from app.config import settings
 from app.services.gateway_service import GatewayService
+from app.dependencies.resources import get_gateway_service
 from app.utils.logger import logger
 from app.utils.api_key_manager import APIKeyManager
+from app.utils.latency_tracker import latency_tracker
+from app.utils.timeout_policy import timeout_policy
+from app.utils.api_key_pool import deepseek_key_pool
 
 router = APIRouter(prefix="/health", tags=["health"])
 
-gateway_service = GatewayService()
-
 
 @router.get("/")
 async def health_check():
@@ -28,14 +30,15 @@ async def api_status():
     检查所有第三方 API 的配置状态
     不进行实际调用，只检查配置是否完整
     """
-    deepseek_key = APIKeyManager.get_deepseek_key()
+    deepseek_keys = APIKeyManager.get_deepseek_keys()
     
     bocha_key = settings.bocha_api_key
     
     status = {
         "deepseek": {
-            "configured": bool(deepseek_key or settings.deepseek_api_key),
-            "status": "configured" if (deepseek_key or settings.deepseek_api_key) else "not_configured"
+            "configured": bool(deepseek_keys),
+            "status": "configured" if deepseek_keys else "not_configured",
+            "key_count": len(deepseek_keys)
         },
         "bochaai": {
             "configured": bool(bocha_key),
@@ -66,8 +69,22 @@ async def api_status():
     }
 
 
+@router.get("/llm-stats")
+async def llm_stats():
+    """
+    LLM 调用统计
+    包含各调用点的延迟分位数和当前超时、对冲请求的对冲率和胜率，以及密钥池中各密钥的用量
+    """
+    return {
+        "latency": latency_tracker.snapshot(),
+        "timeouts": timeout_policy.snapshot(),
+        "hedging": GatewayService.get_hedge_stats(),
+        "key_pool": deepseek_key_pool.stats()
+    }
+
+
 @router.post("/test/deepseek")
-async def test_deepseek():
+async def test_deepseek(gateway_service: GatewayService = Depends(get_gateway_service)):
     """
     测试 DeepSeek API 连接
     实际调用 API 验证连接
@@ -137,7 +154,7 @@ async def test_database():
 
 
 @router.post("/test/all")
-async def test_all():
+async def test_all(gateway_service: GatewayService = Depends(get_gateway_service)):
     """
     测试所有 API 连接
     依次测试各个服务
@@ -1,16 +1,18 @@
 """
 记忆总结路由
 """
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
 from typing import List
 from app.services.ai_service import AIService
+from app.config import settings
+from app.dependencies.request_context import RequestContext, RequestCancelled, request_context
+from app.dependencies.resources import get_ai_service
+from app.utils.deadline import DeadlineExceeded
 from app.utils.logger import logger
 
 router = APIRouter(prefix="/memories", tags=["memories"])
 
-ai_service = AIService()
-
 
 class SummarizeRequest(BaseModel):
     """记忆总结请求模型"""
@@ -29,13 +31,17 @@ class SummarizeResponse(BaseModel):
 
 
 @router.post("/summarize", response_model=SummarizeResponse)
-async def summarize_memories(request: SummarizeRequest):
+async def summarize_memories(
+    request: SummarizeRequest,
+    ctx: RequestContext = Depends(request_context(settings.request_timeout_interactive)),
+    ai_service: AIService = Depends(get_ai_service)
+):
     """
     总结对话历史，生成记忆卡片
     接收session_id，返回AI总结的记忆卡片列表
     """
     try:
-        memories = await ai_service.summarize_memories(request.session_id)
+        memories = await ctx.run(ai_service.summarize_memories(request.session_id))
         
         # 转换为响应格式
         memory_cards = [
@@ -44,6 +50,8 @@ async def summarize_memories(request: SummarizeRequest):
         ]
         
         return SummarizeResponse(memories=memory_cards)
+    except (RequestCancelled, DeadlineExceeded):
+        raise
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
@@ -1,29 +1,37 @@
 """
 搜索路由
 """
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException
 from typing import Optional
 from app.services.search_service import SearchService
 from app.services.graph_service import GraphService
+from app.config import settings
+from app.dependencies.request_context import RequestContext, RequestCancelled, request_context
+from app.dependencies.resources import get_search_service, get_graph_service
+from app.utils.deadline import DeadlineExceeded
 from app.utils.logger import logger
 
 router = APIRouter(prefix="/search", tags=["search"])
 
-search_service = SearchService()
-graph_service = GraphService()
-
 
 @router.get("/family")
-async def search_family(session_id: str):
+async def search_family(
+    session_id: str,
+    ctx: RequestContext = Depends(request_context(settings.request_timeout_search)),
+    search_service: SearchService = Depends(get_search_service),
+    graph_service: GraphService = Depends(get_graph_service)
+):
     """
     搜索家族历史
     基于 session_id 中的家族图谱进行联网搜索
     """
     try:
-        results = await search_service.perform_search(session_id)
+        results = await ctx.run(search_service.perform_search(session_id))
         # 更新图谱
-        await graph_service.update_graph(session_id, results)
+        await ctx.run(graph_service.update_graph(session_id, results))
         return {"results": results}
+    except (RequestCancelled, DeadlineExceeded):
+        raise
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
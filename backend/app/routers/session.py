@@ -2,11 +2,19 @@
 会话管理路由
 用于查看和保存会话档案
 """
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import Optional, Dict, Any
-from app.dependencies.db import get_mongodb_db
+from app.repositories.session_repository import (
+    session_repository,
+    extract_collected_data,
+    decode_cursor,
+    InvalidCursor,
+)
+from app.repositories.report_repository import load_session_report
 from app.utils.logger import logger
+from app.utils import serialization
 from datetime import datetime
 
 router = APIRouter(prefix="/session", tags=["session"])
@@ -18,6 +26,84 @@ class SessionArchive(BaseModel):
     notes: Optional[str] = None  # 可选：备注信息
 
 
+def _listing_item(session: Dict[str, Any]) -> Dict[str, Any]:
+    """会话列表中的单条记录"""
+    return {
+        "session_id": session.get("_id"),
+        "user_name": session.get("user_input", {}).get("name"),
+        "created_at": session.get("created_at"),
+        "archived": session.get("archived", False),
+        "archive_title": session.get("archive_title"),  # 用户自定义的档案名称
+        "archive_notes": session.get("archive_notes"),  # 用户添加的备注
+        "archived_at": session.get("archived_at"),
+        "has_report": bool(session.get("report_ready") or session.get("report"))
+    }
+
+
+def _listing_query(user_id: Optional[str], archived: Optional[bool]) -> Dict[str, Any]:
+    query: Dict[str, Any] = {}
+    if user_id:
+        query["user_input.user_id"] = user_id
+    if archived is not None:
+        query["archived"] = archived
+    return query
+
+
+# 注意：/list 路由必须声明在 /{session_id} 之前，否则会被当作 session_id 匹配
+@router.get("/list")
+async def list_sessions(
+    user_id: Optional[str] = None,
+    archived: Optional[bool] = None,
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = None
+):
+    """
+    分页列出会话（支持筛选）
+    按创建时间倒序，使用 next_cursor 获取下一页；没有下一页时 next_cursor 为 null
+    """
+    try:
+        query = _listing_query(user_id, archived)
+        
+        # 只取列表字段，不读取报告正文（依赖 user_created_at / archived_created_at 索引）
+        sessions, next_cursor = await session_repository.list_page(query, limit=limit, cursor=cursor)
+        session_list = [_listing_item(session) for session in sessions]
+        
+        return {"sessions": session_list, "count": len(session_list), "next_cursor": next_cursor}
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error listing sessions: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/list/export")
+async def export_sessions(
+    user_id: Optional[str] = None,
+    archived: Optional[bool] = None,
+    cursor: Optional[str] = None
+):
+    """
+    导出全部匹配的会话（NDJSON 流，每行一个会话）
+    服务端分批翻页并逐行输出，内存占用与会话总数无关
+    """
+    query = _listing_query(user_id, archived)
+    if cursor:
+        try:
+            decode_cursor(cursor)
+        except InvalidCursor as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    
+    async def _rows():
+        try:
+            async for session in session_repository.iter_listing(query, cursor=cursor):
+                yield serialization.dumps_bytes(_listing_item(session)) + b"\n"
+        except Exception as e:
+            # 响应头已发出，只能记录日志并结束流
+            logger.error(f"Error exporting sessions: {e}")
+    
+    return StreamingResponse(_rows(), media_type="application/x-ndjson")
+
+
 @router.get("/{session_id}")
 async def get_session(session_id: str):
     """
@@ -25,24 +111,14 @@ async def get_session(session_id: str):
     返回完整的会话数据，包括用户输入、收集的数据、报告等
     """
     try:
-        db = await get_mongodb_db()
-        session = await db.sessions.find_one({"_id": session_id})
+        session = await session_repository.get(session_id, "detail")
         
         if not session:
             raise HTTPException(status_code=404, detail=f"Session {session_id} not found")
         
         # 移除 MongoDB 的 _id，转换为可序列化的格式
         # 兼容多种数据格式
-        family_graph = session.get("family_graph", {})
-        if isinstance(family_graph, dict) and "collected_data" in family_graph:
-            # 新格式：family_graph.collected_data
-            collected_data = family_graph.get("collected_data", {})
-        elif isinstance(family_graph, dict) and family_graph:
-            # 旧格式：family_graph 直接是 collected_data
-            collected_data = family_graph
-        else:
-            # 备用：从 collected_data 字段获取
-            collected_data = session.get("collected_data", {})
+        collected_data = extract_collected_data(session)
         
         session_data = {
             "session_id": session_id,
@@ -69,14 +145,13 @@ async def get_session_report(session_id: str):
     返回已保存的报告，包括用户自定义的档案名称
     """
     try:
-        db = await get_mongodb_db()
-        session = await db.sessions.find_one({"_id": session_id})
+        session = await session_repository.get(session_id, "report")
         
         if not session:
             raise HTTPException(status_code=404, detail=f"Session {session_id} not found")
         
         # 检查是否有保存的报告
-        report = session.get("report")
+        report = await load_session_report(session)
         archive_info = {
             "archived": session.get("archived", False),
             "archive_title": session.get("archive_title"),
@@ -111,8 +186,7 @@ async def archive_session(session_id: str, archive: SessionArchive):
     注意：title 是必填字段，用户必须提供档案名称
     """
     try:
-        db = await get_mongodb_db()
-        session = await db.sessions.find_one({"_id": session_id})
+        session = await session_repository.get(session_id, "archive")
         
         if not session:
             raise HTTPException(status_code=404, detail=f"Session {session_id} not found")
@@ -132,10 +206,7 @@ async def archive_session(session_id: str, archive: SessionArchive):
             "archive_notes": archive.notes  # 用户添加的备注
         }
         
-        await db.sessions.update_one(
-            {"_id": session_id},
-            {"$set": update_data}
-        )
+        await session_repository.update(session_id, update_data)
         
         return {
             "success": True,
@@ -149,39 +220,3 @@ async def archive_session(session_id: str, archive: SessionArchive):
     except Exception as e:
         logger.error(f"Error archiving session: {e}")
         raise HTTPException(status_code=500, detail=str(e))
-
-
-@router.get("/list")
-async def list_sessions(user_id: Optional[str] = None, archived: Optional[bool] = None):
-    """
-    列出所有会话（支持筛选）
-    """
-    try:
-        db = await get_mongodb_db()
-        query = {}
-        
-        if user_id:
-            query["user_input.user_id"] = user_id
-        
-        if archived is not None:
-            query["archived"] = archived
-        
-        sessions = await db.sessions.find(query).sort("created_at", -1).limit(100).to_list(length=100)
-        
-        session_list = []
-        for session in sessions:
-            session_list.append({
-                "session_id": session.get("_id"),
-                "user_name": session.get("user_input", {}).get("name"),
-                "created_at": session.get("created_at"),
-                "archived": session.get("archived", False),
-                "archive_title": session.get("archive_title"),  # 用户自定义的档案名称
-                "archive_notes": session.get("archive_notes"),  # 用户添加的备注
-                "archived_at": session.get("archived_at"),
-                "has_report": bool(session.get("report"))
-            })
-        
-        return {"sessions": session_list, "count": len(session_list)}
-    except Exception as e:
-        logger.error(f"Error listing sessions: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
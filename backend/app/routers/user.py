@@ -1,18 +1,17 @@
 """
 用户相关路由
 """
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException
 from app.models.user import UserInput, UserResponse
 from app.services.ai_service import AIService
+from app.dependencies.resources import get_ai_service
 from app.utils.logger import logger
 
 router = APIRouter(prefix="/user", tags=["user"])
 
-ai_service = AIService()
-
 
 @router.post("/input", response_model=UserResponse)
-async def submit_input(user_input: UserInput):
+async def submit_input(user_input: UserInput, ai_service: AIService = Depends(get_ai_service)):
     """
     用户输入基本信息，启动会话
     返回 session_id
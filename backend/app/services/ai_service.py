@@ -2,21 +2,33 @@
 AI问答和NLP逻辑服务
 处理AI问答循环，逐步丰富用户家族信息
 """
+import asyncio
 import uuid
-from typing import Any, Dict, Optional, List, Tuple
-
-from openai import AsyncOpenAI
-from openai import AuthenticationError, APIError
-from motor.motor_asyncio import AsyncIOMotorClient
-import redis.asyncio as redis
+from contextlib import aclosing
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Optional, List, Tuple
 
 from app.utils.logger import logger
 from app.config import settings
 from app.utils.api_key_manager import APIKeyManager
+from app.dependencies.db import get_redis_binary
+from app.dependencies.request_context import RequestCancelled
+from app.utils.deadline import DeadlineExceeded
+from app.utils import serialization, state_codec
+from app.utils.fingerprint import fingerprint
+from app.utils.intent_matcher import get_intent_matcher
+from app.utils.json_stream import JSONStringArrayParser
+from app.utils.near_duplicate import NearDuplicateIndex
 from app.services.gateway_service import GatewayService
+from app.repositories.question_bank_repository import BUCKETS, TONES, pick_question, question_bank_repository
+from app.repositories.session_repository import session_repository
 import json
 
 
+# 流式输出回调：每收到一段生成的问题文本调用一次（WebSocket 通道用它推送 token）
+TokenCallback = Callable[[str], Awaitable[None]]
+
+
 class AIService:
     """
     RootJourney AI Service (Option A)
@@ -67,13 +79,11 @@ class AIService:
         ),
     ]
 
-    def __init__(self):
-        self._mongo_client: Optional[AsyncIOMotorClient] = None
-        self._redis: Optional[redis.Redis] = None
-
-        self._llm_client: Optional[AsyncOpenAI] = None
+    def __init__(self, gateway_service: Optional[GatewayService] = None):
+        # 只校验一次密钥配置；实际请求通过 GatewayService 的密钥池发出
+        self._llm_ready: bool = False
         self._llm_model: str = "deepseek-chat"
-        self.gateway_service = GatewayService()
+        self.gateway_service = gateway_service or GatewayService()
 
     # --------------------------
     # settings helper
@@ -90,8 +100,8 @@ class AIService:
         t = str(self._get("TONE", "tone", default="neutral")).strip().lower()
         return "warm" if t == "warm" else "neutral"
 
-    def _narrative_style_block(self) -> str:
-        if self._tone() == "warm":
+    def _narrative_style_block(self, tone: Optional[str] = None) -> str:
+        if (tone or self._tone()) == "warm":
             return """
 你是一位“家族记忆引导者”，不是信息采集器。
 你在做的是“陪伴式寻根与家族叙事”，而不是查户口填表。
@@ -108,72 +118,43 @@ class AIService:
 允许用户不确定或跳过。
 """
 
-    # --------------------------
-    # DB clients
-    # --------------------------
-    async def _get_redis(self) -> redis.Redis:
-        if self._redis is not None:
-            return self._redis
-        redis_url = self._get("REDIS_URL", "redis_url", default="redis://localhost:6379/0")
-        self._redis = redis.from_url(redis_url, decode_responses=True)
-        return self._redis
-
-    async def _get_mongo_db(self):
-        if self._mongo_client is None:
-            mongo_uri = self._get(
-                "MONGO_URI",
-                "mongo_uri",
-                "MONGODB_URL",
-                "mongodb_url",
-                default="mongodb://localhost:27017",
-            )
-            self._mongo_client = AsyncIOMotorClient(mongo_uri)
-        db_name = self._get("MONGODB_DB_NAME", "mongodb_db_name", default="rootjourney")
-        return self._mongo_client[db_name]
-
     # --------------------------
     # LLM client (DeepSeek via OpenAI SDK)
     # --------------------------
     def _ensure_llm(self) -> None:
-        if self._llm_client is not None:
+        if self._llm_ready:
             return
 
-        # 使用APIKeyManager统一获取密钥（支持运行时设置）
-        key = APIKeyManager.get_deepseek_key()
-        if not key:
-            error_msg = "DEEPSEEK_API_KEY 未配置。请在环境变量或.env文件中设置 DEEPSEEK_API_KEY，或使用APIKeyManager.set_deepseek_key()在运行时设置。"
+        # 使用APIKeyManager统一获取密钥（支持运行时设置和密钥池），检查整个密钥池而不是第一个密钥
+        keys = APIKeyManager.get_deepseek_keys()
+        if not keys:
+            error_msg = "DEEPSEEK_API_KEY 未配置。请在环境变量或.env文件中设置 DEEPSEEK_API_KEY（或 DEEPSEEK_API_KEYS），或使用APIKeyManager.set_deepseek_key()在运行时设置。"
             logger.error(error_msg)
             raise RuntimeError(error_msg)
 
-        # 验证密钥格式
-        if not isinstance(key, str) or len(key.strip()) == 0:
-            error_msg = "DEEPSEEK_API_KEY 格式无效：密钥不能为空"
-            logger.error(error_msg)
-            raise RuntimeError(error_msg)
-        
-        # 检查密钥是否是占位符
-        if key.upper() in ["DEEPSEEK_API_KEY", "OPENAI_API_KEY", "YOUR_API_KEY", "YOUR_DEEPSEEK_API_KEY"]:
-            error_msg = f"DEEPSEEK_API_KEY 配置错误：检测到占位符值 '{key}'。请设置真实的API密钥。"
+        # 检查密钥是否是占位符：只要池中还有真实密钥就继续，占位符只记录警告
+        placeholders = {"DEEPSEEK_API_KEY", "OPENAI_API_KEY", "YOUR_API_KEY", "YOUR_DEEPSEEK_API_KEY"}
+        usable = [key for key in keys if key.upper() not in placeholders]
+        if not usable:
+            error_msg = f"DEEPSEEK_API_KEY 配置错误：检测到占位符值 '{keys[0]}'。请设置真实的API密钥。"
             logger.error(error_msg)
             raise RuntimeError(error_msg)
+        if len(usable) < len(keys):
+            logger.warning(f"DeepSeek 密钥池中有 {len(keys) - len(usable)} 个占位符密钥，请求会因认证失败而被冷却")
 
         # 验证密钥格式（DeepSeek密钥通常以sk-开头）
-        key_stripped = key.strip()
-        if not key_stripped.startswith("sk-"):
-            logger.warning(f"API密钥格式可能不正确：DeepSeek API密钥通常以'sk-'开头，当前密钥以'{key_stripped[:3]}'开头")
+        for key in usable:
+            if not key.startswith("sk-"):
+                logger.warning(f"API密钥格式可能不正确：DeepSeek API密钥通常以'sk-'开头，{self._mask_api_key(key)} 以'{key[:3]}'开头")
 
         # 记录密钥信息（部分掩码）
-        key_preview = self._mask_api_key(key_stripped)
-        # 检测密钥来源：如果settings中没有密钥或密钥不匹配，说明是运行时设置的
-        key_source = "配置文件"
-        if not settings.deepseek_api_key or settings.deepseek_api_key != key_stripped:
-            key_source = "运行时设置"
-        logger.info(f"使用 DeepSeek API密钥: {key_preview} (来源: {key_source})")
+        key_previews = ", ".join(self._mask_api_key(key) for key in usable)
+        logger.info(f"使用 DeepSeek API密钥池: {len(usable)} 个密钥 ({key_previews})")
 
         base_url = self._get("DEEPSEEK_BASE_URL", "deepseek_base_url", default="https://api.deepseek.com")
         model = self._get("DEEPSEEK_MODEL", "deepseek_model", default="deepseek-chat")
 
-        self._llm_client = AsyncOpenAI(api_key=key_stripped, base_url=base_url)
+        self._llm_ready = True
         self._llm_model = model
         logger.info(f"使用 DeepSeek API: base_url={base_url}, model={model}, tone={self._tone()}")
     
@@ -190,38 +171,33 @@ class AIService:
         return f"session:{session_id}"
 
     async def _load_state(self, session_id: str) -> Dict[str, Any]:
-        r = await self._get_redis()
+        # 会话状态可能是 msgpack / 压缩后的字节，使用不做 UTF-8 解码的客户端
+        r = await get_redis_binary()
         raw = await r.get(self._rk(session_id))
         if not raw:
             raise ValueError(f"Session {session_id} not found（请先调用 /user/input 创建 session）")
-        return json.loads(raw)
+        return state_codec.decode(raw)
 
     async def _save_state(self, session_id: str, state: Dict[str, Any]) -> None:
-        r = await self._get_redis()
+        r = await get_redis_binary()
         ttl = int(self._get("SESSION_EXPIRE_SECONDS", "session_expire_seconds", default=3600))
-        await r.set(self._rk(session_id), json.dumps(state, ensure_ascii=False), ex=ttl)
+        await r.set(self._rk(session_id), state_codec.encode(state), ex=ttl)
 
     # --------------------------
     # Utilities
     # --------------------------
     def _is_end_request(self, answer: str) -> bool:
-        """检查用户是否想要结束对话"""
+        """检查用户是否想要结束对话（关键词见 app/data/intents/end.txt）"""
         if not answer:
             return False
-        answer_lower = answer.strip().lower()
-        end_keywords = [
-            "结束", "完成", "好了", "够了", "可以了", 
-            "结束对话", "完成对话", "不再继续", "不想继续",
-            "停止", "退出", "不聊了", "结束吧", "完成吧"
-        ]
-        return any(keyword in answer_lower for keyword in end_keywords)
+        return get_intent_matcher().match(answer.strip(), "end") is not None
     
     def _is_skip(self, answer: str) -> bool:
+        """不知道 / 不记得 / 没有（关键词见 app/data/intents/skip.txt）；空回答也视为跳过"""
         a = (answer or "").strip()
         if a == "":
             return True
-        skip_words = ["不知道", "不清楚", "不确定", "忘了", "没有", "暂无", "不记得", "不了解", "说不准", "不太清楚"]
-        return any(w in a for w in skip_words)
+        return get_intent_matcher().match(a, "skip") is not None
 
     def _deep_merge(self, base: Dict[str, Any], new: Dict[str, Any]) -> Dict[str, Any]:
         if not isinstance(base, dict):
@@ -248,9 +224,11 @@ class AIService:
         return cur
 
     def _pick_best_question(self, candidates: list[str], fallback: str, asked_before: list[str]) -> str:
+        # 换个说法的近似重复问题也跳过，避免多问一轮
+        asked_index = NearDuplicateIndex(asked_before)
         for q in candidates:
             q = (q or "").strip()
-            if q and q not in asked_before:
+            if q and not asked_index.is_duplicate(q):
                 return q
         # 兜底也要避免完全重复：如果兜底问法也问过，就稍微变体一下
         if fallback in asked_before:
@@ -288,45 +266,18 @@ class AIService:
         user_profile 通常是 pydantic model（UserInput），这里兼容 model_dump()/dict()
         """
         session_id = str(uuid.uuid4())
-
-        if hasattr(user_profile, "model_dump"):
-            profile_dict = user_profile.model_dump()
-        elif hasattr(user_profile, "dict"):
-            profile_dict = user_profile.dict()
-        elif isinstance(user_profile, dict):
-            profile_dict = user_profile
-        else:
-            profile_dict = {"raw": str(user_profile)}
+        profile_dict = self._profile_dict(user_profile)
 
         # 初始化 collected_data：把用户基础信息也作为线索的一部分
         collected = {"user_profile": profile_dict}
 
-        # 第一问：来自 FLOW[0]
-        first_step, first_topic, first_fallback, _ = self.FLOW[0]
-        asked_questions: list[str] = []
+        # 第一问：来自 FLOW[0]，从预生成的问题库中轮换取用并按用户资料填充，不等待 LLM
+        first_step, _, first_fallback, _ = self.FLOW[0]
+        first_q = first_fallback
+        if settings.question_bank_enabled:
+            first_q = await pick_question(first_step, self._tone(), profile_dict) or first_fallback
 
-        # 用 AI 生成候选（温暖叙事）
-        try:
-            candidates = await self._generate_candidate_questions(
-                topic=first_topic,
-                collected_data=collected,
-                n=4,
-                avoid=[],
-            )
-            first_q = self._pick_best_question(candidates, first_fallback, asked_questions)
-        except Exception:
-            first_q = first_fallback
-
-        asked_questions.append(first_q)
-
-        state = {
-            "session_id": session_id,
-            "step": first_step,
-            "current_question": first_q,
-            "asked_questions": asked_questions,
-            "collected_data": collected,
-            "question_count": 0,
-        }
+        state = self._initial_state(session_id, collected, first_q)
 
         # 保存状态到Redis（必需）
         try:
@@ -338,11 +289,10 @@ class AIService:
 
         # 可选：Mongo 持久化 session 记录（失败也不影响）
         try:
-            db = await self._get_mongo_db()
             # 统一存储格式：family_graph.collected_data
-            await db.sessions.update_one(
-                {"_id": session_id},
-                {"$set": {"user_profile": profile_dict, "family_graph": {"collected_data": collected}}},
+            await session_repository.update(
+                session_id,
+                {"user_profile": profile_dict, "family_graph": {"collected_data": collected}},
                 upsert=True,
             )
         except Exception as e:
@@ -350,6 +300,68 @@ class AIService:
 
         logger.info(f"Session started: {session_id}")
         return session_id
+
+    async def start_sessions_bulk(self, user_profiles: List[Any]) -> List[str]:
+        """
+        批量创建会话（宗亲会等整批导入）
+        不为每个成员调用 LLM 生成首问，直接使用 FLOW 的兜底问法；
+        Redis 状态用一次 pipeline 写入，MongoDB 用一次 insert_many 写入
+        """
+        first_fallback = self.FLOW[0][2]
+        session_ids: List[str] = []
+        states: List[Dict[str, Any]] = []
+        documents: List[Dict[str, Any]] = []
+        for user_profile in user_profiles:
+            session_id = str(uuid.uuid4())
+            profile_dict = self._profile_dict(user_profile)
+            collected = {"user_profile": profile_dict}
+            session_ids.append(session_id)
+            states.append(self._initial_state(session_id, collected, first_fallback))
+            documents.append({
+                "_id": session_id,
+                "user_profile": profile_dict,
+                "family_graph": {"collected_data": collected},
+            })
+
+        ttl = int(self._get("SESSION_EXPIRE_SECONDS", "session_expire_seconds", default=3600))
+        try:
+            r = await get_redis_binary()
+            pipe = r.pipeline(transaction=False)
+            for session_id, state in zip(session_ids, states):
+                pipe.set(self._rk(session_id), state_codec.encode(state), ex=ttl)
+            await pipe.execute()
+        except Exception as e:
+            error_msg = f"无法连接到Redis服务器，请检查Redis服务是否运行。错误详情: {str(e)}"
+            logger.error(error_msg)
+            raise RuntimeError(error_msg)
+
+        try:
+            await session_repository.insert_many(documents)
+        except Exception as e:
+            logger.warning(f"Mongo 批量写入 session 失败（不影响主流程）：{e}")
+
+        logger.info(f"Sessions started in bulk: {len(session_ids)}")
+        return session_ids
+
+    def _profile_dict(self, user_profile: Any) -> Dict[str, Any]:
+        """兼容 pydantic model（model_dump()/dict()）和 dict"""
+        if hasattr(user_profile, "model_dump"):
+            return user_profile.model_dump()
+        if hasattr(user_profile, "dict"):
+            return user_profile.dict()
+        if isinstance(user_profile, dict):
+            return user_profile
+        return {"raw": str(user_profile)}
+
+    def _initial_state(self, session_id: str, collected: Dict[str, Any], first_question: str) -> Dict[str, Any]:
+        return {
+            "session_id": session_id,
+            "step": self.FLOW[0][0],
+            "current_question": first_question,
+            "asked_questions": [first_question],
+            "collected_data": collected,
+            "question_count": 0,
+        }
     
     async def get_initial_question(self, session_id: str) -> str:
         """
@@ -357,6 +369,10 @@ class AIService:
         用于获取初始问题或重新获取问题
         """
         state = await self._load_state(session_id)
+        return self.current_question(state)
+
+    def current_question(self, state: Dict[str, Any]) -> str:
+        """会话状态中的当前问题；还没有时返回当前步骤的兜底问法"""
         current_q = state.get("current_question")
         if current_q:
             return current_q
@@ -372,15 +388,29 @@ class AIService:
             _, _, fallback, _ = self.FLOW[0]
             return fallback
     
-    async def process_answer(self, session_id: str, answer: str) -> Dict[str, Any]:
+    async def load_state(self, session_id: str) -> Dict[str, Any]:
+        """读取会话问答状态（WebSocket 连接建立时读取一次，之后在内存中维护）"""
+        return await self._load_state(session_id)
+
+    async def process_answer(
+        self,
+        session_id: str,
+        answer: str,
+        state: Optional[Dict[str, Any]] = None,
+        on_token: Optional[TokenCallback] = None,
+    ) -> Dict[str, Any]:
         """
         处理用户回答，生成下一个问题
         如果数据收集完成或达到最大轮数，返回完成状态
+        state: 调用方在内存中持有的会话状态（WebSocket 连接），传入时不再从 Redis 读取，
+               原地更新后照常写回 Redis
+        on_token: 传入时以流式方式生成下一个问题，并把生成的文本片段逐段回调
         """
-        state = await self._load_state(session_id)
+        if state is None:
+            state = await self._load_state(session_id)
 
         step = state.get("step") or self.FLOW[0][0]
-        current_q = state.get("current_question") or await self.get_initial_question(session_id)
+        current_q = self.current_question(state)
 
         collected = state.get("collected_data") or {}
         asked = state.get("asked_questions") or []
@@ -428,8 +458,7 @@ class AIService:
                 return {"status": "complete", "question": None, "step": "complete"}
 
             next_step, next_topic, next_fallback, _ = nxt
-            candidates = await self._generate_candidate_questions(next_topic, collected, n=4, avoid=asked)
-            next_q = self._pick_best_question(candidates, next_fallback, asked)
+            next_q = await self._next_question(next_topic, collected, next_fallback, asked, on_token, step=next_step)
 
             state["collected_data"] = collected
             state["question_count"] = count + 1
@@ -458,10 +487,11 @@ class AIService:
                 current_question=current_q,
                 user_answer=answer,
                 topic_hint="围绕上一问的家族线索（允许模糊、不确定也可以）",
+                on_token=on_token,
             )
 
             # 避免重复
-            if soft_q in asked:
+            if NearDuplicateIndex(asked).is_duplicate(soft_q):
                 candidates = await self._generate_candidate_questions(
                     topic="围绕上一问的主题，换一种更容易回答的问法（更温和、更叙事）",
                     collected_data=collected,
@@ -494,8 +524,7 @@ class AIService:
             return {"status": "complete", "question": None, "step": "complete"}
 
         next_step, next_topic, next_fallback, _ = nxt
-        candidates = await self._generate_candidate_questions(next_topic, collected, n=4, avoid=asked)
-        next_q = self._pick_best_question(candidates, next_fallback, asked)
+        next_q = await self._next_question(next_topic, collected, next_fallback, asked, on_token, step=next_step)
 
         state["collected_data"] = collected
         state["question_count"] = count + 1
@@ -507,16 +536,76 @@ class AIService:
 
         return {"status": "continue", "question": next_q, "step": next_step}
 
+    async def process_batch(self, session_id: str, pairs: List[Dict[str, str]]) -> Dict[str, Any]:
+        """
+        批量导入一整段访谈（线下访谈转写）
+        对全部 (问题, 回答) 只做一次（过长时分几段）批量抽取，用 _deep_merge 合并到 collected_data，
+        不生成下一问：下一步直接使用 FLOW 的兜底问法
+        """
+        state = await self._load_state(session_id)
+        collected = state.get("collected_data") or {}
+        count = int(state.get("question_count") or 0)
+
+        pairs = [
+            {"q": (p.get("question") or "").strip(), "a": (p.get("answer") or "").strip()}
+            for p in pairs
+        ]
+        # “不知道/没有”不参与抽取，但和其他回答一样保留在对话历史中（记忆卡片会用到）
+        answered = [p for p in pairs if p["a"] and not self._is_skip(p["a"])]
+
+        extracted: Dict[str, Any] = {}
+        if answered:
+            extracted = await self._extract_family_info_batch(answered, collected)
+            if extracted:
+                collected = self._deep_merge(collected, extracted)
+
+        collected.setdefault("_unparsed", [])
+        collected["_unparsed"].extend({"step": "batch", "q": p["q"], "a": p["a"]} for p in pairs if p["a"])
+
+        state["collected_data"] = collected
+        state["question_count"] = count + len(pairs)
+
+        nxt = self._find_missing_step(collected)
+        if not nxt:
+            state["current_question"] = None
+            state["step"] = "complete"
+            result = {"status": "complete", "question": None, "step": "complete"}
+        else:
+            next_step, _, next_fallback, _ = nxt
+            asked = state.get("asked_questions") or []
+            next_q = self._pick_best_question([], next_fallback, asked)
+            state["step"] = next_step
+            state["current_question"] = next_q
+            state["asked_questions"] = (asked + [next_q])[-30:]
+            result = {"status": "continue", "question": next_q, "step": next_step}
+
+        await self._save_state(session_id, state)
+        await self._persist_mongo(session_id, collected)
+
+        result["imported"] = len(pairs)
+        result["extracted"] = extracted
+        return result
+
+    def _find_missing_step(self, collected_data: Dict[str, Any]) -> Optional[Tuple[str, str, str, Optional[str]]]:
+        """第一个字段仍为空的 FLOW 步骤（叙事类步骤视为已由访谈覆盖）"""
+        for flow_step in self.FLOW:
+            field_path = flow_step[3]
+            if not field_path:
+                continue
+            v = self._get_by_path(collected_data, field_path)
+            if v is None or str(v).strip() == "":
+                return flow_step
+        return None
+
     # --------------------------
     # Mongo persist (optional)
     # --------------------------
     async def _persist_mongo(self, session_id: str, collected: Dict[str, Any]) -> None:
         try:
-            db = await self._get_mongo_db()
             # 统一存储格式：family_graph.collected_data
-            update_result = await db.sessions.update_one(
-                {"_id": session_id},
-                {"$set": {"family_graph": {"collected_data": collected}}},
+            update_result = await session_repository.update(
+                session_id,
+                {"family_graph": {"collected_data": collected}},
                 upsert=True,
             )
             # 记录保存结果（用于调试）
@@ -533,6 +622,31 @@ class AIService:
     # --------------------------
     # AI: candidate questions (Option A)
     # --------------------------
+    def _candidate_questions_prompt(self, topic: str, collected_data: Dict[str, Any], n: int, avoid: list[str]) -> str:
+        return f"""
+{self._narrative_style_block()}
+
+基于已收集的家族数据，生成{n}个候选问题来丰富家族信息。
+
+**重要：所有问题必须围绕寻根、寻祖际、寻家族这三个核心主题**
+
+主题：{topic}
+
+已收集数据：{serialization.dumps(collected_data)}
+
+已问过的问题（避免重复）：
+{serialization.dumps(avoid)}
+
+要求：
+1. 避免重复已问过的问题
+2. 围绕主题"{topic}"，逐步深入询问家族信息
+3. **所有问题必须围绕寻根、寻祖际、寻家族这三个核心主题**
+4. 问题要自然、友好、温暖，像在陪伴用户寻根
+5. 鼓励用户分享任何与寻根、寻祖际、寻家族相关的线索
+6. 返回JSON数组格式，例如：["问题1", "问题2", "问题3", "问题4"]
+7. 只返回JSON数组，不要其他文字
+"""
+
     async def _generate_candidate_questions(
         self,
         topic: str,
@@ -540,67 +654,254 @@ class AIService:
         n: int = 4,
         avoid: Optional[list[str]] = None,
     ) -> list[str]:
+        from openai import AuthenticationError, APIError
         self._ensure_llm()
         avoid = avoid or []
+        prompt = self._candidate_questions_prompt(topic, collected_data, n, avoid)
+        try:
+            # 短小的交互调用：允许网关发出对冲请求以降低长尾延迟
+            response = await self.gateway_service.llm_chat(
+                messages=[{"role": "user", "content": prompt}],
+                model=self._llm_model,
+                temperature=0.8 if self._tone() == "warm" else 0.5,
+                call_site="candidate_questions",
+                hedge=True,
+            )
+            return self._parse_question_list(response)[:n]
+        except (RequestCancelled, DeadlineExceeded):
+            raise
+        except AuthenticationError as e:
+            logger.error(f"生成候选问题失败 - 认证错误: API密钥无效")
+            logger.error(f"  错误详情: {e}")
+            logger.error(f"  请检查: 1) API密钥是否正确 2) 密钥是否已过期 3) 密钥是否有足够余额")
+        except APIError as e:
+            logger.warning(f"生成候选问题失败 - API错误: {e}")
+        except Exception as e:
+            logger.warning(f"生成候选问题失败：{e}")
+
+        return []
 
+    async def _next_question(
+        self,
+        topic: str,
+        collected_data: Dict[str, Any],
+        fallback: str,
+        asked: list[str],
+        on_token: Optional[TokenCallback] = None,
+        step: Optional[str] = None,
+    ) -> str:
+        """
+        生成下一个问题：传入 on_token 时流式生成单个问题并逐段推送；
+        否则流式生成候选问题，取第一个可用的（关闭流式时等待完整的候选列表）
+        LLM 没有给出可用问题时，先从该步骤的问题库取，最后才用兜底问法
+        """
+        if on_token is not None:
+            candidates = [await self._stream_question(topic, collected_data, asked, on_token)]
+        elif settings.candidate_question_streaming:
+            candidates = [await self._first_candidate_question(topic, collected_data, asked)]
+        else:
+            candidates = await self._generate_candidate_questions(topic, collected_data, n=4, avoid=asked)
+        asked_index = NearDuplicateIndex(asked)
+        usable = [q for q in candidates if (q or "").strip() and not asked_index.is_duplicate(q)]
+        if not usable and step and settings.question_bank_enabled:
+            profile = collected_data.get("user_profile") or {}
+            banked = await pick_question(step, self._tone(), profile, avoid=asked)
+            if banked:
+                return banked
+        return self._pick_best_question(candidates, fallback, asked)
+
+    async def _stream_text(self, prompt: str, temperature: float, call_site: str, on_token: TokenCallback) -> str:
+        """流式调用 LLM，逐段回调并返回完整文本"""
+        parts: list[str] = []
+        async for delta in self.gateway_service.llm_chat_stream(
+            messages=[{"role": "user", "content": prompt}],
+            model=self._llm_model,
+            temperature=temperature,
+            call_site=call_site,
+        ):
+            parts.append(delta)
+            await on_token(delta)
+        return "".join(parts).strip()
+
+    async def _stream_question(
+        self,
+        topic: str,
+        collected_data: Dict[str, Any],
+        avoid: list[str],
+        on_token: TokenCallback,
+    ) -> str:
+        """
+        流式生成单个问题（WebSocket 通道）
+        与候选问题不同，只生成一个问题并直接输出纯文本，便于边生成边推送；
+        失败或与已问过的问题重复时由调用方回退到兜底问法
+        """
+        self._ensure_llm()
         prompt = f"""
 {self._narrative_style_block()}
 
-基于已收集的家族数据，生成{n}个候选问题来丰富家族信息。
+基于已收集的家族数据，提出下一个问题来丰富家族信息。
 
-**重要：所有问题必须围绕寻根、寻祖际、寻家族这三个核心主题**
+**重要：问题必须围绕寻根、寻祖际、寻家族这三个核心主题**
 
 主题：{topic}
 
-已收集数据：{json.dumps(collected_data, ensure_ascii=False)}
+已收集数据：{serialization.dumps(collected_data)}
 
 已问过的问题（避免重复）：
-{json.dumps(avoid, ensure_ascii=False)}
+{serialization.dumps(avoid)}
 
 要求：
-1. 避免重复已问过的问题
-2. 围绕主题"{topic}"，逐步深入询问家族信息
-3. **所有问题必须围绕寻根、寻祖际、寻家族这三个核心主题**
-4. 问题要自然、友好、温暖，像在陪伴用户寻根
-5. 鼓励用户分享任何与寻根、寻祖际、寻家族相关的线索
-6. 返回JSON数组格式，例如：["问题1", "问题2", "问题3", "问题4"]
-7. 只返回JSON数组，不要其他文字
+1. 不要重复已问过的问题
+2. 问题要自然、友好、温暖，像在陪伴用户寻根
+3. 只返回一个问题的文本，不要编号、引号或其他文字
 """
         try:
-            response = await self._llm_client.chat.completions.create(
-                model=self._llm_model,
-                messages=[{"role": "user", "content": prompt}],
+            return await self._stream_text(
+                prompt,
                 temperature=0.8 if self._tone() == "warm" else 0.5,
+                call_site="question_stream",
+                on_token=on_token,
             )
-            content = (response.choices[0].message.content or "").strip()
-            if content.startswith("```"):
-                content = content.strip("`")
-                content = content.replace("json", "", 1).strip()
+        except (RequestCancelled, DeadlineExceeded):
+            raise
+        except Exception as e:
+            logger.warning(f"流式生成问题失败：{e}")
+            return ""
+
+    def _parse_question_list(self, response: Optional[str]) -> list[str]:
+        """解析 LLM 返回的 JSON 问题数组（去掉代码块标记、去重）；格式错误时抛出 ValueError"""
+        content = (response or "").strip()
+        if content.startswith("```"):
+            content = content.strip("`")
+            content = content.replace("json", "", 1).strip()
+
+        data = json.loads(content)
+        out: list[str] = []
+        if isinstance(data, list):
+            for q in data:
+                if isinstance(q, str):
+                    q = q.strip()
+                    if q and q not in out:
+                        out.append(q)
+        return out
 
-            data = json.loads(content)
-            if isinstance(data, list):
-                out: list[str] = []
-                for q in data:
-                    if isinstance(q, str):
+    async def _first_candidate_question(
+        self,
+        topic: str,
+        collected_data: Dict[str, Any],
+        avoid: list[str],
+        n: int = 4,
+    ) -> str:
+        """
+        流式生成候选问题，数组中第一个可用（非空、与已问过的问题不重复）的问题一完整就返回，
+        并关闭流、停止生成剩余候选；失败或没有可用问题时返回空字符串
+        流式调用不做对冲请求（对冲只用于 _generate_candidate_questions 的非流式调用）
+        """
+        from openai import AuthenticationError, APIError
+        self._ensure_llm()
+        prompt = self._candidate_questions_prompt(topic, collected_data, n, avoid)
+        parser = JSONStringArrayParser()
+        avoid_index = NearDuplicateIndex(avoid)
+        stream = self.gateway_service.llm_chat_stream(
+            messages=[{"role": "user", "content": prompt}],
+            model=self._llm_model,
+            temperature=0.8 if self._tone() == "warm" else 0.5,
+            call_site="candidate_questions",
+        )
+        try:
+            async with aclosing(stream):
+                async for delta in stream:
+                    for q in parser.feed(delta):
                         q = q.strip()
-                        if q and q not in out:
-                            out.append(q)
-                return out[:n]
+                        if q and not avoid_index.is_duplicate(q):
+                            return q
+                    if parser.done:
+                        break
+        except (RequestCancelled, DeadlineExceeded):
+            raise
         except AuthenticationError as e:
-            current_key = APIKeyManager.get_deepseek_key()
-            key_preview = self._mask_api_key(current_key) if current_key else "未配置"
             logger.error(f"生成候选问题失败 - 认证错误: API密钥无效")
-            logger.error(f"  使用的密钥: {key_preview}")
             logger.error(f"  错误详情: {e}")
-            logger.error(f"  请检查: 1) API密钥是否正确 2) 密钥是否已过期 3) 密钥是否有足够余额")
         except APIError as e:
             logger.warning(f"生成候选问题失败 - API错误: {e}")
         except Exception as e:
             logger.warning(f"生成候选问题失败：{e}")
+        return ""
 
-        return []
+    # --------------------------
+    # AI: question bank
+    # --------------------------
+    async def _generate_bank_questions(self, step: str, tone: str, bucket: str, n: int) -> list[str]:
+        """为一个 (步骤, 语气, 分组) 生成 n 个通用问题模板"""
+        _, topic, fallback, _ = next(item for item in self.FLOW if item[0] == step)
+        audience = {
+            "young": "30 岁以下的年轻人（祖辈的事多是听父母讲的）",
+            "middle": "30 到 60 岁的中年人",
+            "senior": "60 岁以上的长辈（可能亲历过老家的生活）",
+            "unknown": "年龄不详的用户",
+        }[bucket]
+        prompt = f"""
+{self._narrative_style_block(tone)}
+
+请为家族寻根访谈的一个环节预先写好{n}个不同的问法，之后会随机挑一个作为该环节的问题。
+
+环节主题：{topic}
+参考问法：{fallback}
+提问对象：{audience}
+
+要求：
+1. 每个问法都围绕上面的主题，但措辞、切入角度各不相同
+2. 可以用占位符 {{name}}（用户姓名）和 {{birth_place}}（用户填写的籍贯）让问题更亲切，
+   大约一半的问法使用占位符，另一半不使用；不要使用其他占位符
+3. 不要依赖用户之前的回答（这是通用问法）
+4. 返回JSON数组格式，例如：["问题1", "问题2"]
+5. 只返回JSON数组，不要其他文字
+"""
+        response = await self.gateway_service.llm_chat(
+            messages=[{"role": "user", "content": prompt}],
+            model=self._llm_model,
+            temperature=0.9 if tone == "warm" else 0.7,
+            call_site="question_bank",
+        )
+        return self._parse_question_list(response)[:n]
 
-    async def _generate_soft_clarify(self, current_question: str, user_answer: str, topic_hint: str = "") -> str:
+    async def refresh_question_bank(
+        self,
+        steps: Optional[List[str]] = None,
+        tones: Optional[List[str]] = None,
+        buckets: Optional[List[str]] = None,
+    ) -> Dict[str, int]:
+        """
+        重新生成问题库（离线脚本或后台任务调用）
+        返回每个问题库写入的模板数；单个问题库生成失败时保留旧数据
+        """
+        self._ensure_llm()
+        steps = steps or [item[0] for item in self.FLOW]
+        combos = [(s, t, b) for s in steps for t in (tones or TONES) for b in (buckets or BUCKETS)]
+        limit = asyncio.Semaphore(max(1, settings.question_bank_refresh_concurrency))
+
+        async def refresh(step: str, tone: str, bucket: str) -> int:
+            async with limit:
+                try:
+                    templates = await self._generate_bank_questions(step, tone, bucket, settings.question_bank_size)
+                    return await question_bank_repository.replace(step, tone, bucket, templates)
+                except Exception as e:
+                    logger.warning(f"问题库生成失败 {step}/{tone}/{bucket}：{e}")
+                    return 0
+
+        counts = await asyncio.gather(*[refresh(*combo) for combo in combos])
+        result = {":".join(combo): count for combo, count in zip(combos, counts)}
+        logger.info(f"Question bank refreshed: {sum(1 for c in counts if c)}/{len(combos)} banks")
+        return result
+
+    async def _generate_soft_clarify(
+        self,
+        current_question: str,
+        user_answer: str,
+        topic_hint: str = "",
+        on_token: Optional[TokenCallback] = None,
+    ) -> str:
+        from openai import AuthenticationError, APIError
         self._ensure_llm()
         prompt = f"""
 {self._narrative_style_block()}
@@ -620,19 +921,23 @@ class AIService:
 请返回一个更温柔、更容易回答的追问问题。
 只返回问题文本，不要其他文字。
 """
+        temperature = 0.8 if self._tone() == "warm" else 0.6
         try:
-            response = await self._llm_client.chat.completions.create(
-                model=self._llm_model,
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.8 if self._tone() == "warm" else 0.6,
-            )
-            q = (response.choices[0].message.content or "").strip()
+            if on_token is not None:
+                response = await self._stream_text(prompt, temperature, "soft_clarify", on_token)
+            else:
+                response = await self.gateway_service.llm_chat(
+                    messages=[{"role": "user", "content": prompt}],
+                    model=self._llm_model,
+                    temperature=temperature,
+                    call_site="soft_clarify",
+                )
+            q = (response or "").strip()
             return q or "没关系，我们换个角度想想：你对这件事有没有任何模糊的印象（比如省份或城市）？"
+        except (RequestCancelled, DeadlineExceeded):
+            raise
         except AuthenticationError as e:
-            current_key = APIKeyManager.get_deepseek_key()
-            key_preview = self._mask_api_key(current_key) if current_key else "未配置"
             logger.error(f"soft clarify 生成失败 - 认证错误: API密钥无效")
-            logger.error(f"  使用的密钥: {key_preview}")
             logger.error(f"  错误详情: {e}")
             logger.error(f"  请检查: 1) API密钥是否正确 2) 密钥是否已过期 3) 密钥是否有足够余额")
             return "没关系，我们换个角度想想：你对这件事有没有任何模糊的印象（比如省份或城市）？"
@@ -647,6 +952,7 @@ class AIService:
     # AI: extract structured info
     # --------------------------
     async def _extract_family_info(self, answer: str, current_question: str, existing_data: Dict[str, Any]) -> Dict[str, Any]:
+        from openai import AuthenticationError, APIError
         self._ensure_llm()
 
         prompt = f"""
@@ -659,7 +965,7 @@ class AIService:
 {answer}
 
 【已有数据】：
-{json.dumps(existing_data, ensure_ascii=False)}
+{serialization.dumps(existing_data)}
 
 抽取规则：
 - 只输出 JSON，不要 markdown，不要解释
@@ -674,12 +980,14 @@ class AIService:
 {{"father": {{"origin": "山东枣庄"}}}}
 """
         try:
-            resp = await self._llm_client.chat.completions.create(
-                model=self._llm_model,
+            resp = await self.gateway_service.llm_chat(
                 messages=[{"role": "user", "content": prompt}],
+                model=self._llm_model,
                 temperature=0.0,
+                call_site="extract_family_info",
+                hedge=True,
             )
-            content = (resp.choices[0].message.content or "").strip()
+            content = (resp or "").strip()
 
             if content.startswith("```"):
                 content = content.strip("`")
@@ -689,11 +997,10 @@ class AIService:
             if not isinstance(data, dict):
                 return {}
             return data
+        except (RequestCancelled, DeadlineExceeded):
+            raise
         except AuthenticationError as e:
-            current_key = APIKeyManager.get_deepseek_key()
-            key_preview = self._mask_api_key(current_key) if current_key else "未配置"
             logger.error(f"抽取失败 - 认证错误: API密钥无效")
-            logger.error(f"  使用的密钥: {key_preview}")
             logger.error(f"  错误详情: {e}")
             logger.error(f"  请检查: 1) API密钥是否正确 2) 密钥是否已过期 3) 密钥是否有足够余额")
             return {}
@@ -704,6 +1011,85 @@ class AIService:
             logger.error(f"抽取失败：{e}")
             return {}
 
+    def _batch_chunks(self, pairs: List[Dict[str, str]]) -> List[List[Dict[str, str]]]:
+        """按字符数把访谈切成若干段，避免单次提示词过长"""
+        limit = settings.batch_extract_max_chars
+        chunks: List[List[Dict[str, str]]] = []
+        current: List[Dict[str, str]] = []
+        size = 0
+        for p in pairs:
+            length = len(p["q"]) + len(p["a"])
+            if current and size + length > limit:
+                chunks.append(current)
+                current, size = [], 0
+            current.append(p)
+            size += length
+        if current:
+            chunks.append(current)
+        return chunks
+
+    async def _extract_family_info_batch(self, pairs: List[Dict[str, str]], existing_data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        批量抽取：一次调用处理多轮 (问题, 回答)，输出与 _extract_family_info 相同结构的 JSON
+        访谈过长时分段抽取，后一段能看到前一段的结果
+        """
+        from openai import AuthenticationError, APIError
+        self._ensure_llm()
+
+        merged: Dict[str, Any] = {}
+        for chunk in self._batch_chunks(pairs):
+            transcript = "\n\n".join(
+                f"[{i + 1}] 问：{p['q'] or '（无）'}\n答：{p['a']}" for i, p in enumerate(chunk)
+            )
+            prompt = f"""
+你是“家族信息抽取器”。下面是一段完整的家族访谈记录，请综合所有问答抽取结构化信息并输出一个 JSON。
+
+【访谈记录】：
+{transcript}
+
+【已有数据】：
+{serialization.dumps(self._deep_merge(existing_data, merged))}
+
+抽取规则：
+- 只输出 JSON，不要 markdown，不要解释
+- 如果是爸爸籍贯 -> father.origin
+- 如果是爷爷籍贯 -> grandfather.origin
+- 如果是我自己的籍贯/祖籍 -> self.origin
+- 辈分字 -> self.generation_name
+- 姓氏 -> self.surname
+- 同一字段出现多次时，以后面的回答为准
+- 如果没有新信息 -> 输出空 JSON：{{}}
+
+示例：
+{{"father": {{"origin": "山东枣庄"}}, "self": {{"surname": "张"}}}}
+"""
+            try:
+                resp = await self.gateway_service.llm_chat(
+                    messages=[{"role": "user", "content": prompt}],
+                    model=self._llm_model,
+                    temperature=0.0,
+                    call_site="extract_family_info_batch",
+                )
+                content = (resp or "").strip()
+
+                if content.startswith("```"):
+                    content = content.strip("`")
+                    content = content.replace("json", "", 1).strip()
+
+                data = json.loads(content)
+                if isinstance(data, dict):
+                    merged = self._deep_merge(merged, data)
+            except (RequestCancelled, DeadlineExceeded):
+                raise
+            except AuthenticationError as e:
+                logger.error(f"批量抽取失败 - 认证错误: API密钥无效: {e}")
+                return merged
+            except APIError as e:
+                logger.error(f"批量抽取失败 - API错误: {e}")
+            except Exception as e:
+                logger.error(f"批量抽取失败：{e}")
+        return merged
+
     # --------------------------
     # AI: Summarize memories from conversation
     # --------------------------
@@ -711,41 +1097,162 @@ class AIService:
         """
         总结对话历史，生成记忆卡片
         返回格式: [{"title": "记忆标题", "content": "详细内容"}, ...]
+
+        卡片连同已覆盖的对话轮数（_unparsed 的条数）保存在会话文档的 memories 字段：
+        没有新对话时直接返回已保存的卡片；有新对话时只总结新增的几轮并合并到已有卡片
         """
+        stored = await self._load_memories(session_id)
         try:
             state = await self._load_state(session_id)
-            collected = state.get("collected_data", {})
-            asked_questions = state.get("asked_questions", [])
-            unparsed = collected.get("_unparsed", [])
-            
-            # 构建对话历史文本
-            conversation_text = ""
+        except ValueError as e:
+            # Redis 中的问答状态已过期：返回已保存的卡片
+            if stored.get("cards"):
+                return stored["cards"]
+            logger.error(f"Session {session_id} not found: {e}")
+            return []
+
+        collected = state.get("collected_data", {})
+        unparsed = collected.get("_unparsed", [])
+        cards = stored.get("cards") or []
+        covered = int(stored.get("covered_turns") or 0)
+
+        try:
             if unparsed:
-                conversation_text = "对话历史：\n"
-                for item in unparsed:
-                    q = item.get("q", "")
-                    a = item.get("a", "")
-                    if q and a:
-                        conversation_text += f"问：{q}\n答：{a}\n\n"
-            
-            # 如果没有对话历史，从collected_data中提取信息
-            if not conversation_text:
-                # 尝试从collected_data中提取文本信息
-                user_profile = collected.get("user_profile", {})
-                if user_profile:
-                    conversation_text = f"用户信息：{json.dumps(user_profile, ensure_ascii=False)}\n"
-                
-                # 提取其他收集到的信息
-                for key, value in collected.items():
-                    if key not in ["_unknown", "_unparsed", "user_profile"] and value:
-                        conversation_text += f"{key}: {json.dumps(value, ensure_ascii=False)}\n"
-            
-            if not conversation_text.strip():
+                if cards and stored.get("source") == "conversation" and covered <= len(unparsed):
+                    delta = unparsed[covered:]
+                    if not delta:
+                        return cards
+                    new_cards = await self._summarize_memory_delta(cards, self._conversation_text(delta))
+                    if new_cards is None:
+                        return cards
+                    cards = self._merge_memory_cards(cards, new_cards)
+                else:
+                    summarized = await self._summarize_memory_text(self._conversation_text(unparsed))
+                    if summarized is None:
+                        return cards
+                    cards = summarized
+                await self._save_memories(session_id, cards, "conversation", len(unparsed))
+                return cards
+
+            # 没有对话历史：从 collected_data 中提取信息，按数据指纹缓存
+            text = self._collected_text(collected)
+            if not text.strip():
                 logger.warning(f"Session {session_id} has no conversation history to summarize")
                 return []
-            
-            # 调用AI总结记忆（使用gateway_service，与step3保持一致）
-            prompt = f"""
+            data_fp = fingerprint(text)
+            if cards and stored.get("source") == "collected" and stored.get("fingerprint") == data_fp:
+                return cards
+            summarized = await self._summarize_memory_text(text)
+            if summarized is None:
+                return cards
+            await self._save_memories(session_id, summarized, "collected", 0, data_fp)
+            return summarized
+        except (RequestCancelled, DeadlineExceeded):
+            raise
+        except Exception as e:
+            logger.error(f"总结记忆时发生错误: {e}")
+            import traceback
+            logger.error(traceback.format_exc())
+            return cards
+
+    async def _load_memories(self, session_id: str) -> Dict[str, Any]:
+        """读取已保存的记忆卡片；读取失败时视为没有"""
+        try:
+            session = await session_repository.get(session_id, "memories")
+        except Exception as e:
+            logger.warning(f"读取已保存的记忆卡片失败：{e}")
+            return {}
+        return (session or {}).get("memories") or {}
+
+    async def _save_memories(
+        self,
+        session_id: str,
+        cards: List[Dict[str, str]],
+        source: str,
+        covered_turns: int,
+        data_fp: Optional[str] = None,
+    ) -> None:
+        """保存记忆卡片和已覆盖的对话轮数（失败不影响返回结果）"""
+        memories: Dict[str, Any] = {
+            "cards": cards,
+            "source": source,
+            "covered_turns": covered_turns,
+            "updated_at": datetime.now().isoformat(),
+        }
+        if data_fp:
+            memories["fingerprint"] = data_fp
+        try:
+            await session_repository.update(session_id, {"memories": memories})
+        except Exception as e:
+            logger.warning(f"保存记忆卡片失败（不影响主流程）：{e}")
+
+    @staticmethod
+    def _conversation_text(turns: List[Dict[str, Any]]) -> str:
+        text = ""
+        for item in turns:
+            q = item.get("q", "")
+            a = item.get("a", "")
+            if q and a:
+                text += f"问：{q}\n答：{a}\n\n"
+        return text
+
+    @staticmethod
+    def _collected_text(collected: Dict[str, Any]) -> str:
+        text = ""
+        user_profile = collected.get("user_profile", {})
+        if user_profile:
+            text = f"用户信息：{serialization.dumps(user_profile)}\n"
+        for key, value in collected.items():
+            if key not in ["_unknown", "_unparsed", "user_profile"] and value:
+                text += f"{key}: {serialization.dumps(value)}\n"
+        return text
+
+    def _parse_memory_cards(self, content: str) -> List[Dict[str, str]]:
+        """解析 LLM 返回的记忆卡片数组；不是合法 JSON 时抛出 json.JSONDecodeError"""
+        content = (content or "").strip()
+        if content.startswith("```"):
+            content = content.strip("`")
+            content = content.replace("json", "", 1).strip()
+        memories = json.loads(content)
+        if not isinstance(memories, list):
+            logger.warning(f"AI返回的不是数组格式: {type(memories)}")
+            return []
+        result = []
+        for mem in memories:
+            if isinstance(mem, dict) and "title" in mem and "content" in mem:
+                card = {"title": str(mem["title"]).strip(), "content": str(mem["content"]).strip()}
+                if mem.get("replaces"):
+                    card["replaces"] = str(mem["replaces"]).strip()
+                result.append(card)
+        return result
+
+    async def _call_memory_llm(self, prompt: str, call_site: str) -> Optional[List[Dict[str, str]]]:
+        """调用 LLM 生成记忆卡片；失败时返回 None（调用方保留已有卡片）"""
+        content = ""
+        try:
+            content = await self.gateway_service.llm_chat(
+                messages=[{"role": "user", "content": prompt}],
+                temperature=0.8,
+                call_site=call_site
+            )
+            return self._parse_memory_cards(content)
+        except (RequestCancelled, DeadlineExceeded):
+            raise
+        except TimeoutError as e:
+            logger.error(f"总结记忆失败 - 超时错误: {e}")
+        except json.JSONDecodeError as e:
+            logger.error(f"总结记忆失败 - JSON解析错误: {e}")
+            logger.error(f"AI返回内容: {(content or '')[:200]}")
+        except ValueError as e:
+            # gateway_service可能抛出ValueError（如API密钥未配置）
+            logger.error(f"总结记忆失败 - 配置错误: {e}")
+        except Exception as e:
+            logger.error(f"总结记忆失败: {e}")
+        return None
+
+    async def _summarize_memory_text(self, conversation_text: str) -> Optional[List[Dict[str, str]]]:
+        """从完整的对话历史生成记忆卡片"""
+        prompt = f"""
 你是一位温暖的家族记忆整理者。请从以下对话历史中，提取出3-8个温暖、有情感、有画面感的记忆片段。
 
 对话历史：
@@ -773,63 +1280,53 @@ class AIService:
 
 只返回JSON数组，不要其他文字。
 """
-            try:
-                # 使用gateway_service调用DeepSeek模型（与step3报告生成保持一致）
-                content = await self.gateway_service.llm_chat(
-                    messages=[{"role": "user", "content": prompt}],
-                    temperature=0.8,
-                    timeout=240.0  # 4分钟超时
-                )
-                content = content.strip()
-                
-                # 清理JSON格式
-                if content.startswith("```"):
-                    content = content.strip("`")
-                    content = content.replace("json", "", 1).strip()
-                
-                # 解析JSON
-                memories = json.loads(content)
-                if not isinstance(memories, list):
-                    logger.warning(f"AI返回的不是数组格式: {type(memories)}")
-                    return []
-                
-                # 验证和清理数据
-                result = []
-                for mem in memories:
-                    if isinstance(mem, dict) and "title" in mem and "content" in mem:
-                        result.append({
-                            "title": str(mem["title"]).strip(),
-                            "content": str(mem["content"]).strip()
-                        })
-                
-                logger.info(f"成功生成 {len(result)} 个记忆卡片 for session {session_id}")
-                return result
-                
-            except ValueError as e:
-                # gateway_service可能抛出ValueError（如API密钥未配置）
-                current_key = APIKeyManager.get_deepseek_key()
-                key_preview = self._mask_api_key(current_key) if current_key else "未配置"
-                logger.error(f"总结记忆失败 - 配置错误: {e}")
-                logger.error(f"  使用的密钥: {key_preview}")
-                return []
-            except TimeoutError as e:
-                logger.error(f"总结记忆失败 - 超时错误: {e}")
-                return []
-            except json.JSONDecodeError as e:
-                logger.error(f"总结记忆失败 - JSON解析错误: {e}")
-                logger.error(f"AI返回内容: {content[:200] if 'content' in locals() else 'N/A'}")
-                return []
-            except Exception as e:
-                logger.error(f"总结记忆失败: {e}")
-                import traceback
-                logger.error(traceback.format_exc())
-                return []
-                
-        except ValueError as e:
-            logger.error(f"Session {session_id} not found: {e}")
-            return []
-        except Exception as e:
-            logger.error(f"总结记忆时发生错误: {e}")
-            import traceback
-            logger.error(traceback.format_exc())
+        cards = await self._call_memory_llm(prompt, "memories")
+        if cards is not None:
+            cards = [{"title": c["title"], "content": c["content"]} for c in cards]
+            logger.info(f"成功生成 {len(cards)} 个记忆卡片")
+        return cards
+
+    async def _summarize_memory_delta(
+        self,
+        cards: List[Dict[str, str]],
+        conversation_text: str,
+    ) -> Optional[List[Dict[str, str]]]:
+        """只总结新增的对话：返回新的卡片，或对已有卡片的补充（replaces 为被替换卡片的标题）"""
+        if not conversation_text.strip():
             return []
+        existing = serialization.dumps([{"title": c["title"], "content": c["content"]} for c in cards])
+        prompt = f"""
+你是一位温暖的家族记忆整理者。下面是已经整理好的记忆卡片，以及之后新增的几轮对话。
+
+已有记忆卡片：
+{existing}
+
+新增对话：
+{conversation_text}
+
+请只根据新增对话整理记忆：
+1. 新的场景或故事：返回新卡片（title、content）
+2. 对已有卡片的补充或修正：返回改写后的完整卡片，并用 replaces 字段写出被替换卡片的原标题
+3. 新增对话没有可整理的内容时返回空数组 []
+4. 标题简洁、有诗意，内容有画面感、有温度，基于对话内容，不要重复已有卡片
+5. 不要返回未改动的已有卡片
+
+返回JSON数组，例如：[{{"title": "...", "content": "..."}}, {{"title": "...", "content": "...", "replaces": "原标题"}}]
+只返回JSON数组，不要其他文字。
+"""
+        return await self._call_memory_llm(prompt, "memories_delta")
+
+    @staticmethod
+    def _merge_memory_cards(cards: List[Dict[str, str]], updates: List[Dict[str, str]]) -> List[Dict[str, str]]:
+        """把增量结果合并到已有卡片：替换 replaces 指向的卡片，其余追加；超过上限时保留最新的"""
+        merged = [dict(c) for c in cards]
+        for update in updates:
+            card = {"title": update["title"], "content": update["content"]}
+            target = update.get("replaces") or update["title"]
+            for i, existing in enumerate(merged):
+                if existing["title"] == target:
+                    merged[i] = card
+                    break
+            else:
+                merged.append(card)
+        return merged[-settings.memory_cards_max:]
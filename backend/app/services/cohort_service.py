@@ -0,0 +1,131 @@
+"""
+宗亲批量服务
+整批导入同一宗亲会的成员：批量创建会话，按“姓氏 + 籍贯”分组，
+每组只做一次大家族关联分析和历史搜索，然后以有限并发为每个成员生成个性化报告
+"""
+import asyncio
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.config import settings
+from app.dependencies.request_context import RequestCancelled, checkpoint
+from app.repositories.clan_repository import clan_repository
+from app.services.ai_service import AIService
+from app.services.output_service import OutputService
+from app.services.search_service import SearchService
+from app.utils.deadline import DeadlineExceeded
+from app.utils.logger import logger
+from app.utils.surnames import surname_of
+
+
+EMPTY_SEARCH_RESULTS: Dict[str, Any] = {
+    "possible_families": [],
+    "family_histories": {},
+    "summary": {"total_families_found": 0, "high_relevance_families": []},
+}
+
+
+class CohortService:
+    """宗亲批量服务类"""
+
+    def __init__(
+        self,
+        ai_service: Optional[AIService] = None,
+        search_service: Optional[SearchService] = None,
+        output_service: Optional[OutputService] = None,
+    ):
+        self.ai_service = ai_service or AIService()
+        self.search_service = search_service or SearchService(gateway_service=self.ai_service.gateway_service)
+        self.output_service = output_service or OutputService(
+            ai_service=self.ai_service,
+            gateway_service=self.ai_service.gateway_service,
+            search_service=self.search_service,
+        )
+
+    @staticmethod
+    def group_key(profile: Dict[str, Any]) -> Tuple[str, str]:
+        """分组键：(姓氏, 籍贯)；未提供姓氏时从姓名中取（复姓取前两个字），与搜索时的规范化一致"""
+        surname = (profile.get("surname") or surname_of(profile.get("name") or "")).strip()
+        origin = (profile.get("birth_place") or "").strip()
+        return surname, origin
+
+    def group_members(self, profiles: List[Dict[str, Any]], session_ids: List[str]) -> Dict[Tuple[str, str], List[str]]:
+        groups: Dict[Tuple[str, str], List[str]] = {}
+        for profile, session_id in zip(profiles, session_ids):
+            groups.setdefault(self.group_key(profile), []).append(session_id)
+        return groups
+
+    async def _search_group(self, surname: str, origin: str, sample_profile: Dict[str, Any]) -> Dict[str, Any]:
+        """整组共享的大家族关联分析和历史搜索（只用组内共有的姓氏和籍贯）"""
+        collected_data: Dict[str, Any] = {
+            "user_profile": {"name": sample_profile.get("name", ""), "birth_place": origin},
+            "surname": surname,
+            "self": {"surname": surname, "origin": origin},
+        }
+        self.search_service.normalize_collected_data(collected_data)
+        try:
+            return await self.search_service.search_for_collected_data(collected_data) or EMPTY_SEARCH_RESULTS
+        except (RequestCancelled, DeadlineExceeded):
+            raise
+        except Exception as e:
+            logger.error(f"Cohort group search failed for {surname}/{origin}: {e}")
+            return EMPTY_SEARCH_RESULTS
+
+    async def run(self, profiles: List[Dict[str, Any]], generate_reports: bool = True) -> Dict[str, Any]:
+        """
+        批量创建会话并（可选）生成报告
+        返回每组的会话和每个会话的报告生成结果
+        """
+        session_ids = await self.ai_service.start_sessions_bulk(profiles)
+        groups = self.group_members(profiles, session_ids)
+        profile_by_session = dict(zip(session_ids, profiles))
+        logger.info(f"Cohort created: {len(session_ids)} sessions in {len(groups)} groups")
+
+        group_results: List[Dict[str, Any]] = []
+        report_results: List[Dict[str, Any]] = []
+        if not generate_reports:
+            for (surname, origin), members in groups.items():
+                group_results.append({"surname": surname, "origin": origin, "session_ids": members})
+            return {"session_ids": session_ids, "groups": group_results, "reports": report_results}
+
+        search_limit = asyncio.Semaphore(max(1, settings.cohort_search_concurrency))
+        report_limit = asyncio.Semaphore(max(1, settings.cohort_report_concurrency))
+
+        async def search(key: Tuple[str, str], members: List[str]) -> Dict[str, Any]:
+            async with search_limit:
+                checkpoint("cohort_search")
+                results = await self._search_group(key[0], key[1], profile_by_session[members[0]])
+            # 整组成员一次性关联到宗族图谱中的宗族节点
+            if results.get("clan_ids"):
+                try:
+                    await clan_repository.link_sessions(members, results["possible_families"])
+                except Exception as e:
+                    logger.warning(f"Cohort clan link failed for {key[0]}/{key[1]}: {e!r}")
+            return results
+
+        async def report(session_id: str, search_results: Dict[str, Any]) -> Dict[str, Any]:
+            async with report_limit:
+                checkpoint("cohort_report")
+                try:
+                    await self.output_service.generate_report(session_id, search_results=search_results)
+                    return {"session_id": session_id, "status": "ok"}
+                except (RequestCancelled, DeadlineExceeded):
+                    raise
+                except Exception as e:
+                    logger.error(f"Cohort report failed for session {session_id}: {e}")
+                    return {"session_id": session_id, "status": "error", "error": str(e)}
+
+        keys = list(groups.keys())
+        searches = await asyncio.gather(*[search(key, groups[key]) for key in keys])
+
+        tasks = []
+        for key, search_results in zip(keys, searches):
+            group_results.append({
+                "surname": key[0],
+                "origin": key[1],
+                "session_ids": groups[key],
+                "families_found": len(search_results.get("possible_families", [])),
+            })
+            tasks.extend(report(session_id, search_results) for session_id in groups[key])
+        report_results = list(await asyncio.gather(*tasks))
+
+        return {"session_ids": session_ids, "groups": group_results, "reports": report_results}
@@ -3,64 +3,135 @@ API Gateway 统一服务
 封装 DeepSeek LLM API 调用和即梦4.0图片生成
 """
 import json
+import time
 import asyncio
-import httpx
-from typing import Optional, Dict, Any, List
-from openai import AsyncOpenAI
+from typing import TYPE_CHECKING, AsyncIterator, Optional, Dict, Any, List
 from app.config import settings
 from app.utils.logger import logger
+from app.utils import serialization
 from app.utils.api_key_manager import APIKeyManager
+from app.utils.api_key_pool import deepseek_key_pool, mask_key
+from app.utils.latency_tracker import latency_tracker
+from app.utils.timeout_policy import timeout_policy
+from app.dependencies.db import get_http_client
+from app.dependencies.request_context import checkpoint
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+
+# 对冲请求统计（进程内全局，所有 GatewayService 实例共享）
+_hedge_stats: Dict[str, int] = {
+    "eligible": 0,  # 允许对冲的调用次数
+    "hedged": 0,  # 实际发出对冲请求的次数
+    "hedge_wins": 0,  # 对冲请求先于主请求返回的次数
+}
 
 
 class GatewayService:
     """API Gateway 服务类 - 仅支持 DeepSeek"""
     
     def __init__(self):
-        self.deepseek_client = None
-        
-        # 初始化 DeepSeek 客户端
-        deepseek_key = APIKeyManager.get_deepseek_key()
-        if deepseek_key:
-            self.deepseek_client = AsyncOpenAI(
-                api_key=deepseek_key,
-                base_url=settings.deepseek_base_url
-            )
+        # 每个 DeepSeek 密钥对应一个客户端，由密钥池负责选择
+        self._clients: Dict[str, "AsyncOpenAI"] = {}
     
-    def _get_llm_client(self):
+    def _ensure_key_pool(self) -> None:
         """
-        获取 DeepSeek LLM 客户端（动态获取，支持运行时设置的密钥）
+        同步密钥池（动态获取，支持运行时设置/追加的密钥）
         """
-        # 动态获取密钥（优先使用运行时设置的）
-        deepseek_key = APIKeyManager.get_deepseek_key()
-        
-        # 如果密钥变化，重新创建客户端
-        if deepseek_key and (not self.deepseek_client or self.deepseek_client.api_key != deepseek_key):
-            self.deepseek_client = AsyncOpenAI(
-                api_key=deepseek_key,
-                base_url=settings.deepseek_base_url
-            )
-        
-        if not self.deepseek_client:
+        deepseek_key_pool.sync(APIKeyManager.get_deepseek_keys())
+        if deepseek_key_pool.size() == 0:
             raise ValueError("DeepSeek API key not configured")
-        
-        return self.deepseek_client, settings.deepseek_model
     
-    async def llm_chat(self, messages: List[Dict[str, str]], model: Optional[str] = None, temperature: float = 0.7, enable_web_search: bool = False, timeout: float = 240.0) -> str:
+    def warm_up(self) -> None:
+        """启动时为每个密钥创建客户端（建立连接池），避免首个请求承担初始化开销"""
+        self._ensure_key_pool()
+        for key in APIKeyManager.get_deepseek_keys():
+            self._client_for_key(key)
+        logger.info(f"DeepSeek clients warmed up: {len(self._clients)} key(s)")
+    
+    async def aclose(self) -> None:
+        """关闭所有 DeepSeek 客户端的连接池"""
+        clients, self._clients = list(self._clients.values()), {}
+        for client in clients:
+            await client.close()
+    
+    def _client_for_key(self, key: str) -> "AsyncOpenAI":
+        client = self._clients.get(key)
+        if client is None:
+            # openai SDK 导入较慢，延迟到第一次创建客户端时
+            from openai import AsyncOpenAI
+            client = AsyncOpenAI(api_key=key, base_url=settings.deepseek_base_url)
+            self._clients[key] = client
+        return client
+    
+    async def _create_with_key(self, key: str, request_params: Dict[str, Any]):
+        """使用指定密钥发起请求，并把响应头中的限流信息反馈给密钥池"""
+        from openai import AuthenticationError, RateLimitError
+        client = self._client_for_key(key)
+        try:
+            raw = await client.chat.completions.with_raw_response.create(**request_params)
+        except RateLimitError as e:
+            deepseek_key_pool.release(key, headers=e.response.headers, error="rate_limit")
+            raise
+        except AuthenticationError as e:
+            # 密钥池中有多个密钥时，只有这里知道是哪个密钥失败了
+            logger.error(f"DeepSeek 认证失败，使用的密钥: {mask_key(key)}，错误详情: {e}")
+            deepseek_key_pool.release(key, error="auth")
+            raise
+        except asyncio.CancelledError:
+            deepseek_key_pool.release(key)
+            raise
+        except Exception:
+            deepseek_key_pool.release(key, error="other")
+            raise
+        deepseek_key_pool.release(key, headers=raw.headers)
+        return raw.parse()
+    
+    async def _create_completion(self, request_params: Dict[str, Any]):
+        """
+        从密钥池选择密钥发起请求
+        如果被限流且池中还有其他可用密钥，换一个密钥重试一次
+        """
+        from openai import RateLimitError
+        key = deepseek_key_pool.acquire()
+        try:
+            return await self._create_with_key(key, request_params)
+        except RateLimitError:
+            if not deepseek_key_pool.has_available(exclude=key):
+                raise
+            retry_key = deepseek_key_pool.acquire(exclude=key)
+            logger.info("DeepSeek 密钥被限流，切换到密钥池中的其他密钥重试")
+            return await self._create_with_key(retry_key, request_params)
+    
+    async def llm_chat(
+        self,
+        messages: List[Dict[str, str]],
+        model: Optional[str] = None,
+        temperature: float = 0.7,
+        enable_web_search: bool = False,
+        timeout: Optional[float] = None,
+        call_site: str = "llm_chat",
+        hedge: bool = False
+    ) -> str:
         """
         DeepSeek LLM 问答
         messages: 消息列表，格式 [{"role": "user", "content": "..."}]
         model: 模型名称（如果提供，会覆盖默认模型）
         temperature: 温度参数
         enable_web_search: 是否启用联网搜索（当前 DeepSeek API 可能不支持，需要额外配置）
-        timeout: 超时时间（秒），默认180秒（3分钟）
+        timeout: 超时时间（秒），不指定时由自适应超时策略按调用点计算；始终不超过请求剩余的时间预算
+        call_site: 调用点名称，用于按调用点统计延迟和计算超时
+        hedge: 是否允许对冲请求（只应用于短小、便宜的调用，如候选问题、信息抽取）
         
         注意：标准的 DeepSeek API 可能不支持联网搜索。
         如果需要真正的联网搜索，建议：
         1. 使用 DeepSeek-R1 模型（如果支持）
         2. 或集成 Google Search API 等外部搜索服务
         """
-        client, default_model = self._get_llm_client()
-        use_model = model or default_model
+        checkpoint(call_site)
+        self._ensure_key_pool()
+        use_model = model or settings.deepseek_model
+        timeout = timeout_policy.timeout_for(call_site, timeout)
         
         try:
             # 构建请求参数
@@ -76,18 +147,163 @@ class GatewayService:
             # 2. 或通过外部搜索 API 获取结果后再调用 LLM
             
             # 添加超时控制
-            response = await asyncio.wait_for(
-                client.chat.completions.create(**request_params),
-                timeout=timeout
-            )
+            started = time.monotonic()
+            if hedge and settings.llm_hedge_enabled:
+                response = await asyncio.wait_for(
+                    self._hedged_create(request_params, call_site),
+                    timeout=timeout
+                )
+            else:
+                response = await asyncio.wait_for(
+                    self._create_completion(request_params),
+                    timeout=timeout
+                )
+            latency_tracker.record(call_site, time.monotonic() - started)
             return response.choices[0].message.content
         except asyncio.TimeoutError:
-            logger.error(f"LLM chat timeout after {timeout}s")
-            raise TimeoutError(f"DeepSeek API 调用超时（{timeout}秒）")
+            timeout_policy.record_timeout(call_site, timeout)
+            logger.error(f"LLM chat timeout after {timeout:.1f}s ({call_site})")
+            raise TimeoutError(f"DeepSeek API 调用超时（{timeout:.0f}秒）")
         except Exception as e:
             logger.error(f"LLM chat error: {e}")
             raise
     
+    async def llm_chat_stream(
+        self,
+        messages: List[Dict[str, str]],
+        model: Optional[str] = None,
+        temperature: float = 0.7,
+        timeout: Optional[float] = None,
+        call_site: str = "llm_chat",
+    ) -> AsyncIterator[str]:
+        """
+        DeepSeek LLM 流式问答，逐段产出生成的文本
+        timeout 约束整个流（含首包），超时抛出 TimeoutError；
+        调用方提前结束迭代（aclose）时会关闭底层连接并归还密钥
+        """
+        from openai import AuthenticationError, RateLimitError
+        checkpoint(call_site)
+        self._ensure_key_pool()
+        timeout = timeout_policy.timeout_for(call_site, timeout)
+        request_params = {
+            "model": model or settings.deepseek_model,
+            "messages": messages,
+            "temperature": temperature,
+            "stream": True,
+        }
+
+        key = deepseek_key_pool.acquire()
+        client = self._client_for_key(key)
+        started = time.monotonic()
+        stream = None
+        error: Optional[str] = None
+        headers = None
+        try:
+            raw = await asyncio.wait_for(
+                client.chat.completions.with_raw_response.create(**request_params),
+                timeout=timeout
+            )
+            headers = raw.headers
+            stream = raw.parse()
+            # 每次取下一段都用剩余时间约束，首包后停滞的流也会超时
+            chunks = stream.__aiter__()
+            while True:
+                remaining = timeout - (time.monotonic() - started)
+                if remaining <= 0:
+                    raise asyncio.TimeoutError()
+                try:
+                    chunk = await asyncio.wait_for(chunks.__anext__(), timeout=remaining)
+                except StopAsyncIteration:
+                    break
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    yield delta
+            latency_tracker.record(call_site, time.monotonic() - started)
+        except asyncio.TimeoutError:
+            timeout_policy.record_timeout(call_site, timeout)
+            error = "other"
+            logger.error(f"LLM chat stream timeout after {timeout:.1f}s ({call_site})")
+            raise TimeoutError(f"DeepSeek API 调用超时（{timeout:.0f}秒）")
+        except RateLimitError as e:
+            headers, error = e.response.headers, "rate_limit"
+            raise
+        except AuthenticationError as e:
+            error = "auth"
+            logger.error(f"DeepSeek 认证失败（流式），使用的密钥: {mask_key(key)}，错误详情: {e}")
+            raise
+        except (asyncio.CancelledError, GeneratorExit):
+            raise
+        except Exception as e:
+            error = "other"
+            logger.error(f"LLM chat stream error: {e}")
+            raise
+        finally:
+            if stream is not None:
+                try:
+                    await stream.close()
+                except Exception:
+                    pass
+            deepseek_key_pool.release(key, headers=headers, error=error)
+
+    async def _hedged_create(self, request_params: Dict[str, Any], call_site: str):
+        """
+        对冲请求：主请求超过该调用点的 p90 延迟仍未返回时，再发出一个相同的请求，
+        取先成功返回的结果并取消另一个。对冲次数受 llm_hedge_budget_ratio 限制。
+        对冲请求会从密钥池另取密钥（主请求占用的密钥并发数更高）。
+        """
+        _hedge_stats["eligible"] += 1
+        delay = latency_tracker.percentile(call_site, settings.llm_hedge_percentile)
+
+        primary = asyncio.create_task(self._create_completion(request_params))
+        tasks = [primary]
+        try:
+            if delay is None:
+                # 样本不足，无法估计延迟分布，不对冲
+                return await primary
+
+            done, _ = await asyncio.wait({primary}, timeout=delay)
+            if done:
+                return primary.result()
+
+            budget = settings.llm_hedge_budget_ratio * _hedge_stats["eligible"]
+            if _hedge_stats["hedged"] + 1 > budget:
+                return await primary
+
+            _hedge_stats["hedged"] += 1
+            logger.debug(f"LLM hedge fired for {call_site} after {delay:.2f}s")
+            hedge_task = asyncio.create_task(self._create_completion(request_params))
+            tasks.append(hedge_task)
+
+            pending = {primary, hedge_task}
+            last_error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge_task:
+                            _hedge_stats["hedge_wins"] += 1
+                        return task.result()
+                    last_error = task.exception()
+            raise last_error
+        finally:
+            # 取消落败或被外部超时打断的请求
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    @staticmethod
+    def get_hedge_stats() -> Dict[str, Any]:
+        """对冲请求统计：对冲率 = hedged / eligible，胜率 = hedge_wins / hedged"""
+        eligible = _hedge_stats["eligible"]
+        hedged = _hedge_stats["hedged"]
+        return {
+            **_hedge_stats,
+            "hedge_rate": hedged / eligible if eligible else 0.0,
+            "win_rate": _hedge_stats["hedge_wins"] / hedged if hedged else 0.0,
+        }
+
     async def llm_extract(self, text: str, schema: Dict[str, Any], model: Optional[str] = None) -> Dict[str, Any]:
         """
         DeepSeek LLM 抽取 JSON
@@ -95,10 +311,10 @@ class GatewayService:
         schema: JSON Schema 定义期望的结构
         model: 模型名称（可选）
         """
-        client, default_model = self._get_llm_client()
-        use_model = model or default_model
+        self._ensure_key_pool()
+        use_model = model or settings.deepseek_model
         
-        schema_str = json.dumps(schema, ensure_ascii=False)
+        schema_str = serialization.dumps(schema)
         prompt = f"""
 请从以下文本中提取信息，并按照指定的JSON Schema格式返回。
 
@@ -115,12 +331,12 @@ JSON Schema：
 """
         
         try:
-            response = await client.chat.completions.create(
-                model=use_model,
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.3,
-                response_format={"type": "json_object"}
-            )
+            response = await self._create_completion({
+                "model": use_model,
+                "messages": [{"role": "user", "content": prompt}],
+                "temperature": 0.3,
+                "response_format": {"type": "json_object"}
+            })
             content = response.choices[0].message.content.strip()
             return json.loads(content)
         except Exception as e:
@@ -133,7 +349,7 @@ JSON Schema：
         num_images: int = 1,
         size: str = "2K",
         watermark: bool = False,
-        timeout: float = 120.0
+        timeout: Optional[float] = None
     ) -> List[str]:
         """
         使用即梦4.0生成图片
@@ -143,7 +359,7 @@ JSON Schema：
             num_images: 生成图片数量（1-15，默认1）
             size: 图片分辨率（默认"2K"）
             watermark: 是否添加水印（默认False）
-            timeout: 超时时间（秒，默认120秒）
+            timeout: 超时时间（秒），不指定时由自适应超时策略计算
         
         Returns:
             图片URL列表
@@ -154,6 +370,9 @@ JSON Schema：
         if num_images < 1 or num_images > 15:
             raise ValueError("num_images must be between 1 and 15")
         
+        import httpx
+        timeout = timeout_policy.timeout_for("seedream_image", timeout)
+        started = time.monotonic()
         try:
             url = f"{settings.seedream_api_base_url}/doubao/images/generations"
             headers = {
@@ -171,31 +390,33 @@ JSON Schema：
                 "watermark": watermark
             }
             
-            async with httpx.AsyncClient(timeout=timeout) as client:
-                response = await client.post(url, headers=headers, json=payload)
-                
-                if response.status_code != 200:
-                    logger.error(f"Seedream API error: {response.status_code} - {response.text}")
-                    raise Exception(f"即梦4.0 API 调用失败: {response.status_code}")
-                
-                data = response.json()
-                
-                # 检查是否有错误
-                if data.get("error"):
-                    raise Exception(f"即梦4.0 API 错误: {data.get('error')}")
-                
-                # 提取图片URL
-                image_urls = []
-                for item in data.get("data", []):
-                    if item.get("url"):
-                        image_urls.append(item["url"])
-                
-                logger.info(f"Generated {len(image_urls)} images using Seedream 4.0")
-                return image_urls
-                
+            client = await get_http_client()
+            response = await client.post(url, headers=headers, json=payload, timeout=timeout)
+            
+            if response.status_code != 200:
+                logger.error(f"Seedream API error: {response.status_code} - {response.text}")
+                raise Exception(f"即梦4.0 API 调用失败: {response.status_code}")
+            
+            data = response.json()
+            
+            # 检查是否有错误
+            if data.get("error"):
+                raise Exception(f"即梦4.0 API 错误: {data.get('error')}")
+            
+            # 提取图片URL
+            image_urls = []
+            for item in data.get("data", []):
+                if item.get("url"):
+                    image_urls.append(item["url"])
+            
+            latency_tracker.record("seedream_image", time.monotonic() - started)
+            logger.info(f"Generated {len(image_urls)} images using Seedream 4.0")
+            return image_urls
+            
         except httpx.TimeoutException:
-            logger.error(f"Seedream API timeout after {timeout}s")
-            raise TimeoutError(f"即梦4.0 API 调用超时（{timeout}秒）")
+            timeout_policy.record_timeout("seedream_image", timeout)
+            logger.error(f"Seedream API timeout after {timeout:.1f}s")
+            raise TimeoutError(f"即梦4.0 API 调用超时（{timeout:.0f}秒）")
         except Exception as e:
             logger.error(f"Seedream image generation error: {e}")
             raise
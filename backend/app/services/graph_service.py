@@ -3,8 +3,11 @@
 构建家族树和时间轴数据
 """
 from typing import List, Dict, Any, Optional
-from app.dependencies.db import get_mongodb_db
+from app.repositories.session_repository import session_repository
+from app.repositories.report_repository import report_repository
+from app.dependencies.request_context import checkpoint
 from app.models.family import Person, Relationship, FamilyTree
+from app.utils.date_extraction import get_date_extractor
 from app.utils.logger import logger
 
 
@@ -20,8 +23,7 @@ class GraphService:
         更新图谱
         将搜索结果合并到家族图谱中
         """
-        db = await get_mongodb_db()
-        session = await db.sessions.find_one({"_id": session_id})
+        session = await session_repository.get(session_id, "graph")
         
         if not session:
             raise ValueError(f"Session {session_id} not found")
@@ -45,14 +47,13 @@ class GraphService:
                     })
         
         # 推测缺失的世代信息
+        checkpoint("infer_generations")
         inferred_data = await self._infer_missing_generations(family_graph)
         family_graph.update(inferred_data)
         
-        # 更新数据库
-        await db.sessions.update_one(
-            {"_id": session_id},
-            {"$set": {"family_graph": family_graph}}
-        )
+        # 更新数据库（请求已取消时不再写入）
+        checkpoint("update_graph")
+        await session_repository.update(session_id, {"family_graph": family_graph})
     
     async def _infer_missing_generations(self, family_graph: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -82,8 +83,7 @@ class GraphService:
         
         返回格式: [{"year": int, "families": {"family_name": ["event1", "event2"]}}]
         """
-        db = await get_mongodb_db()
-        session = await db.sessions.find_one({"_id": session_id})
+        session = await session_repository.get(session_id, "graph_timeline")
         
         if not session:
             raise ValueError(f"Session {session_id} not found")
@@ -115,46 +115,56 @@ class GraphService:
             pass
         
         # 3. 从搜索结果的大家族历史中提取时间信息
-        report = session.get("report")
-        if report:
-            # 从报告中的大家族历史提取时间线
-            possible_families = report.get("possible_families", [])
-            for family in possible_families:
-                family_name = family.get("family_name", "")
-                famous_figures = family.get("famous_figures", [])
+        if session.get("report_version"):
+            possible_families = await report_repository.get_possible_families(session_id, session["report_version"])
+        else:
+            possible_families = (session.get("report") or {}).get("possible_families", [])
+        if possible_families:
+            # 从报告中的大家族历史提取时间线：所有名人的朝代和事迹一次批量提取
+            figures = [
+                (family.get("family_name", ""), figure)
+                for family in possible_families
+                for figure in family.get("famous_figures", [])
+            ]
+            dates = get_date_extractor()
+            mentions = dates.extract_batch(
+                [t for _, figure in figures for t in (figure.get("dynasty_period", ""), figure.get("story", ""))]
+            )
+            for i, (family_name, figure) in enumerate(figures):
+                # 优先按朝代推断大致年份，没有时取事迹中的第一个年代
+                found = mentions[2 * i] or mentions[2 * i + 1]
                 
-                for figure in famous_figures:
-                    # 从历史名人的信息中提取年份
-                    story = figure.get("story", "")
-                    dynasty = figure.get("dynasty_period", "")
-                    
-                    # 尝试从朝代推断大致年份
-                    year = self._extract_year_from_dynasty(dynasty)
-                    if not year:
-                        year = self._extract_year(story)
-                    
-                    if year:
-                        events.append({
-                            "year": year,
-                            "person": figure.get("name", ""),
-                            "person_name": figure.get("name", ""),
-                            "event": f"{figure.get('name', '')} - {figure.get('achievements', '')[:50]}",
-                            "source": f"family:{family_name}",
-                            "category": "historical_figure"
-                        })
-        
-        # 4. 从家族图谱的历史记录中提取
+                if found:
+                    events.append({
+                        "year": found[0].year,
+                        "period": dates.period(found[0]),
+                        "person": figure.get("name", ""),
+                        "person_name": figure.get("name", ""),
+                        "event": f"{figure.get('name', '')} - {figure.get('achievements', '')[:50]}",
+                        "source": f"family:{family_name}",
+                        "category": "historical_figure"
+                    })
+    
+        # 4. 从家族图谱的历史记录中提取（会话内全部搜索摘要一次批量提取）
+        snippets = [
+            hist_item.get("snippet") or ""
+            for person_data in family_graph.values() if isinstance(person_data, dict)
+            for hist_item in person_data.get("history", [])
+        ]
+        dates = get_date_extractor()
+        snippet_mentions = iter(dates.extract_batch(snippets))
         for person_key, person_data in family_graph.items():
             if isinstance(person_data, dict):
                 # 从历史记录中提取年份和事件
                 history = person_data.get("history", [])
                 for hist_item in history:
-                    snippet = hist_item.get("snippet", "")
-                    year = self._extract_year(snippet)
-                    if year:
+                    snippet = hist_item.get("snippet") or ""
+                    found = next(snippet_mentions)
+                    if found:
                         event_desc = snippet[:100]  # 限制长度
                         events.append({
-                            "year": year,
+                            "year": found[0].year,
+                            "period": dates.period(found[0]),
                             "person": person_key,
                             "person_name": person_data.get("name", person_key),
                             "event": event_desc,
@@ -239,7 +249,8 @@ class GraphService:
             current_events[family_key].append({
                 "event": event["event"],
                 "category": event.get("category", "unknown"),
-                "source": event.get("source", "")
+                "source": event.get("source", ""),
+                "period": event.get("period")
             })
         
         # 添加最后一个年份
@@ -251,39 +262,9 @@ class GraphService:
         
         return timeline_data
     
-    def _extract_year_from_dynasty(self, dynasty_text: str) -> Optional[int]:
-        """从朝代信息推断大致年份"""
-        if not dynasty_text:
-            return None
-        
-        # 简单的朝代到年份映射（可以扩展）
-        dynasty_map = {
-            "唐朝": 700,
-            "宋朝": 1000,
-            "元朝": 1300,
-            "明朝": 1400,
-            "清朝": 1700,
-            "民国": 1920,
-            "现代": 1950
-        }
-        
-        for dynasty, year in dynasty_map.items():
-            if dynasty in dynasty_text:
-                return year
-        
-        return None
-    
     def _extract_year(self, text: str) -> Optional[int]:
         """从文本中提取年份"""
-        import re
-        # 匹配4位数字年份（1900-2100）
-        matches = re.findall(r'\b(19|20)\d{2}\b', text)
-        if matches:
-            try:
-                return int(matches[0] + matches[1] if len(matches) > 1 else matches[0])
-            except:
-                pass
-        return None
+        return get_date_extractor().first_year(text or "")
     
     def build_family_tree(self, persons: List[Person], relationships: List[Relationship]) -> FamilyTree:
         """构建家族树"""
@@ -2,31 +2,104 @@
 输出生成服务
 整合所有服务，生成最终输出（报告、传记、时间轴）
 """
-from typing import Dict, Any, List, Optional
+import asyncio
+from typing import Dict, Any, List, Optional, Tuple
 from datetime import datetime
-from app.dependencies.db import get_mongodb_db
+from app.repositories.session_repository import session_repository, extract_collected_data
+from app.repositories.report_repository import report_repository, load_session_report
+from app.dependencies.db import get_http_client
+from app.dependencies.request_context import RequestCancelled, checkpoint
 from app.models.output import FamilyReport, Biography, Timeline, TimelineEvent
 from app.services.ai_service import AIService
 from app.services.graph_service import GraphService
 from app.services.gateway_service import GatewayService
 from app.services.search_service import SearchService
+from app.services.timeline_builder import TimelineBuilder
+from app.utils.deadline import DeadlineExceeded
+from app.config import settings
 from app.utils.logger import logger
+from app.utils import serialization
+from app.utils.fingerprint import fingerprint
 import json
 
 
+# 报告提示词模板版本：修改章节划分、提示词或拼装格式时递增，使已保存的报告不再被复用
+REPORT_TEMPLATE_VERSION = 2
+# 时间轴构建方式版本：修改本地推导或补充规则时递增，只使已保存的时间轴不再被复用
+TIMELINE_VERSION = 2
+
+# 收集数据按领域拆分（点号路径），章节只依赖相关领域：例如新增辈分字只影响用到 generation 的章节
+COLLECTED_AREAS: Dict[str, Tuple[str, ...]] = {
+    "origin": ("self_origin", "self.origin", "father_origin", "father.origin", "grandfather.origin", "migration_history"),
+    "kinship": ("surname", "self.surname", "father.name", "grandfather_name", "grandfather.name"),
+    "generation": ("generation_char", "self.generation_name"),
+}
+
+# 报告章节：(key, 标题, 用到的上下文分区, 写作要求)
+# 各章节只拿到自己需要的分区，可以并行生成，最后按这里的顺序拼装；
+# 分区内容不变的章节在重新生成报告时直接复用上一版本
+REPORT_CHAPTERS: List[Tuple[str, str, Tuple[str, ...], str]] = [
+    (
+        "origin",
+        "第一章：根脉所系——家族的起源与迁徙故事",
+        ("profile", "origin", "kinship", "conversation", "other"),
+        """- 基于用户实际提供的祖籍、出生地、迁徙等信息
+- 如果信息不足，明确说明"根据您提供的信息，我们推测..."
+- 300-500字""",
+    ),
+    (
+        "clan",
+        "第二章：历史大家族故事与名人",
+        ("profile", "kinship", "families", "histories"),
+        """- 基于可能的大家族分析结果和搜索到的历史资料
+- 简要描述历史名人（3-5位，每位100-150字），用温暖、生动的语言讲述他们的故事
+- 说明这些大家族与用户可能的关系，区分推测和史实""",
+    ),
+    (
+        "culture",
+        "第三章：文化传承",
+        ("profile", "generation", "kinship", "conversation", "families"),
+        """- 基于用户提供的辈分字、堂号、家谱、传统等信息
+- 如果用户提供了辈分字，简要解释其文化内涵（100-200字）
+- 200-400字""",
+    ),
+    (
+        "personal",
+        "第四章：个人与家族",
+        ("profile", "kinship", "generation"),
+        """- 使用用户真实姓名
+- 描述用户在家族历史中的位置，以温暖的寄语收尾
+- 100-200字""",
+    ),
+]
+
+# 章节生成失败（重试后仍失败或内容过短）时使用的兜底正文
+_CHAPTER_FALLBACKS: Dict[str, str] = {
+    "origin": "根据您提供的信息：\n- 祖籍/籍贯：{birth_place}\n- 当前地区：{current_location}",
+    "clan": "基于搜索到的历史大家族信息，我们为您找到了相关的历史名人和家族故事。",
+    "culture": "家族文化是传承的重要载体，您的家族有着深厚的历史底蕴。",
+    "personal": "{name}，您是家族传承的重要一环，您的故事也是家族历史的一部分。",
+}
+
+
 class OutputService:
     """输出服务类"""
     
-    def __init__(self):
-        self.ai_service = AIService()
-        self.graph_service = GraphService()
-        self.gateway_service = GatewayService()
-        self.search_service = SearchService()
+    def __init__(
+        self,
+        ai_service: Optional[AIService] = None,
+        graph_service: Optional[GraphService] = None,
+        gateway_service: Optional[GatewayService] = None,
+        search_service: Optional[SearchService] = None,
+    ):
+        self.gateway_service = gateway_service or GatewayService()
+        self.ai_service = ai_service or AIService(gateway_service=self.gateway_service)
+        self.graph_service = graph_service or GraphService()
+        self.search_service = search_service or SearchService(gateway_service=self.gateway_service)
     
     async def generate_text(self, session_id: str) -> str:
         """生成文字描述"""
-        db = await get_mongodb_db()
-        session = await db.sessions.find_one({"_id": session_id})
+        session = await session_repository.get(session_id, "collected")
         
         if not session:
             raise ValueError(f"Session {session_id} not found")
@@ -37,8 +110,8 @@ class OutputService:
         # 使用 DeepSeek 生成文字描述
         prompt = f"""
 基于以下家族数据，生成一份详细的家族历史报告：
-用户信息：{json.dumps(user_input, ensure_ascii=False)}
-家族图谱：{json.dumps(family_graph, ensure_ascii=False)}
+用户信息：{serialization.dumps(user_input)}
+家族图谱：{serialization.dumps(family_graph)}
 
 请生成包含以下内容的报告：
 1. 家族起源和迁徙轨迹
@@ -51,7 +124,8 @@ class OutputService:
         try:
             response = await self.gateway_service.llm_chat(
                 messages=[{"role": "user", "content": prompt}],
-                temperature=0.8
+                temperature=0.8,
+                call_site="report_text"
             )
             return response
         except Exception as e:
@@ -60,39 +134,55 @@ class OutputService:
         # 简单返回
         return f"家族历史报告：基于收集的数据，{user_input.get('name', '用户')}的家族信息已整理完成。"
     
-    async def generate_report(self, session_id: str) -> Dict[str, Any]:
+    async def generate_report(
+        self,
+        session_id: str,
+        search_results: Optional[Dict[str, Any]] = None,
+        force: bool = False,
+    ) -> Dict[str, Any]:
         """
         生成家族报告
         包含大家族历史、族谱和详细分析
+        search_results: 已有的搜索结果（如宗亲批量生成时同组共享），提供时跳过家族关联分析和搜索
+        force: 忽略上一版本报告，全部重新搜索和生成
+
+        输入（收集数据、搜索结果、模板版本）的指纹与上一版本相同时直接返回上一版本；
+        否则只重新生成输入变化的章节，搜索结果在姓氏和祖籍线索不变时沿用上一版本
         """
-        db = await get_mongodb_db()
-        session = await db.sessions.find_one({"_id": session_id})
+        session = await session_repository.get(session_id, "collected")
         
         if not session:
             raise ValueError(f"Session {session_id} not found")
         
         # 获取用户信息和收集的数据（兼容多种格式）
-        family_graph = session.get("family_graph", {})
-        if isinstance(family_graph, dict) and "collected_data" in family_graph:
-            # 新格式：family_graph.collected_data
-            collected_data = family_graph.get("collected_data", {})
-        elif isinstance(family_graph, dict) and family_graph:
-            # 旧格式：family_graph 直接就是 collected_data
-            collected_data = family_graph
-        else:
-            # 尝试从 collected_data 字段获取
-            collected_data = session.get("collected_data", {})
+        collected_data = extract_collected_data(session)
         
         if not collected_data:
             logger.warning(f"No collected_data found for session {session_id}, using empty dict")
             collected_data = {}
         
-        user_input = session.get("user_input", {})
+        # 宗亲批量创建的会话只有 user_profile，没有 user_input
+        user_input = session.get("user_input") or session.get("user_profile") or {}
+
+        previous = None if force else await self._previous_report(session)
+        previous_inputs = (previous or {}).get("input_fingerprints") or {}
+        areas = self._collected_areas(collected_data)
+        # 家族关联分析主要取决于姓氏和祖籍线索，这些不变时沿用上一版本的搜索结果
+        search_key = fingerprint(REPORT_TEMPLATE_VERSION, user_input, areas["origin"], areas["kinship"])
+        if search_results is None and previous and previous_inputs.get("search") == search_key and self._has_search_results(previous):
+            logger.info(f"Reusing search results of report v{previous.get('version')} for session {session_id}")
+            search_results = {
+                "possible_families": previous.get("possible_families") or [],
+                "family_histories": previous.get("family_histories") or {},
+                "summary": previous.get("search_summary") or {},
+            }
         
         # 执行家族关联分析和搜索
         logger.info(f"Starting family analysis and search for session {session_id}")
+        search_ok = False
         try:
-            search_results = await self.search_service.perform_search(session_id)
+            if search_results is None:
+                search_results = await self.search_service.perform_search(session_id)
             if not search_results:
                 logger.warning(f"Search returned empty results for session {session_id}")
                 search_results = {
@@ -100,6 +190,10 @@ class OutputService:
                     "family_histories": {},
                     "summary": {"total_families_found": 0, "high_relevance_families": []}
                 }
+            search_ok = self._has_search_results(search_results)
+        except (RequestCancelled, DeadlineExceeded):
+            # 请求已取消或超出时间预算：不再继续生成报告
+            raise
         except Exception as e:
             logger.error(f"Error during family search: {e}")
             import traceback
@@ -115,178 +209,44 @@ class OutputService:
         user_name = user_input.get("name", "用户")
         user_birth_place = user_input.get("birth_place", "")
         user_current_location = user_input.get("current_location", "")
-        
-        # 提取收集到的实际数据
-        actual_data_summary = []
-        if collected_data.get("self_origin"):
-            actual_data_summary.append(f"祖籍/籍贯：{collected_data.get('self_origin')}")
-        if collected_data.get("father_origin"):
-            actual_data_summary.append(f"父亲籍贯：{collected_data.get('father_origin')}")
-        if collected_data.get("grandfather_name"):
-            actual_data_summary.append(f"祖父姓名：{collected_data.get('grandfather_name')}")
-        if collected_data.get("generation_char"):
-            actual_data_summary.append(f"辈分字：{collected_data.get('generation_char')}")
-        if collected_data.get("migration_history"):
-            actual_data_summary.append(f"迁徙历史：{collected_data.get('migration_history')}")
-        
-        # 获取未解析的对话内容
-        unparsed_info = collected_data.get("_unparsed", [])
-        if unparsed_info:
-            actual_data_summary.append("\n对话中的其他信息：")
-            for item in unparsed_info[-5:]:  # 只取最近5条
-                actual_data_summary.append(f"- {item.get('a', '')}")
-        
-        # 生成综合报告（基于用户实际内容）
-        report_prompt = f"""
-请基于以下**用户实际提供的信息**，生成一份个性化的家族历史报告。
-
-**重要要求：**
-1. 必须基于用户实际提供的信息，不要使用模板化的占位符（如[用户姓名]、[用户姓氏]等）
-2. 用户姓名：{user_name}
-3. 用户出生地：{user_birth_place or '未提供'}
-4. 用户当前地区：{user_current_location or '未提供'}
-
-**用户实际收集到的家族信息：**
-{chr(10).join(actual_data_summary) if actual_data_summary else '（用户提供的信息较少）'}
-
-**完整的收集数据（JSON格式）：**
-{json.dumps(collected_data, ensure_ascii=False, indent=2)}
-
-**可能的大家族分析：**
-{json.dumps(search_results.get("possible_families", []), ensure_ascii=False, indent=2)}
-
-**大家族历史：**
-{json.dumps(search_results.get("family_histories", {}), ensure_ascii=False, indent=2)}
-
-请生成一份**完全基于用户实际信息**的家族历史报告，要求：
-
-1. **报告标题**：使用用户真实姓名，例如"一脉相承，薪火相传——{user_name}家族历史寻根报告"
-
-2. **报告内容必须基于用户实际提供的信息**：
-   - 如果用户提供了祖籍，就基于这个祖籍来写
-   - 如果用户提供了祖父姓名，就提到这个姓名
-   - 如果用户提供了辈分字，就详细解释这个辈分字
-   - 如果用户提供了迁徙历史，就基于这个历史来写
-   - **绝对不要使用[用户姓名]、[用户姓氏]等占位符**
-
-3. **报告结构**：
-   - **第一章：根脉所系——家族的起源与迁徙故事**
-     * 基于用户实际提供的祖籍、出生地等信息
-     * 如果信息不足，明确说明"根据您提供的信息，我们推测..."
-   
-   - **第二章：历史大家族故事与名人**
-     * 基于可能的大家族分析结果
-     * 简要描述历史名人（3-5位，每位100-150字）
-     * 用温暖、生动的语言讲述他们的故事
-   
-   - **第三章：文化传承**
-     * 基于用户提供的辈分字、传统等信息
-     * 如果用户提供了辈分字，简要解释其文化内涵（100-200字）
-   
-   - **第四章：个人与家族**
-     * 使用用户真实姓名：{user_name}
-     * 描述用户在家族历史中的位置（100-150字）
-
-4. **语言风格**：
-   - 使用温暖、亲切、有故事性的语言
-   - 让历史人物变得生动、有血有肉
-   - 用叙事的方式讲述历史
-   - 体现家族传承的温度和情感
-   - 尊重历史事实，区分推测和史实
-   - **保持内容简洁但完整，总字数控制在1500-2000字左右**
-
-5. **重要提醒**：
-   - 报告开头必须使用用户真实姓名：亲爱的{user_name}
-   - 所有涉及用户信息的地方都必须使用实际数据
-   - 如果某些信息用户没有提供，明确说明"根据现有信息推测"或"信息不足"
-   - 不要使用任何占位符或模板变量
-"""
-        
-        try:
-            report_text = await self.gateway_service.llm_chat(
-                messages=[{"role": "user", "content": report_prompt}],
-                temperature=0.8,  # 适度降低温度以加快响应
-                timeout=240  # 增加到240秒超时（4分钟）
-            )
-            if not report_text or len(report_text.strip()) < 100:
-                # 如果生成的报告太短，使用备用方案
-                logger.warning(f"Generated report too short, using fallback")
-                report_text = f"""
-亲爱的{user_name}：
-
-感谢您参与这次寻根之旅。基于您提供的信息，我们为您整理了一份家族历史报告。
-
-**第一章：根脉所系——家族的起源与迁徙故事**
-根据您提供的信息：
-- 祖籍/籍贯：{user_birth_place or '待补充'}
-- 当前地区：{user_current_location or '待补充'}
-
-**第二章：历史大家族故事与名人**
-基于搜索到的历史大家族信息，我们为您找到了相关的历史名人和家族故事。
-
-**第三章：文化传承**
-家族文化是传承的重要载体，您的家族有着深厚的历史底蕴。
-
-**第四章：个人与家族**
-{user_name}，您是家族传承的重要一环，您的故事也是家族历史的一部分。
-
-感谢您参与这次寻根之旅！
-"""
-        except Exception as e:
-            logger.error(f"Error generating comprehensive report: {e}")
-            import traceback
-            logger.error(traceback.format_exc())
-            # 使用更详细的备用报告
-            report_text = f"""
-亲爱的{user_name}：
-
-感谢您参与这次寻根之旅。虽然报告生成过程中遇到了一些技术问题，但我们已为您保存了所有收集到的信息。
-
-**您提供的信息：**
-{chr(10).join(actual_data_summary) if actual_data_summary else '（信息较少，建议继续补充）'}
-
-**下一步建议：**
-1. 继续补充家族信息，特别是祖籍、祖父姓名等关键信息
-2. 查看搜索到的历史大家族信息
-3. 如有需要，可以重新生成报告
-
-感谢您的参与！
-"""
-        
-        # 确保report_text不为空
-        if not report_text or len(report_text.strip()) < 50:
-            logger.warning(f"Report text is too short or empty, using minimal report")
-            report_text = f"""
-亲爱的{user_name}：
 
-感谢您参与这次寻根之旅。基于您提供的信息，我们为您整理了一份家族历史报告。
-
-**您提供的信息：**
-{chr(10).join(actual_data_summary) if actual_data_summary else '（信息较少，建议继续补充）'}
-
-**家族历史探索：**
-我们已为您搜索了相关的历史大家族信息，并整理了可能的家族关联。
-
-**下一步建议：**
-1. 继续补充家族信息，特别是祖籍、祖父姓名等关键信息
-2. 查看搜索到的历史大家族信息
-3. 如有需要，可以重新生成更详细的报告
-
-感谢您的参与！
-"""
-        
-        # 构建报告数据
-        # 同时生成基于用户信息和搜索结果的时间轴（推测）
-        try:
-            timeline_data = await self.build_timeline(session_id)
-        except Exception as e:
-            logger.error(f"Error building timeline for session {session_id}: {e}")
-            timeline_data = {"events": []}
+        # 各章节共享的精简上下文，按章节并行生成后按固定顺序拼装
+        # 时间轴（基于用户信息和搜索结果推测）与章节互不依赖，同时生成
+        context = self._report_context(user_input, collected_data, search_results)
+        search_fp = fingerprint(search_results.get("possible_families"), search_results.get("family_histories"))
+        timeline_key = fingerprint(REPORT_TEMPLATE_VERSION, TIMELINE_VERSION, user_input, collected_data, search_fp)
+        report_fp = fingerprint(self._chapter_fingerprints(context), timeline_key)
+        # 搜索和时间轴的指纹只在成功时记录：上一版本没有记录的（搜索出错、时间轴为空）不能整体复用
+        complete = (
+            previous
+            and all(c.get("status") == "ok" for c in previous.get("chapters") or [])
+            and previous_inputs.get("search") and previous_inputs.get("timeline")
+        )
+        if complete and previous.get("fingerprint") == report_fp:
+            logger.info(f"Report inputs unchanged, returning report v{previous.get('version')} for session {session_id}")
+            return {**previous, "reused": True}
+
+        checkpoint("report")
+        if previous and previous_inputs.get("timeline") == timeline_key and (previous.get("timeline") or {}).get("events"):
+            timeline_task = self._previous_timeline(previous)
+        else:
+            timeline_task = self._safe_build_timeline(session_id, search_results)
+        chapters, timeline_data = await asyncio.gather(
+            self._generate_chapters(context, user_name, previous=(previous or {}).get("chapters")),
+            timeline_task,
+        )
+        input_fingerprints: Dict[str, str] = {}
+        if search_ok:
+            input_fingerprints["search"] = search_key
+        if timeline_data.get("events"):
+            input_fingerprints["timeline"] = timeline_key
+        report_text = self._assemble_report(user_input, chapters)
 
         report_data = {
             "title": f"{user_name}家族历史报告",
             "summary": f"基于{user_name}提供的信息和联网搜索，为您生成的家族历史报告",
             "report_text": report_text,
+            "chapters": chapters,
             "possible_families": search_results.get("possible_families", []),
             "family_histories": search_results.get("family_histories", {}),
             "search_summary": search_results.get("summary", {}),
@@ -297,16 +257,23 @@ class OutputService:
                 "birth_place": user_birth_place,
                 "current_location": user_current_location
             },
-            "timeline": timeline_data
+            "timeline": timeline_data,
+            "fingerprint": report_fp,
+            "input_fingerprints": input_fingerprints,
+            "template_version": REPORT_TEMPLATE_VERSION,
         }
         
-        # 保存报告到数据库
+        # 保存报告到数据库（请求已取消或超时时不保存兜底报告，避免覆盖已有报告）
+        checkpoint("save_report")
         try:
             # 获取用户信息用于自动生成档案标题
             user_name = user_input.get("name", "用户")
             
+            # 报告正文、时间轴、搜索结果写入独立集合，会话文档只记录版本号
+            version = await report_repository.save_report(session_id, report_data)
+            report_data["version"] = version
+            
             update_data = {
-                "report": report_data,
                 "report_generated_at": datetime.now().isoformat(),
                 # 报告生成后自动标记为可归档，但还未归档（archived=False）
                 "report_ready": True
@@ -316,11 +283,9 @@ class OutputService:
             if not session.get("archive_title"):
                 update_data["archive_title"] = f"{user_name}的家族寻根档案"
             
-            await db.sessions.update_one(
-                {"_id": session_id},
-                {"$set": update_data}
-            )
-            logger.info(f"Report saved to database for session {session_id}")
+            # 旧数据内嵌的 report 一并移除，保持会话文档精简
+            await session_repository.update(session_id, update_data, unset=["report"])
+            logger.info(f"Report v{version} saved to database for session {session_id}")
         except Exception as e:
             logger.error(f"Error saving report to database: {e}")
             import traceback
@@ -328,268 +293,385 @@ class OutputService:
         
         return report_data
 
-    async def _build_timeline(self, session_id: str, family_filter: Optional[str] = None) -> Dict[str, Any]:
-        """构建家族时间轴（内部实现）：整合用户输入、家族搜索结果及联网信息，使用 LLM 推测事件时间并返回 JSON 格式的事件列表"""
-        db = await get_mongodb_db()
-        session = await db.sessions.find_one({"_id": session_id})
-        if not session:
-            raise ValueError(f"Session {session_id} not found")
-
-        # 尝试获取已存在的搜索结果或重新触发搜索
+    @staticmethod
+    def _has_search_results(search_results: Dict[str, Any]) -> bool:
+        """是否真正匹配到了大家族（而不是搜索出错或没匹配到时的兜底结果）"""
+        return any(
+            isinstance(f, dict) and not f.get("placeholder") and not f.get("error")
+            for f in search_results.get("possible_families") or []
+        )
+
+    async def _previous_report(self, session: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """读取上一版本的报告用于复用；读取失败时视为没有"""
+        if not session.get("report_version"):
+            return None
         try:
-            search_results = await self.search_service.perform_search(session_id)
+            return await load_session_report(session, include_timeline=True)
         except Exception as e:
-            logger.warning(f"Search failed while building timeline: {e}")
-            search_results = {"possible_families": [], "family_histories": {}, "summary": {}}
-
-        user_input = session.get("user_input", {})
-        # 兼容 family_graph.collected_data 与 top-level collected_data 两种存储方式
-        family_graph = session.get("family_graph", {})
-        if isinstance(family_graph, dict) and "collected_data" in family_graph:
-            collected_data = family_graph.get("collected_data", {}) or {}
-        elif isinstance(family_graph, dict) and family_graph:
-            collected_data = family_graph or {}
-        else:
-            collected_data = session.get("collected_data", {}) or {}
-
-        prompt = f"""
-请基于以下信息，为该姓氏家族生成一个推测性的时间轴（按时间先后排序），只返回 JSON，格式为：
-{{
-  "events": [
-    {{"date": "YYYY 或 YYYY-MM-DD", "title": "事件标题", "description": "事件说明"}},
-    ...
-  ]
-}}
+            logger.warning(f"读取上一版本报告失败（重新生成）：{e}")
+            return None
+
+    @staticmethod
+    async def _previous_timeline(previous: Dict[str, Any]) -> Dict[str, Any]:
+        timeline = dict(previous.get("timeline") or {"events": []})
+        for key in ("session_id", "version", "created_at"):
+            timeline.pop(key, None)
+        return timeline
 
-要求：
-1. 使用从对话与全网搜索得到的信息（如下所示）。
-2. 即使没有确切年份，也请合理推测并写出大致年份（例如 1830s, 19th century 或 1873）。
-3. 事件应为与该姓氏家族密切相关的重要历史节点（迁徙、建国、名人、重要产业变化等），每个事件简洁明了。
-4. 如果信息不足，请基于最可能的历史背景推测（不要生成过度虚构的细节）。
-5. 最多生成20个事件。
-
-用户信息：{json.dumps(user_input, ensure_ascii=False)}
-收集数据摘要：{json.dumps({k: collected_data.get(k) for k in ['self_origin','father_origin','migration_history','grandfather_name','generation_char']}, ensure_ascii=False)}
-可能的大家族信息（摘要）：{json.dumps(search_results.get('family_histories', {}), ensure_ascii=False)[:2000]}
-家族筛选：{family_filter}
-
-请只返回 JSON，不要额外说明文字。
-"""
-        timeline = {"events": []}
+    async def _safe_build_timeline(self, session_id: str, search_results: Dict[str, Any]) -> Dict[str, Any]:
+        """生成报告附带的时间轴；失败时返回空时间轴，不影响报告"""
+        checkpoint("timeline")
         try:
-            response = await self.gateway_service.llm_chat(
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.7,
-                timeout=120
-            )
-
-            # 尝试解析为 JSON
-            import json as _json
-            try:
-                parsed = _json.loads(response)
-                if isinstance(parsed, dict) and "events" in parsed:
-                    timeline = parsed
-                else:
-                    logger.warning("Timeline LLM response JSON did not contain 'events', falling back to parsing")
-            except Exception:
-                # 如果 LLM 没有直接返回 JSON，尝试提取 JSON 片段
-                try:
-                    start = response.find('{')
-                    end = response.rfind('}')
-                    if start != -1 and end != -1:
-                        possible = response[start:end+1]
-                        parsed = _json.loads(possible)
-                        if isinstance(parsed, dict) and "events" in parsed:
-                            timeline = parsed
-                except Exception as e:
-                    logger.warning(f"Failed to parse timeline JSON: {e}")
-
+            # 复用本次报告的搜索结果，避免时间轴再做一遍家族分析和搜索
+            return await self._build_timeline(session_id, search_results=search_results)
+        except (RequestCancelled, DeadlineExceeded):
+            raise
         except Exception as e:
-            logger.error(f"Error calling LLM to build timeline: {e}")
-
-        # 规范化可能存在的字段（兼容不同的 collected_data 结构）
-        self_origin = collected_data.get('self_origin') or (collected_data.get('self') or {}).get('origin') or (collected_data.get('user_profile') or {}).get('birth_place')
-        father_origin = collected_data.get('father_origin') or (collected_data.get('father') or {}).get('origin')
-        migration_history = collected_data.get('migration_history') or collected_data.get('migration') or collected_data.get('_migration') or collected_data.get('_unparsed')
-        grandfather_name = collected_data.get('grandfather_name') or (collected_data.get('grandfather') or {}).get('name') or (collected_data.get('grandfather_name') if 'grandfather_name' in collected_data else None)
-        generation_char = collected_data.get('generation_char') or (collected_data.get('self') or {}).get('generation_name')
-
-        logger.info(f"Building timeline for session {session_id} - self_origin={self_origin}, father_origin={father_origin}, migration_history={'present' if migration_history else 'none'}, grandfather_name={grandfather_name}")
-
-        # 最后兜底：如果没有生成事件，基于已知信息构建简单时间点
-        if not timeline.get('events'):
-            events = []
-            # 尝试使用迁徙历史（如果存在）
-            migration = migration_history
-            if migration:
-                # migration 可能是字符串或数组
-                parts = migration if isinstance(migration, list) else str(migration).split('\n')
-                for part in parts[:5]:
-                    # 尝试提取年份
-                    import re
-                    m = re.search(r"(\d{4})", part)
-                    date = f"{m.group(1)}" if m else "未知年份"
-                    events.append({"date": date, "title": "迁徙记录", "description": part})
-
-            # 使用祖籍信息作为一个历史点
-            origin = self_origin or father_origin
-            if origin:
-                events.append({"date": "约1800-1900", "title": "家族主要起源地", "description": f"据记录，家族与{origin}有重要渊源"})
+            logger.error(f"Error building timeline for session {session_id}: {e}")
+            return {"events": []}
+
+    @staticmethod
+    def _compact_histories(family_histories: Dict[str, Any], max_items: int = 4, max_chars: int = 300) -> Dict[str, List[Dict[str, str]]]:
+        """精简大家族历史：去掉与 possible_families 重复的 family_info 和链接，只保留标题和截断的正文"""
+        out: Dict[str, List[Dict[str, str]]] = {}
+        for family_name, entry in (family_histories or {}).items():
+            items = []
+            for item in (entry or {}).get("history") or []:
+                if not isinstance(item, dict):
+                    continue
+                text = item.get("snippet") or item.get("summary") or item.get("content") or ""
+                items.append({
+                    "title": str(item.get("title") or item.get("name") or ""),
+                    "text": str(text)[:max_chars],
+                })
+                if len(items) >= max_items:
+                    break
+            out[family_name] = items
+        return out
 
-            # 使用祖辈姓名做为历史点
-            if grandfather_name:
-                events.append({"date": "约1900-1950", "title": "家族重要人物", "description": f"家族记载中的人物：{grandfather_name}"})
+    @staticmethod
+    def _collected_areas(collected_data: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+        """
+        按 COLLECTED_AREAS 拆分收集数据；other 为其余字段（不含对话记录和用户资料）
+        """
+        def get_path(obj: Any, path: str) -> Any:
+            for part in path.split("."):
+                if not isinstance(obj, dict):
+                    return None
+                obj = obj.get(part)
+            return obj
+
+        areas: Dict[str, Dict[str, Any]] = {}
+        claimed = set()
+        for area, paths in COLLECTED_AREAS.items():
+            areas[area] = {path: get_path(collected_data, path) for path in paths if get_path(collected_data, path)}
+            claimed.update(paths)
+
+        def rest(obj: Dict[str, Any], prefix: str) -> Dict[str, Any]:
+            out = {}
+            for k, v in obj.items():
+                path = f"{prefix}{k}"
+                if path in claimed or path in ("_unparsed", "user_profile"):
+                    continue
+                if isinstance(v, dict):
+                    v = rest(v, f"{path}.")
+                    if not v:
+                        continue
+                out[k] = v
+            return out
+
+        areas["other"] = rest(collected_data, "")
+        return areas
+
+    def _report_context(
+        self,
+        user_input: Dict[str, Any],
+        collected_data: Dict[str, Any],
+        search_results: Dict[str, Any],
+    ) -> Dict[str, str]:
+        """
+        构建各章节共享的精简上下文分区（紧凑 JSON，不缩进）
+        profile: 用户基本信息；origin / kinship / generation / other: 按领域拆分的收集数据；
+        conversation: 最近的对话；families: 可能的大家族；histories: 搜索到的大家族历史
+        """
+        areas = self._collected_areas(collected_data)
+        unparsed_info = collected_data.get("_unparsed", [])
+        conversation = [f"- {item.get('a', '')}" for item in unparsed_info[-5:]]  # 只取最近5条
+
+        def area(name: str) -> str:
+            return serialization.dumps(areas[name]) if areas[name] else "（未提供）"
+
+        return {
+            "profile": "\n".join([
+                f"用户姓名：{user_input.get('name', '用户')}",
+                f"用户出生地：{user_input.get('birth_place') or '未提供'}",
+                f"用户当前地区：{user_input.get('current_location') or '未提供'}",
+            ]),
+            "origin": area("origin"),
+            "kinship": area("kinship"),
+            "generation": area("generation"),
+            "other": area("other"),
+            "conversation": "\n".join(conversation) if conversation else "（无）",
+            "families": serialization.dumps(search_results.get("possible_families", [])),
+            "histories": serialization.dumps(self._compact_histories(search_results.get("family_histories", {}))),
+        }
 
-            timeline['events'] = events
+    @staticmethod
+    def _chapter_fingerprints(context: Dict[str, str]) -> Dict[str, str]:
+        """每个章节的输入指纹：模板版本 + 章节用到的上下文分区"""
+        return {
+            key: fingerprint(REPORT_TEMPLATE_VERSION, key, [context[name] for name in sections])
+            for key, _, sections, _ in REPORT_CHAPTERS
+        }
 
-        # 最终确保事件按时间排序（尝试按年份排序，未知年份放后）
-        def extract_year(d):
-            import re
-            m = re.search(r"(\d{4})", str(d))
-            return int(m.group(1)) if m else 9999
-
-        events = timeline.get('events', [])
-
-        # 规范化每个事件，确保包含 details 字段（数组），并去重基本字段
-        normalized = []
-        seen_keys = set()
-        for ev in events:
-            date = ev.get('date', '未知年份')
-            title = ev.get('title', ev.get('event', '')[:50])
-            description = ev.get('description', ev.get('event', ''))
-            key = f"{date}|{title}"
-            if key in seen_keys:
-                continue
-            seen_keys.add(key)
-            details = ev.get('details')
-            if not details:
-                details = [{
-                    'type': ev.get('category', 'general'),
-                    'title': title,
-                    'description': description,
-                    'person': ev.get('person_name') or ev.get('person')
-                }]
-            normalized.append({
-                'date': date,
-                'title': title,
-                'description': description,
-                'details': details
-            })
+    async def _generate_chapter(
+        self,
+        chapter: Tuple[str, str, Tuple[str, ...], str],
+        context: Dict[str, str],
+        user_name: str,
+    ) -> Dict[str, Any]:
+        """生成单个章节，失败时只重试本章节；重试用完仍失败则使用兜底正文"""
+        key, title, sections, guidance = chapter
+        labels = {
+            "profile": "用户基本信息",
+            "origin": "祖籍与迁徙线索（JSON格式）",
+            "kinship": "姓氏与亲属线索（JSON格式）",
+            "generation": "辈分字（JSON格式）",
+            "other": "其他收集到的家族信息（JSON格式）",
+            "conversation": "对话中的其他信息",
+            "families": "可能的大家族分析（JSON格式）",
+            "histories": "大家族历史资料（JSON格式）",
+        }
+        material = "\n\n".join(f"**{labels[name]}：**\n{context[name]}" for name in sections)
+        prompt = f"""
+你正在为{user_name}撰写家族历史寻根报告中的一章。报告的标题、称呼和其他章节由系统拼装，你只需要写这一章的正文。
 
-        # 如果事件数量不足 3 条，尝试调用 LLM 补充事件
-        if len(normalized) < 3:
-            needed = 3 - len(normalized)
-            try:
-                supplement_prompt = f"""
-基于以下已知信息与现有时间轴事件，补充至少 {needed} 个与该姓氏家族历史相关的重要时间点，使总事件数不少于 3 个，要求输出纯 JSON（只返回 JSON 对象），格式为：{{"events":[{{"date":"YYYY 或 YYYY-MM-DD","title":"事件标题","description":"事件说明","details":[{{"type":"migration|person|event|other","title":"","description":"","person":""}}]}}]}}。
+**本章标题：**{title}
 
-已知信息：
-用户输入：{json.dumps(user_input, ensure_ascii=False)}
-收集数据摘要：{json.dumps({k: collected_data.get(k) for k in ['self_origin','father_origin','migration_history','grandfather_name','generation_char']}, ensure_ascii=False)}
-现有事件：{json.dumps(normalized, ensure_ascii=False)}
+{material}
 
-补充时请避免与现有事件重复，优先生成代表迁徙、名人、重大事件的节点，并在描述中说明这是基于资料推测还是确证（例如“推测：… ”）。最多补充 {needed} 条。
+**本章写作要求：**
+{guidance}
+
+**通用要求：**
+1. 必须基于用户实际提供的信息，不要使用[用户姓名]、[用户姓氏]等占位符
+2. 使用温暖、亲切、有故事性的语言，尊重历史事实，区分推测和史实
+3. 如果某些信息用户没有提供，明确说明"根据现有信息推测"或"信息不足"
+4. 只返回本章正文，不要重复章节标题，不要写报告开头的称呼和结尾的致谢
 """
-                response = await self.gateway_service.llm_chat(
-                    messages=[{"role": "user", "content": supplement_prompt}],
-                    temperature=0.7,
-                    timeout=120
+        attempts = 1 + max(0, settings.report_chapter_retries)
+        for attempt in range(attempts):
+            checkpoint(f"report_chapter:{key}")
+            try:
+                text = await self.gateway_service.llm_chat(
+                    messages=[{"role": "user", "content": prompt}],
+                    temperature=0.8,
+                    call_site="report_chapter",
                 )
+                text = (text or "").strip()
+                if len(text) >= settings.report_chapter_min_chars:
+                    return {"key": key, "title": title, "text": text, "status": "ok"}
+                logger.warning(f"Report chapter {key} too short (attempt {attempt + 1}/{attempts})")
+            except (RequestCancelled, DeadlineExceeded):
+                raise
+            except Exception as e:
+                logger.error(f"Error generating report chapter {key} (attempt {attempt + 1}/{attempts}): {e}")
+        return {"key": key, "title": title, "text": None, "status": "fallback"}
 
-                import json as _json
-                try:
-                    parsed = _json.loads(response)
-                    if isinstance(parsed, dict) and 'events' in parsed:
-                        for ev in parsed['events']:
-                            date = ev.get('date', '未知年份')
-                            title = ev.get('title', '')
-                            description = ev.get('description', '')
-                            details = ev.get('details') or [{'type': 'generated', 'title': title, 'description': description}]
-                            key = f"{date}|{title}"
-                            if key not in seen_keys:
-                                seen_keys.add(key)
-                                normalized.append({
-                                    'date': date,
-                                    'title': title,
-                                    'description': description,
-                                    'details': details
-                                })
-                except Exception:
-                    logger.warning('Supplement timeline LLM response failed to parse as JSON')
+    async def _generate_chapters(
+        self,
+        context: Dict[str, str],
+        user_name: str,
+        previous: Optional[List[Dict[str, Any]]] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        并行生成所有章节（耗时取决于最慢的一章），结果保持 REPORT_CHAPTERS 的顺序
+        previous: 上一版本的章节；输入指纹相同且生成成功的章节直接复用，不再调用 LLM
+        """
+        fingerprints = self._chapter_fingerprints(context)
+        reusable = {
+            c["key"]: c for c in previous or []
+            if c.get("status") == "ok" and c.get("text") and c.get("fingerprint") == fingerprints.get(c.get("key"))
+        }
+
+        async def chapter_result(chapter: Tuple[str, str, Tuple[str, ...], str]) -> Dict[str, Any]:
+            key = chapter[0]
+            if key in reusable:
+                return {**reusable[key], "title": chapter[1]}
+            result = await self._generate_chapter(chapter, context, user_name)
+            result["fingerprint"] = fingerprints[key]
+            return result
+
+        results = list(await asyncio.gather(*[chapter_result(chapter) for chapter in REPORT_CHAPTERS]))
+        if reusable:
+            logger.info(f"Report chapters reused: {sorted(reusable)}")
+        return results
+
+    @staticmethod
+    def _assemble_report(user_input: Dict[str, Any], chapters: List[Dict[str, Any]]) -> str:
+        """按固定顺序拼装标题、称呼、各章节和结尾；失败的章节填入兜底正文"""
+        user_name = user_input.get("name", "用户")
+        values = {
+            "name": user_name,
+            "birth_place": user_input.get("birth_place") or "待补充",
+            "current_location": user_input.get("current_location") or "待补充",
+        }
+        parts = [
+            f"# 一脉相承，薪火相传——{user_name}家族历史寻根报告",
+            f"亲爱的{user_name}：",
+            "感谢您参与这次寻根之旅。基于您提供的信息和联网搜索，我们为您整理了这份家族历史报告。",
+        ]
+        for chapter in chapters:
+            text = chapter.get("text") or _CHAPTER_FALLBACKS.get(chapter["key"], "").format(**values)
+            parts.append(f"## {chapter['title']}\n\n{text}")
+        parts.append("感谢您参与这次寻根之旅！")
+        return "\n\n".join(parts) + "\n"
+
+    async def _build_timeline(
+        self,
+        session_id: str,
+        family_filter: Optional[str] = None,
+        search_results: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """构建家族时间轴（内部实现）：整合用户输入、收集数据和家族搜索结果在本地推导事件，覆盖不足时由 LLM 补充空档"""
+        session = await session_repository.get(session_id, "collected")
+        if not session:
+            raise ValueError(f"Session {session_id} not found")
+
+        # 使用调用方已有的搜索结果，没有时重新触发搜索
+        if search_results is None:
+            try:
+                search_results = await self.search_service.perform_search(session_id)
+            except (RequestCancelled, DeadlineExceeded):
+                raise
             except Exception as e:
-                logger.error(f"Error calling LLM to supplement timeline: {e}")
+                logger.warning(f"Search failed while building timeline: {e}")
+                search_results = {"possible_families": [], "family_histories": {}, "summary": {}}
 
-        # 兜底：如果仍不足 3 个，基于已有信息合成简单事件
-        if len(normalized) < 3:
+        user_input = session.get("user_input", {})
+        # 兼容 family_graph.collected_data 与 top-level collected_data 两种存储方式
+        collected_data = extract_collected_data(session)
+
+        # 先从已有信息确定性地推导事件，覆盖不足时才带着空档清单请 LLM 补充一次
+        builder = TimelineBuilder()
+        events = builder.local_events(user_input, collected_data, search_results, family_filter)
+        coverage, gaps = builder.assess(events)
+        logger.info(f"Local timeline for session {session_id}: {len(events)} events, coverage={coverage:.2f}, gaps={len(gaps)}")
+        if gaps and (coverage < settings.timeline_coverage_threshold or len(events) < settings.timeline_min_events):
+            checkpoint("timeline_gaps")
+            filled = await self._fill_timeline_gaps(user_input, collected_data, events, gaps)
+            events = builder.merge(events, filled)
+
+        # 兜底：仍不足 timeline_min_events 个时，基于已知信息合成推测事件
+        if len(events) < settings.timeline_min_events:
+            self_origin = collected_data.get('self_origin') or (collected_data.get('self') or {}).get('origin') or (collected_data.get('user_profile') or {}).get('birth_place')
+            father_origin = collected_data.get('father_origin') or (collected_data.get('father') or {}).get('origin')
+            grandfather_name = collected_data.get('grandfather_name') or (collected_data.get('grandfather') or {}).get('name')
+            fallback = []
             origin = self_origin or father_origin
             if origin:
-                key = f"约1800-1900|家族起源地：{origin}"
-                if key not in seen_keys:
-                    normalized.append({
-                        'date': '约1800-1900',
-                        'title': f'家族主要起源地：{origin}',
-                        'description': f'据口述或档案，家族与 {origin} 有重要渊源（注：此为推测）。',
-                        'details': [{
-                            'type': 'origin',
-                            'title': f'来自 {origin}',
-                            'description': f'家族主要与 {origin} 有联系（推测）'
-                        }]
-                    })
-            migration = migration_history
-            if migration and len(normalized) < 3:
-                parts = migration if isinstance(migration, list) else str(migration).split('\n')[:3]
-                for part in parts:
-                    import re
-                    m = re.search(r"(\d{4})", part)
-                    date = m.group(1) if m else '未知年份'
-                    key = f"{date}|迁徙：{part[:30]}"
-                    if key not in seen_keys and len(normalized) < 3:
-                        normalized.append({
-                            'date': date,
-                            'title': '迁徙记录',
-                            'description': part,
-                            'details': [{
-                                'type': 'migration',
-                                'title': '迁徙',
-                                'description': part
-                            }]
-                        })
-            if grandfather_name and len(normalized) < 3:
-                normalized.append({
+                fallback.append({
+                    'date': '约1800-1900',
+                    'title': f'家族主要起源地：{origin}',
+                    'description': f'据口述或档案，家族与 {origin} 有重要渊源（注：此为推测）。',
+                    'details': [{'type': 'origin', 'title': f'来自 {origin}', 'description': f'家族主要与 {origin} 有联系（推测）'}],
+                    'source': 'inferred',
+                })
+            if grandfather_name:
+                fallback.append({
                     'date': '约1900-1950',
                     'title': f"家族重要人物：{grandfather_name}",
                     'description': f"家族记载中的人物：{grandfather_name}（推测年代）。",
-                    'details': [{
-                        'type': 'person',
-                        'title': grandfather_name,
-                        'description': f"记载中的人物 {grandfather_name}（推测）。",
-                        'person': grandfather_name
-                    }]
+                    'details': [{'type': 'person', 'title': grandfather_name, 'description': f"记载中的人物 {grandfather_name}（推测）。", 'person': grandfather_name}],
+                    'source': 'inferred',
                 })
+            events = builder.merge(events, fallback)
+            # 最终兜底，确保至少 timeline_min_events 个时间点（用合成的占位事件）
+            idx = 0
+            while len(events) < settings.timeline_min_events:
+                idx += 1
+                events = builder.merge(events, [{'date': f"约19{50+idx*5}", 'title': f'家族历史节点{idx}', 'description': '系统推测的历史节点（合成）', 'details': [{'type': 'generated', 'title': f'家族历史节点{idx}', 'description': '系统推测的历史节点（合成）'}], 'source': 'inferred'}])
 
-        # 最终兜底，确保至少 3 个时间点（用合成的占位事件）
-        if len(normalized) < 3:
-            # 添加用户出生年份（如果有）
-            birth = user_input.get('birth_date')
-            if birth:
-                import re
-                m = re.search(r"(\d{4})", str(birth))
-                if m:
-                    y = m.group(1)
-                    key = f"{y}|用户出生"
-                    if key not in seen_keys and len(normalized) < 3:
-                        normalized.append({'date': y, 'title': '用户出生', 'description': f"用户出生于 {birth}", 'details': [{'type': 'birth', 'title': '出生', 'description': f'用户出生于 {birth}'}]})
-            # 生成一些通用的推测节点
-            while len(normalized) < 3:
-                idx = len(normalized) + 1
-                normalized.append({'date': f"约19{50+idx*5}", 'title': f'家族历史节点{idx}', 'description': '系统推测的历史节点（合成）', 'details': [{'type': 'generated', 'title': f'家族历史节点{idx}', 'description': '系统推测的历史节点（合成）'}]})
-
-        # 按年份排序
-        normalized.sort(key=lambda e: extract_year(e.get('date')))
-
-        timeline['events'] = normalized
+        return {"events": builder.finalize(events), "coverage": coverage}
 
-        return timeline
+    async def _fill_timeline_gaps(
+        self,
+        user_input: Dict[str, Any],
+        collected_data: Dict[str, Any],
+        events: List[Dict[str, Any]],
+        gaps: List[Dict[str, Any]],
+    ) -> List[Dict[str, Any]]:
+        """一次 LLM 调用，只补充空档清单里的主题和年代；失败时返回空列表"""
+        self_data = collected_data.get('self') or {}
+        known = {
+            "姓名": user_input.get("name"),
+            "出生": user_input.get("birth_date"),
+            "姓氏": self_data.get("surname") or collected_data.get("surname"),
+            "祖籍": self_data.get("origin") or collected_data.get("self_origin"),
+            "父亲籍贯": (collected_data.get("father") or {}).get("origin") or collected_data.get("father_origin"),
+            "辈分字": self_data.get("generation_name") or collected_data.get("generation_char"),
+        }
+        existing = "\n".join(f"- {e['date']} {e['title']}" for e in events) or "（无）"
+        needs = "\n".join(
+            f"- {gap['need']}" if "need" in gap else f"- {gap['from']} 至 {gap['to']}（{gap['periods'] or '该时段'}）之间没有事件"
+            for gap in gaps
+        )
+        limit = min(max(2 * len(gaps), settings.timeline_min_events), settings.timeline_max_events - len(events))
+        if limit <= 0:
+            return []
+        prompt = f"""
+请为下面这个家族的时间轴补充缺失的部分，只返回 JSON：
+{{"events": [{{"date": "YYYY、朝代或年号", "title": "事件标题", "description": "事件说明", "type": "migration|person|event|other"}}]}}
+
+已知信息：{serialization.dumps({k: v for k, v in known.items() if v})}
+已有事件：
+{existing}
+
+需要补充的空档：
+{needs}
+
+要求：只补充上面列出的空档，每个空档 1-2 条，最多 {limit} 条；不要重复已有事件；基于资料推测的在描述中注明“推测”。
+"""
+        try:
+            response = await self.gateway_service.llm_chat(
+                messages=[{"role": "user", "content": prompt}],
+                temperature=0.7,
+                call_site="timeline_gaps"
+            )
+        except (RequestCancelled, DeadlineExceeded):
+            raise
+        except Exception as e:
+            logger.error(f"Error calling LLM to fill timeline gaps: {e}")
+            return []
+
+        parsed = None
+        try:
+            parsed = json.loads(response)
+        except Exception:
+            # 没有直接返回 JSON 时，尝试提取 JSON 片段
+            start, end = response.find('{'), response.rfind('}')
+            if start != -1 and end != -1:
+                try:
+                    parsed = json.loads(response[start:end + 1])
+                except Exception as e:
+                    logger.warning(f"Failed to parse timeline gap JSON: {e}")
+        if not isinstance(parsed, dict) or not isinstance(parsed.get("events"), list):
+            logger.warning("Timeline gap LLM response did not contain 'events'")
+            return []
+
+        filled = []
+        for ev in parsed["events"][:limit]:
+            if not isinstance(ev, dict) or not ev.get("title"):
+                continue
+            title, description = str(ev["title"]), str(ev.get("description") or "")
+            filled.append({
+                'date': str(ev.get('date') or '未知年份'),
+                'title': title,
+                'description': description,
+                'details': [{'type': ev.get('type') or 'generated', 'title': title, 'description': description}],
+                'source': 'llm',
+            })
+        return filled
     
     async def generate_images_from_report(
         self,
@@ -608,14 +690,13 @@ class OutputService:
         Returns:
             图片URL列表
         """
-        db = await get_mongodb_db()
-        session = await db.sessions.find_one({"_id": session_id})
+        session = await session_repository.get(session_id, "report")
         
         if not session:
             raise ValueError(f"Session {session_id} not found")
         
-        # 获取报告
-        report = session.get("report")
+        # 获取报告（图片提示词只需要正文，不读取时间轴）
+        report = await load_session_report(session, include_timeline=False)
         if not report:
             raise ValueError(f"Report not found for session {session_id}. Please generate report first.")
         
@@ -670,7 +751,7 @@ class OutputService:
             prompt_response = await self.gateway_service.llm_chat(
                 messages=[{"role": "user", "content": prompt_generation_text}],
                 temperature=0.8,
-                timeout=60
+                call_site="image_prompts"
             )
             
             # 解析JSON响应
@@ -718,20 +799,17 @@ class OutputService:
             if not image_urls:
                 raise Exception("未能生成任何图片")
             
-            # 更新报告，添加图片URL
-            report["images"] = image_urls
-            report["images_generated_at"] = datetime.now().isoformat()
-            
-            # 保存到数据库
+            # 保存到数据库：替换该版本报告 assets 中的图片，不重写报告
             try:
-                await db.sessions.update_one(
-                    {"_id": session_id},
-                    {
-                        "$set": {
-                            "report": report
-                        }
-                    }
-                )
+                version = session.get("report_version")
+                if version:
+                    await report_repository.save_images(session_id, version, image_urls)
+                else:
+                    # 旧数据：报告仍内嵌在会话文档中，只 $set 图片字段
+                    await session_repository.update(session_id, {
+                        "report.images": image_urls,
+                        "report.images_generated_at": datetime.now().isoformat(),
+                    })
                 logger.info(f"Images saved to report for session {session_id}")
             except Exception as e:
                 logger.error(f"Error saving images to database: {e}")
@@ -754,8 +832,7 @@ class OutputService:
         生成个人传记
         整合用户输入和家族图谱，生成融入家族叙事的个人故事
         """
-        db = await get_mongodb_db()
-        session = await db.sessions.find_one({"_id": session_id})
+        session = await session_repository.get(session_id, "collected")
         
         if not session:
             raise ValueError(f"Session {session_id} not found")
@@ -765,8 +842,8 @@ class OutputService:
         
         prompt = f"""
 基于以下信息，生成一份个人传记，融入家族叙事：
-个人信息：{json.dumps(user_input, ensure_ascii=False)}
-家族图谱：{json.dumps(family_graph, ensure_ascii=False)}
+个人信息：{serialization.dumps(user_input)}
+家族图谱：{serialization.dumps(family_graph)}
 
 要求：
 1. 以第一人称或第三人称叙述
@@ -778,7 +855,8 @@ class OutputService:
         try:
             response = await self.gateway_service.llm_chat(
                 messages=[{"role": "user", "content": prompt}],
-                temperature=0.8
+                temperature=0.8,
+                call_site="biography"
             )
             return response
         except Exception as e:
@@ -802,7 +880,6 @@ class OutputService:
             from reportlab.pdfgen import canvas
             from reportlab.lib.utils import ImageReader
             import io
-            import httpx
             
             report = await self.generate_report(session_id)
             
@@ -833,12 +910,12 @@ class OutputService:
                 y = height - 50
                 for img_url in report["images"][:3]:  # 最多3张
                     try:
-                        async with httpx.AsyncClient() as client:
-                            img_response = await client.get(img_url)
-                            img_data = img_response.content
-                            img = ImageReader(io.BytesIO(img_data))
-                            c.drawImage(img, 50, y - 200, width=500, height=200)
-                            y -= 250
+                        client = await get_http_client()
+                        img_response = await client.get(img_url)
+                        img_data = img_response.content
+                        img = ImageReader(io.BytesIO(img_data))
+                        c.drawImage(img, 50, y - 200, width=500, height=200)
+                        y -= 250
                     except Exception as e:
                         logger.error(f"Error adding image to PDF: {e}")
             
@@ -3,12 +3,18 @@
 基于用户信息搜索大家族历史和相关信息
 支持博查API（真正的联网搜索）和 DeepSeek（知识库搜索）
 """
-import httpx
+import time
 import asyncio
 from typing import List, Dict, Any, Optional
-from app.dependencies.db import get_mongodb_db
+from app.repositories.clan_repository import clan_repository, extract_halls, rank_clans
+from app.repositories.session_repository import session_repository, extract_collected_data
+from app.dependencies.db import get_http_client
+from app.dependencies.request_context import checkpoint
 from app.utils.logger import logger
+from app.utils.surnames import surname_of
 from app.services.gateway_service import GatewayService
+from app.utils.latency_tracker import latency_tracker
+from app.utils.timeout_policy import timeout_policy
 from app.config import settings
 import json
 
@@ -16,9 +22,9 @@ import json
 class SearchService:
     """搜索服务类 - 支持博查API联网搜索和 DeepSeek 知识库搜索"""
     
-    def __init__(self):
+    def __init__(self, gateway_service: Optional[GatewayService] = None):
         """初始化搜索客户端"""
-        self.gateway_service = GatewayService()
+        self.gateway_service = gateway_service or GatewayService()
         self.bocha_api_key = settings.bocha_api_key
         self.bocha_api_base_url = settings.bocha_api_base_url
         
@@ -43,47 +49,53 @@ class SearchService:
             logger.warning("BochaAI API key not configured, skipping web search")
             return []
         
+        import httpx
+        timeout = timeout_policy.timeout_for("bocha_search")
+        started = time.monotonic()
         try:
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                response = await client.post(
-                    f"{self.bocha_api_base_url}/web-search",
-                    headers={
-                        "Authorization": f"Bearer {self.bocha_api_key}",
-                        "Content-Type": "application/json"
-                    },
-                    json={
-                        "query": query,
-                        "freshness": freshness,
-                        "summary": True,
-                        "count": num_results
-                    }
-                )
-                
-                if response.status_code != 200:
-                    logger.error(f"BochaAI API error: {response.status_code} - {response.text}")
-                    return []
-                
-                data = response.json()
-                
-                # 解析博查API响应
-                results = []
-                web_pages = data.get("webPages", {}).get("value", [])
-                
-                for page in web_pages:
-                    results.append({
-                        "title": page.get("name", ""),
-                        "snippet": page.get("snippet", ""),
-                        "url": page.get("url", ""),
-                        "source": "bochaai",
-                        "datePublished": page.get("datePublished", ""),
-                        "siteName": page.get("siteName", "")
-                    })
-                
-                logger.info(f"BochaAI search returned {len(results)} results for query: {query}")
-                return results
-                
+            client = await get_http_client()
+            response = await client.post(
+                f"{self.bocha_api_base_url}/web-search",
+                headers={
+                    "Authorization": f"Bearer {self.bocha_api_key}",
+                    "Content-Type": "application/json"
+                },
+                json={
+                    "query": query,
+                    "freshness": freshness,
+                    "summary": True,
+                    "count": num_results
+                },
+                timeout=timeout
+            )
+            
+            if response.status_code != 200:
+                logger.error(f"BochaAI API error: {response.status_code} - {response.text}")
+                return []
+            
+            data = response.json()
+            
+            # 解析博查API响应
+            results = []
+            web_pages = data.get("webPages", {}).get("value", [])
+            
+            for page in web_pages:
+                results.append({
+                    "title": page.get("name", ""),
+                    "snippet": page.get("snippet", ""),
+                    "url": page.get("url", ""),
+                    "source": "bochaai",
+                    "datePublished": page.get("datePublished", ""),
+                    "siteName": page.get("siteName", "")
+                })
+            
+            latency_tracker.record("bocha_search", time.monotonic() - started)
+            logger.info(f"BochaAI search returned {len(results)} results for query: {query}")
+            return results
+            
         except httpx.TimeoutException:
-            logger.error(f"BochaAI API timeout for query: {query}")
+            timeout_policy.record_timeout("bocha_search", timeout)
+            logger.error(f"BochaAI API timeout ({timeout:.1f}s) for query: {query}")
             return []
         except Exception as e:
             logger.error(f"BochaAI search error: {e}")
@@ -162,7 +174,7 @@ class SearchService:
             response = await self.gateway_service.llm_chat(
                 messages=[{"role": "user", "content": prompt}],
                 temperature=0.7,  # 降低温度以加快响应
-                timeout=120  # 设置120秒超时
+                call_site="search_summary"  # 超时由自适应超时策略决定
             )
             
             # 将响应转换为搜索结果格式
@@ -207,7 +219,7 @@ class SearchService:
         """
         try:
             # 首先，从嵌套结构中提取并转换为扁平结构，确保信息不丢失
-            self._normalize_collected_data(collected_data)
+            self.normalize_collected_data(collected_data)
             
             # 提取关键信息，统一数据格式
             user_info_summary = []
@@ -270,7 +282,7 @@ class SearchService:
             
             # 如果从祖父姓名中提取姓氏（如果还没有姓氏）
             if not surname and grandfather_name:
-                surname = grandfather_name[0]
+                surname = surname_of(grandfather_name)
                 collected_data["surname"] = surname
                 collected_data.setdefault("self", {})["surname"] = surname
                 logger.info(f"Extracted surname '{surname}' from grandfather name '{grandfather_name}'")
@@ -338,7 +350,8 @@ class SearchService:
                     "relevance": "低",
                     "connection_clues": ["信息不足，需要更多线索"],
                     "note": "用户未提供关键信息（姓氏、地区、祖父姓名等），无法进行准确匹配",
-                    "suggestion": "建议提供：1. 家族姓氏 2. 祖籍/籍贯 3. 祖父姓名 4. 辈分字"
+                    "suggestion": "建议提供：1. 家族姓氏 2. 祖籍/籍贯 3. 祖父姓名 4. 辈分字",
+                    "placeholder": True
                 }]
             
             # 分两步匹配：先按姓氏，再按地区
@@ -397,7 +410,7 @@ class SearchService:
                     surname_response = await self.gateway_service.llm_chat(
                         messages=[{"role": "user", "content": surname_prompt}],
                         temperature=0.7,
-                        timeout=120
+                        call_site="family_match"
                     )
                     # 解析姓氏匹配结果
                     surname_family = self._parse_family_response(surname_response, surname)
@@ -454,7 +467,7 @@ class SearchService:
                     region_response = await self.gateway_service.llm_chat(
                         messages=[{"role": "user", "content": region_prompt}],
                         temperature=0.7,
-                        timeout=120
+                        call_site="family_match"
                     )
                     # 解析地区匹配结果
                     region_family = self._parse_family_response(region_response, None, main_region)
@@ -508,7 +521,7 @@ class SearchService:
                     region_response = await self.gateway_service.llm_chat(
                         messages=[{"role": "user", "content": region_prompt}],
                         temperature=0.7,
-                        timeout=120
+                        call_site="family_match"
                     )
                     region_family = self._parse_family_response(region_response, None, main_region)
                     if region_family:
@@ -528,7 +541,8 @@ class SearchService:
                         "cultural_features": "待补充",
                         "relevance": "中",
                         "connection_clues": [f"姓氏：{surname}"],
-                        "note": "基于姓氏推测，需要更多信息确认"
+                        "note": "基于姓氏推测，需要更多信息确认",
+                        "placeholder": True
                     }]
                 elif main_region:
                     return [{
@@ -539,7 +553,8 @@ class SearchService:
                         "cultural_features": "待补充",
                         "relevance": "中",
                         "connection_clues": [f"地区：{main_region}"],
-                        "note": "基于地区推测，需要更多信息确认"
+                        "note": "基于地区推测，需要更多信息确认",
+                        "placeholder": True
                     }]
             
             return families
@@ -570,7 +585,8 @@ class SearchService:
                 "relevance": "低",
                 "connection_clues": connection_clues,
                 "error": str(e),
-                "note": "分析过程出错，基于用户信息推测"
+                "note": "分析过程出错，基于用户信息推测",
+                "placeholder": True
             }]
     
     def _parse_family_response(self, response: str, expected_surname: Optional[str] = None, expected_region: Optional[str] = None) -> Optional[Dict[str, Any]]:
@@ -666,7 +682,7 @@ class SearchService:
             logger.error(f"Error parsing family response: {e}")
             return None
     
-    def _normalize_collected_data(self, collected_data: Dict[str, Any]) -> None:
+    def normalize_collected_data(self, collected_data: Dict[str, Any]) -> None:
         """
         规范化收集的数据，将嵌套结构转换为扁平结构，确保信息不丢失
         同时保持嵌套结构同步更新，确保数据一致性
@@ -724,7 +740,7 @@ class SearchService:
                 if not collected_data.get("surname"):
                     user_name = user_profile["name"]
                     if user_name and len(user_name) > 0:
-                        surname = user_name[0]
+                        surname = surname_of(user_name)
                         collected_data["surname"] = surname
                         collected_data.setdefault("self", {})["surname"] = surname
                         logger.debug(f"Normalized: user_profile.name -> surname: {surname}")
@@ -742,23 +758,13 @@ class SearchService:
         执行搜索
         基于 session 中的家族图谱进行搜索
         """
-        db = await get_mongodb_db()
-        session = await db.sessions.find_one({"_id": session_id})
+        session = await session_repository.get(session_id, "collected")
         
         if not session:
             raise ValueError(f"Session {session_id} not found")
         
         # 兼容多种数据格式
-        family_graph = session.get("family_graph", {})
-        if isinstance(family_graph, dict) and "collected_data" in family_graph:
-            # 新格式：family_graph.collected_data
-            collected_data = family_graph.get("collected_data", {})
-        elif isinstance(family_graph, dict) and family_graph:
-            # 旧格式：family_graph 直接就是 collected_data
-            collected_data = family_graph
-        else:
-            # 尝试从 collected_data 字段获取
-            collected_data = session.get("collected_data", {})
+        collected_data = extract_collected_data(session)
         
         if not collected_data:
             logger.warning(f"No collected_data found for session {session_id}, using empty dict")
@@ -767,7 +773,7 @@ class SearchService:
         # 规范化数据，确保信息不丢失
         logger.info(f"Performing search for session {session_id}")
         logger.info(f"Collected data before normalization - keys: {list(collected_data.keys())}")
-        self._normalize_collected_data(collected_data)
+        self.normalize_collected_data(collected_data)
         
         # 记录收集到的数据（用于调试）
         logger.info(f"Collected data after normalization - keys: {list(collected_data.keys())}")
@@ -779,23 +785,42 @@ class SearchService:
         grandfather_name = collected_data.get("grandfather_name") or collected_data.get("grandfather", {}).get("name")
         logger.info(f"Key fields for search - surname: {surname}, self_origin: {self_origin}, grandfather_name: {grandfather_name}")
         
-        results = {}
-        
-        # 1. 分析可能的大家族关联（会从未解析对话中提取信息）
         logger.info(f"Analyzing family associations for session {session_id}")
-        possible_families = await self.analyze_family_associations(collected_data)
+        search_results = await self.search_for_collected_data(collected_data)
+        
+        # 会话引用全局宗族图谱中的宗族节点
+        if search_results.get("clan_ids"):
+            try:
+                await clan_repository.link_sessions([session_id], search_results["possible_families"])
+            except Exception as e:
+                logger.warning(f"Failed to link session {session_id} to clans: {e!r}")
         
         # 保存提取后的数据回 MongoDB（因为 analyze_family_associations 可能从未解析对话中提取了信息）
         try:
-            await db.sessions.update_one(
-                {"_id": session_id},
-                {"$set": {"family_graph": {"collected_data": collected_data}}}
-            )
+            await session_repository.update(session_id, {"family_graph": {"collected_data": collected_data}})
             logger.info(f"Saved extracted data back to MongoDB for session {session_id}")
         except Exception as e:
             logger.warning(f"Failed to save extracted data to MongoDB: {e}")
         
+        return search_results
+    
+    async def search_for_collected_data(self, collected_data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        基于（已规范化的）收集数据做大家族关联分析和历史搜索
+        不读写会话，可供多个会话共享同一份结果（如同姓同乡的宗亲批量生成报告）
+        """
+        # 0. 全局宗族图谱中已有同姓且籍贯或堂号相符的宗族节点时直接引用，不再重复分析和搜索
+        if settings.clan_graph_enabled:
+            reused = await self._search_results_from_clans(collected_data)
+            if reused:
+                return reused
+        
+        # 1. 分析可能的大家族关联（会从未解析对话中提取信息）
+        checkpoint("family_match")
+        possible_families = await self.analyze_family_associations(collected_data)
+        
         # 2. 对每个可能的大家族进行历史搜索（并行执行，最多处理前3个最相关的家族）
+        checkpoint("family_history_search")
         family_histories = {}
         # 只处理前3个最相关的家族，按关联度排序
         families_to_search = sorted(
@@ -859,7 +884,7 @@ class SearchService:
                     if additional_search:
                         user_searches["additional"] = additional_search
         
-        return {
+        search_results = {
             "possible_families": possible_families,
             "family_histories": family_histories,
             "user_searches": user_searches,
@@ -868,6 +893,96 @@ class SearchService:
                 "high_relevance_families": [f for f in possible_families if f.get("relevance") == "高"]
             }
         }
+        if settings.clan_graph_enabled and family_histories:
+            search_results["clan_ids"] = await self._save_clans(collected_data, family_histories)
+        return search_results
+    
+    @staticmethod
+    def _clan_lookup_keys(collected_data: Dict[str, Any]) -> tuple:
+        """在宗族图谱中查找时用的 (姓氏, 籍贯列表, 堂号列表)"""
+        self_data = collected_data.get("self") if isinstance(collected_data.get("self"), dict) else {}
+        surname = (collected_data.get("surname") or self_data.get("surname") or "").strip()
+        regions = [
+            collected_data.get("self_origin"),
+            self_data.get("origin"),
+            collected_data.get("father_origin"),
+            (collected_data.get("grandfather") or {}).get("origin") if isinstance(collected_data.get("grandfather"), dict) else None,
+            (collected_data.get("user_profile") or {}).get("birth_place"),
+        ]
+        texts = [turn.get("a") or "" for turn in collected_data.get("_unparsed") or [] if isinstance(turn, dict)]
+        texts.extend(str(v) for v in self_data.values() if isinstance(v, str))
+        return surname, [r for r in regions if r], extract_halls(texts)
+    
+    async def _search_results_from_clans(self, collected_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """用已有宗族节点组装搜索结果；没有相符的节点（或图谱不可用）时返回 None，由调用方重新分析"""
+        surname, regions, halls = self._clan_lookup_keys(collected_data)
+        if not surname or not (regions or halls):
+            return None
+        checkpoint("clan_lookup")
+        try:
+            clans = await clan_repository.find_clans(
+                surname, regions, halls, fresh_after=time.time() - settings.clan_reuse_ttl
+            )
+        except Exception as e:
+            logger.warning(f"宗族图谱查询失败，改为重新分析: {e!r}")
+            return None
+        # 跳过历史上写入的兜底结果和没有历史资料的节点
+        clans = [c for c in clans if self._is_clan_result({"family_info": c.get("family"), "history": c.get("history")})]
+        ranked = rank_clans(clans, regions, halls)[:3]
+        if not ranked:
+            return None
+        
+        possible_families, family_histories = [], {}
+        for score, clan in ranked:
+            family = dict(clan.get("family") or {})
+            family_name = family.get("family_name") or (clan.get("names") or [""])[0]
+            # 关联度和依据按当前用户重新给出，而不是沿用第一次分析时那位用户的
+            family.update(
+                clan_id=clan["_id"],
+                relevance="高" if score >= 2 else "中",
+                match_basis=f"同姓，{'堂号' if score >= 3 else '籍贯'}与宗族图谱中已收录的{family_name}相符",
+            )
+            possible_families.append(family)
+            family_histories[family_name] = {"family_info": family, "history": clan.get("history") or []}
+        logger.info(f"Reused {len(possible_families)} clans from clan graph for surname={surname}, regions={regions}")
+        return {
+            "possible_families": possible_families,
+            "family_histories": family_histories,
+            "user_searches": {},
+            "summary": {
+                "total_families_found": len(possible_families),
+                "high_relevance_families": [f for f in possible_families if f.get("relevance") == "高"]
+            },
+            "clan_ids": [f["clan_id"] for f in possible_families],
+        }
+    
+    @staticmethod
+    def _is_clan_result(entry: Dict[str, Any]) -> bool:
+        """
+        只有真正匹配到、并且搜到了历史资料的大家族才能进入宗族图谱
+        analyze_family_associations 出错或没匹配到时返回的兜底结果（placeholder）会被同姓同乡的其他用户长期复用，不能写入
+        """
+        family = entry.get("family_info") or {}
+        return bool(entry.get("history")) and not family.get("placeholder") and not family.get("error")
+    
+    async def _save_clans(self, collected_data: Dict[str, Any], family_histories: Dict[str, Any]) -> List[str]:
+        """把新分析、搜索到的大家族写入宗族图谱，返回规范 ID；用户提到的堂号只记在最相关的大家族上"""
+        surname, _, halls = self._clan_lookup_keys(collected_data)
+        clan_ids: List[str] = []
+        entries = [(name, entry) for name, entry in family_histories.items() if self._is_clan_result(entry)]
+        for i, (family_name, entry) in enumerate(entries):
+            family = entry["family_info"]
+            texts = [family_name, str(family.get("connection_clues") or ""), str(family.get("cultural_features") or "")]
+            try:
+                cid = await clan_repository.save_clan(
+                    surname, family, entry.get("history") or [], extract_halls(texts) + (halls if i == 0 else [])
+                )
+            except Exception as e:
+                logger.warning(f"宗族图谱写入失败（不影响本次搜索）: {family_name}: {e!r}")
+                continue
+            family["clan_id"] = cid
+            clan_ids.append(cid)
+        return clan_ids
     
     async def search_historical_records(self, name: str, date: Optional[str] = None) -> List[Dict[str, str]]:
         """搜索历史记录"""
@@ -0,0 +1,209 @@
+"""
+本地时间轴构建
+从收集的信息（回答、迁徙记录、出生日期）、搜索摘要、历史名人的朝代和年号索引中确定性地推导时间轴事件，不调用 LLM；
+再按主题和年代空档评估覆盖情况，只有覆盖不足时才由调用方带着空档清单请 LLM 补充一次
+"""
+import re
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from app.config import settings
+from app.utils.chronology import get_chronology
+from app.utils.date_extraction import DateExtractor, DateMention, format_year, get_date_extractor
+
+
+# 时间轴应覆盖的主题：(key, 说明)，缺失的主题会出现在补充请求的空档清单里
+TIMELINE_THEMES: List[Tuple[str, str]] = [
+    ("origin", "家族起源（1840 年以前的郡望、始迁祖或宗族大事）"),
+    ("figure", "与该姓氏家族相关的历史名人"),
+    ("migration", "家族迁徙"),
+    ("modern", "近现代（1840 年以后）的家族经历"),
+]
+MODERN_YEAR = 1840
+
+_MIGRATION_RE = re.compile(r"迁|搬|移居|闯关东|下南洋|走西口|逃荒|逃难|落户|定居|入闽|入川")
+_SENTENCE_END = "。！？!?；;\n"
+# 收集数据中按人物存放的字段：key -> 称谓
+_KIN_LABELS = {"father": "父亲", "mother": "母亲", "grandfather": "祖父", "grandmother": "祖母"}
+_SKIP_KEYS = {"_unknown", "_unparsed", "user_profile"}
+
+
+def _sentence_at(text: str, pos: int, limit: int = 100) -> str:
+    """text 中包含位置 pos 的那一句"""
+    start = max(text.rfind(ch, 0, pos) for ch in _SENTENCE_END) + 1
+    ends = [i for i in (text.find(ch, pos) for ch in _SENTENCE_END) if i != -1]
+    return text[start:min(ends) if ends else len(text)].strip()[:limit]
+
+
+def _event(
+    mention: DateMention,
+    title: str,
+    description: str,
+    kind: str,
+    dates: DateExtractor,
+    person: Optional[str] = None,
+    source: str = "local",
+) -> Dict[str, Any]:
+    """时间轴事件；精确到年的写公历年份，朝代 / 年号 / 世纪等保留原文（如“唐朝”“康熙年间”）"""
+    return {
+        "date": format_year(mention.start) if mention.start == mention.end else mention.text,
+        "title": title,
+        "description": description,
+        "details": [{"type": kind, "title": title, "description": description, "person": person}],
+        "year": mention.year,
+        "period": dates.period(mention),
+        "source": source,
+    }
+
+
+class TimelineBuilder:
+    """确定性的时间轴构建与覆盖评估（不做 I/O）"""
+
+    def __init__(self, dates: Optional[DateExtractor] = None):
+        self.dates = dates or get_date_extractor()
+
+    def local_events(
+        self,
+        user_input: Dict[str, Any],
+        collected_data: Dict[str, Any],
+        search_results: Dict[str, Any],
+        family_filter: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        """从已有信息推导事件：所有待提取的文本汇总后一次批量提取年代"""
+        # (文本, 生成事件的函数)；函数拿到该文本中的全部年代，返回事件列表
+        items: List[Tuple[str, Any]] = []
+
+        name = user_input.get("name") or "用户"
+        if user_input.get("birth_date"):
+            birth = str(user_input["birth_date"])
+            items.append((birth, lambda ms, birth=birth: [
+                _event(ms[0], f"{name}出生", f"{name}出生于 {birth}", "birth", self.dates, person=name)
+            ]))
+
+        for key, label in _KIN_LABELS.items():
+            person = collected_data.get(key)
+            if not isinstance(person, dict):
+                continue
+            birth = person.get("birth_date") or person.get("birth_year")
+            if birth:
+                who = f"{label}{person.get('name') or ''}"
+                items.append((str(birth), lambda ms, who=who, birth=birth: [
+                    _event(ms[0], f"{who}出生", f"{who}出生于 {birth}", "birth", self.dates, person=who)
+                ]))
+
+        for text in self._collected_texts(collected_data):
+            items.append((text, lambda ms, text=text: self._memory_events(text, ms)))
+
+        for family in search_results.get("possible_families") or []:
+            family_name = family.get("family_name", "")
+            if family_filter and family_filter not in family_name:
+                continue
+            for figure in family.get("famous_figures") or []:
+                # 朝代在前、事迹在后拼成一段：优先用朝代定年
+                text = f"{figure.get('dynasty_period') or ''}\n{figure.get('story') or ''}"
+                items.append((text, lambda ms, figure=figure, family_name=family_name: [
+                    self._figure_event(figure, family_name, ms[0])
+                ]))
+
+        for family_name, history in (search_results.get("family_histories") or {}).items():
+            if family_filter and family_filter not in family_name:
+                continue
+            for item in ((history or {}).get("history") or [])[:5]:
+                snippet = item.get("snippet") or ""
+                items.append((snippet, lambda ms, item=item, snippet=snippet, family_name=family_name: [
+                    _event(
+                        ms[0], (item.get("title") or family_name)[:30], _sentence_at(snippet, ms[0].pos),
+                        "history", self.dates, source=item.get("url") or "search",
+                    )
+                ]))
+
+        events: List[Dict[str, Any]] = []
+        for (_, make), mentions in zip(items, self.dates.extract_batch([text for text, _ in items])):
+            if mentions:
+                events.extend(make(mentions))
+        return self.merge([], events)
+
+    @staticmethod
+    def _collected_texts(collected_data: Dict[str, Any]) -> List[str]:
+        """收集数据中可能带年代的自由文本：对话回答、迁徙记录和各人物字段"""
+        texts = [turn.get("a") or "" for turn in collected_data.get("_unparsed") or [] if isinstance(turn, dict)]
+        migration = collected_data.get("migration_history") or collected_data.get("migration")
+        if migration:
+            texts.extend(migration if isinstance(migration, list) else str(migration).split("\n"))
+        for key, value in collected_data.items():
+            if key in _SKIP_KEYS or key == "migration_history":
+                continue
+            if isinstance(value, dict):
+                texts.extend(v for k, v in value.items() if isinstance(v, str) and k not in ("birth_date", "birth_year"))
+            elif isinstance(value, str):
+                texts.append(value)
+        return [str(t) for t in texts if t]
+
+    def _memory_events(self, text: str, mentions: List[DateMention]) -> List[Dict[str, Any]]:
+        """回答中的每个带年代的句子是一个事件，提到迁徙的归为迁徙记录"""
+        events, seen = [], set()
+        for mention in mentions:
+            sentence = _sentence_at(text, mention.pos)
+            if sentence in seen:
+                continue
+            seen.add(sentence)
+            if _MIGRATION_RE.search(sentence):
+                events.append(_event(mention, "迁徙记录", sentence, "migration", self.dates))
+            else:
+                events.append(_event(mention, "家族记忆", sentence, "memory", self.dates))
+        return events
+
+    def _figure_event(self, figure: Dict[str, Any], family_name: str, mention: DateMention) -> Dict[str, Any]:
+        name = figure.get("name") or "历史人物"
+        description = (figure.get("achievements") or figure.get("story") or "")[:80]
+        title = f"{name}（{family_name}）" if family_name else name
+        return _event(mention, title, description, "person", self.dates, person=name, source=f"family:{family_name}")
+
+    def merge(self, events: List[Dict[str, Any]], extra: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """按 (日期, 标题) 去重合并，总数不超过 timeline_max_events"""
+        merged = list(events)
+        seen = {(e.get("date"), e.get("title")) for e in merged}
+        for event in extra:
+            key = (event.get("date"), event.get("title"))
+            if key in seen or len(merged) >= settings.timeline_max_events:
+                continue
+            seen.add(key)
+            merged.append(event)
+        return merged
+
+    def assess(self, events: List[Dict[str, Any]]) -> Tuple[float, List[Dict[str, Any]]]:
+        """覆盖率（已覆盖主题占比）和需要补充的空档：缺失的主题，以及相邻事件之间超过 timeline_gap_years 的年代空白"""
+        years = sorted(e["year"] for e in events if e.get("year") is not None)
+        types = {d.get("type") for e in events for d in e.get("details") or []}
+        covered = {
+            "origin": any(y < MODERN_YEAR for y in years),
+            "figure": "person" in types,
+            "migration": "migration" in types,
+            "modern": any(
+                e.get("year") is not None and e["year"] >= MODERN_YEAR
+                and (e.get("details") or [{}])[0].get("type") != "birth"
+                for e in events
+            ),
+        }
+        gaps: List[Dict[str, Any]] = [{"theme": key, "need": need} for key, need in TIMELINE_THEMES if not covered[key]]
+        chronology = get_chronology()
+        for a, b in zip(years, years[1:]):
+            if b - a > settings.timeline_gap_years:
+                names: List[str] = []
+                for y in range(a + 1, b, 20):
+                    dynasty = chronology.dynasty_at(y)
+                    if dynasty and dynasty.name not in names:
+                        names.append(dynasty.name)
+                gaps.append({"from": format_year(a), "to": format_year(b), "periods": "、".join(names[:4])})
+        missing = settings.timeline_min_events - len(events)
+        if missing > 0:
+            gaps.append({"theme": "count", "need": f"至少再补充 {missing} 个事件"})
+        return sum(covered.values()) / len(covered), gaps
+
+    def finalize(self, events: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """补齐年份和朝代纪年（LLM 补充的事件只有日期文本），按年份排序，未知年份放后"""
+        for event in events:
+            if "year" not in event or "period" not in event:
+                mention = self.dates.first(str(event.get("date") or ""))
+                event["year"] = mention.year if mention else None
+                event["period"] = self.dates.period(mention) if mention else None
+        return sorted(events, key=lambda e: 9999 if e["year"] is None else e["year"])
@@ -2,12 +2,13 @@
 API 密钥管理器（简化版）
 支持运行时手动输入和管理 API 密钥（仅 DeepSeek）
 """
-from typing import Optional
+from typing import List, Optional
 from app.config import settings
 from app.utils.logger import logger
 
 # 运行时密钥存储（内存中）
 _runtime_deepseek_key: Optional[str] = None
+_runtime_deepseek_keys: List[str] = []
 
 
 class APIKeyManager:
@@ -26,9 +27,35 @@ class APIKeyManager:
         global _runtime_deepseek_key
         return _runtime_deepseek_key or settings.deepseek_api_key
     
+    @staticmethod
+    def add_deepseek_key(api_key: str):
+        """向密钥池追加一个 DeepSeek API Key（运行时）"""
+        api_key = (api_key or "").strip()
+        if api_key and api_key not in _runtime_deepseek_keys:
+            _runtime_deepseek_keys.append(api_key)
+            logger.info(f"DeepSeek 密钥池已追加密钥（运行时），当前运行时密钥数: {len(_runtime_deepseek_keys)}")
+    
+    @staticmethod
+    def get_deepseek_keys() -> List[str]:
+        """
+        获取密钥池中的所有 DeepSeek API Key（去重、保持顺序）
+        来源：运行时设置的密钥、DEEPSEEK_API_KEYS（逗号分隔）、DEEPSEEK_API_KEY
+        """
+        keys: List[str] = []
+        candidates = [_runtime_deepseek_key, *_runtime_deepseek_keys]
+        if settings.deepseek_api_keys:
+            candidates.extend(settings.deepseek_api_keys.split(","))
+        candidates.append(settings.deepseek_api_key)
+        for key in candidates:
+            key = (key or "").strip()
+            if key and key not in keys:
+                keys.append(key)
+        return keys
+    
     @staticmethod
     def clear_runtime_keys():
         """清除所有运行时设置的密钥"""
         global _runtime_deepseek_key
         _runtime_deepseek_key = None
+        _runtime_deepseek_keys.clear()
         logger.info("已清除所有运行时密钥")
@@ -0,0 +1,159 @@
+"""
+API 密钥池
+在多个 DeepSeek 密钥之间做负载均衡：按响应头中的剩余额度选择密钥，
+对返回 429 / 认证错误的密钥进行冷却，并按密钥统计用量
+"""
+import time
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, List, Mapping, Optional
+
+from app.config import settings
+from app.utils.logger import logger
+
+
+@dataclass
+class KeyState:
+    """单个密钥的运行状态"""
+    key: str
+    remaining_requests: Optional[int] = None  # 来自 x-ratelimit-remaining-requests
+    remaining_tokens: Optional[int] = None  # 来自 x-ratelimit-remaining-tokens
+    cooldown_until: float = 0.0
+    in_flight: int = 0
+    requests: int = 0
+    errors: int = 0
+    rate_limited: int = 0
+    auth_errors: int = 0
+    last_used: float = 0.0
+
+    def headroom(self) -> float:
+        """剩余可用额度（未知时视为充足，只按并发数区分）"""
+        if self.remaining_requests is None:
+            return float("inf")
+        return self.remaining_requests - self.in_flight
+
+
+def mask_key(key: str) -> str:
+    """掩码密钥，只显示前8位和后4位（用于日志和统计）"""
+    if not key or len(key) < 12:
+        return "***"
+    return f"{key[:8]}...{key[-4:]}"
+
+
+def _parse_int(value: Any) -> Optional[int]:
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+class APIKeyPool:
+    """DeepSeek 密钥池"""
+
+    def __init__(self, rate_limit_cooldown: float = 30.0, auth_cooldown: float = 600.0):
+        self.rate_limit_cooldown = rate_limit_cooldown
+        self.auth_cooldown = auth_cooldown
+        self._states: Dict[str, KeyState] = {}
+        self._lock = threading.Lock()
+
+    def sync(self, keys: List[str]) -> None:
+        """同步密钥列表：新增的密钥加入池，已移除的密钥从池中删除（保留仍存在密钥的统计）"""
+        with self._lock:
+            wanted = [k for k in keys if k]
+            for key in wanted:
+                if key not in self._states:
+                    self._states[key] = KeyState(key=key)
+            for key in list(self._states.keys()):
+                if key not in wanted:
+                    del self._states[key]
+
+    def size(self) -> int:
+        with self._lock:
+            return len(self._states)
+
+    def acquire(self, exclude: Optional[str] = None) -> Optional[str]:
+        """
+        选择一个密钥并占用一个并发名额
+        优先选择未冷却、剩余额度最多、并发最少的密钥；全部冷却时选择最早恢复的密钥
+        """
+        now = time.monotonic()
+        with self._lock:
+            candidates = [s for s in self._states.values() if s.key != exclude] or list(self._states.values())
+            if not candidates:
+                return None
+            available = [s for s in candidates if s.cooldown_until <= now]
+            if available:
+                state = max(available, key=lambda s: (s.headroom(), -s.in_flight, -s.requests))
+            else:
+                state = min(candidates, key=lambda s: s.cooldown_until)
+            state.in_flight += 1
+            state.requests += 1
+            state.last_used = now
+            return state.key
+
+    def has_available(self, exclude: Optional[str] = None) -> bool:
+        """是否存在未冷却的其他密钥"""
+        now = time.monotonic()
+        with self._lock:
+            return any(s.cooldown_until <= now for s in self._states.values() if s.key != exclude)
+
+    def release(self, key: str, headers: Optional[Mapping[str, str]] = None, error: Optional[str] = None) -> None:
+        """
+        归还密钥并更新状态
+        headers: 响应头（读取剩余额度和 retry-after）
+        error: None / "rate_limit" / "auth" / "other"
+        """
+        with self._lock:
+            state = self._states.get(key)
+            if state is None:
+                return
+            state.in_flight = max(0, state.in_flight - 1)
+
+            if headers:
+                remaining_requests = _parse_int(headers.get("x-ratelimit-remaining-requests"))
+                if remaining_requests is not None:
+                    state.remaining_requests = remaining_requests
+                remaining_tokens = _parse_int(headers.get("x-ratelimit-remaining-tokens"))
+                if remaining_tokens is not None:
+                    state.remaining_tokens = remaining_tokens
+
+            if error is None:
+                return
+
+            state.errors += 1
+            if error == "rate_limit":
+                state.rate_limited += 1
+                retry_after = _parse_int(headers.get("retry-after")) if headers else None
+                cooldown = retry_after if retry_after else self.rate_limit_cooldown
+                state.cooldown_until = time.monotonic() + cooldown
+                logger.warning(f"DeepSeek 密钥 {mask_key(key)} 触发限流，冷却 {cooldown}s")
+            elif error == "auth":
+                state.auth_errors += 1
+                state.cooldown_until = time.monotonic() + self.auth_cooldown
+                logger.error(f"DeepSeek 密钥 {mask_key(key)} 认证失败，冷却 {self.auth_cooldown}s")
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """按密钥导出用量统计（密钥已掩码）"""
+        now = time.monotonic()
+        with self._lock:
+            return [
+                {
+                    "key": mask_key(s.key),
+                    "requests": s.requests,
+                    "errors": s.errors,
+                    "rate_limited": s.rate_limited,
+                    "auth_errors": s.auth_errors,
+                    "in_flight": s.in_flight,
+                    "remaining_requests": s.remaining_requests,
+                    "remaining_tokens": s.remaining_tokens,
+                    "cooling_down": s.cooldown_until > now,
+                }
+                for s in self._states.values()
+            ]
+
+
+# 全局 DeepSeek 密钥池
+deepseek_key_pool = APIKeyPool(
+    rate_limit_cooldown=settings.llm_key_rate_limit_cooldown,
+    auth_cooldown=settings.llm_key_auth_cooldown,
+)
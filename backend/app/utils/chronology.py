@@ -0,0 +1,156 @@
+"""
+朝代与年号区间索引
+加载 app/data/chronology 下的朝代表和年号表，支持两个方向的查询：
+名称 -> 公历区间（字典，O(1)），年份 -> 所在朝代 / 年号（按区间端点切分成互不重叠的小段，二分查找，O(log n)）
+"""
+import os
+from bisect import bisect_right
+from dataclasses import dataclass
+from datetime import date
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+
+CHRONOLOGY_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "chronology")
+
+ERA = "年号"
+# 按年份反查朝代时的类型优先级（见 dynasties.txt 说明）
+_KIND_RANK = {"分期": 0, "朝代": 1, "时期": 2, "政权": 3}
+_CN_NUMERALS = "〇一二三四五六七八九"
+
+
+@dataclass(frozen=True)
+class Period:
+    """一个朝代 / 时期 / 年号及其公历区间 [start, end]（公元前为负数）"""
+    name: str
+    start: int
+    end: int
+    kind: str
+    dynasty: str = ""
+    aliases: Tuple[str, ...] = ()
+
+    @property
+    def label(self) -> str:
+        """年号带上所属朝代，如“清·乾隆”"""
+        return f"{self.dynasty}·{self.name}" if self.kind == ERA and self.dynasty else self.name
+
+
+def cn_numeral(n: int) -> str:
+    """年号纪年的中文写法：1 -> 元，2 -> 二，30 -> 三十，38 -> 三十八"""
+    if n == 1:
+        return "元"
+    if n < 10:
+        return _CN_NUMERALS[n]
+    tens, ones = divmod(n, 10)
+    return ("" if tens == 1 else _CN_NUMERALS[tens]) + "十" + (_CN_NUMERALS[ones] if ones else "")
+
+
+def _load_table(path: str) -> List[List[str]]:
+    rows = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                rows.append(line.split())
+    return rows
+
+
+class ChronologyIndex:
+    """朝代与年号区间索引"""
+
+    def __init__(self, periods: Iterable[Period]):
+        self.periods: Tuple[Period, ...] = tuple(periods)
+        order = {p: i for i, p in enumerate(self.periods)}
+        # 名称 / 别名 -> 同名的全部区间（按数据顺序，第一个为默认）
+        self.dynasties: Dict[str, List[Period]] = {}
+        self.eras: Dict[str, List[Period]] = {}
+        for p in self.periods:
+            table = self.eras if p.kind == ERA else self.dynasties
+            for name in (p.name, *p.aliases):
+                table.setdefault(name, []).append(p)
+
+        dynasty_rank = {name: _KIND_RANK.get(ps[0].kind, len(_KIND_RANK)) for name, ps in self.dynasties.items()}
+
+        def rank(p: Period) -> tuple:
+            if p.kind == ERA:
+                # 并立政权的年号排在正统朝代之后；改元当年取新年号
+                return (dynasty_rank.get(p.dynasty, len(_KIND_RANK)), -p.start, order[p])
+            return (_KIND_RANK.get(p.kind, len(_KIND_RANK)), p.end - p.start, order[p])
+
+        # 把所有区间端点排序，相邻端点之间的小段被同一组区间覆盖，预先算好每段的覆盖集合
+        starts: Dict[int, List[Period]] = {}
+        stops: Dict[int, List[Period]] = {}
+        for p in self.periods:
+            starts.setdefault(p.start, []).append(p)
+            stops.setdefault(p.end + 1, []).append(p)
+        self._bounds: List[int] = sorted(set(starts) | set(stops))
+        self._segments: List[Tuple[Tuple[Period, ...], Tuple[Period, ...]]] = []
+        active = set()
+        for bound in self._bounds:
+            active.difference_update(stops.get(bound, ()))
+            active.update(starts.get(bound, ()))
+            covering = sorted(active, key=rank)
+            self._segments.append((
+                tuple(p for p in covering if p.kind != ERA),
+                tuple(p for p in covering if p.kind == ERA),
+            ))
+
+    @classmethod
+    def from_directory(cls, path: str = CHRONOLOGY_DIR) -> "ChronologyIndex":
+        periods = []
+        for row in _load_table(os.path.join(path, "dynasties.txt")):
+            # 结束年为 - 表示至今
+            end = date.today().year if row[2] == "-" else int(row[2])
+            aliases = tuple(row[4].split(",")) if len(row) > 4 else ()
+            periods.append(Period(row[0], int(row[1]), end, row[3], aliases=aliases))
+        for row in _load_table(os.path.join(path, "eras.txt")):
+            periods.append(Period(row[0], int(row[2]), int(row[3]), ERA, dynasty=row[1]))
+        return cls(periods)
+
+    # ---- 名称 -> 区间 ----
+
+    def dynasty(self, name: str) -> Optional[Period]:
+        found = self.dynasties.get(name)
+        return found[0] if found else None
+
+    def era(self, name: str) -> Optional[Period]:
+        found = self.eras.get(name)
+        return found[0] if found else None
+
+    def era_year(self, name: str, n: int) -> Optional[int]:
+        """年号第 n 年对应的公历年份；n 超出年号实际年数时返回 None"""
+        era = self.era(name)
+        if not era or n < 1 or era.start + n - 1 > era.end:
+            return None
+        return era.start + n - 1
+
+    # ---- 年份 -> 区间 ----
+
+    def _segment(self, year: int) -> Tuple[Tuple[Period, ...], Tuple[Period, ...]]:
+        i = bisect_right(self._bounds, year) - 1
+        return self._segments[i] if i >= 0 else ((), ())
+
+    def dynasties_at(self, year: int) -> Tuple[Period, ...]:
+        """覆盖该年份的全部朝代 / 时期 / 政权，按优先级排序"""
+        return self._segment(year)[0]
+
+    def dynasty_at(self, year: int) -> Optional[Period]:
+        found = self._segment(year)[0]
+        return found[0] if found else None
+
+    def era_at(self, year: int) -> Optional[Period]:
+        found = self._segment(year)[1]
+        return found[0] if found else None
+
+    def describe(self, year: int) -> Optional[str]:
+        """年份的朝代纪年写法，如 1765 -> “清·乾隆三十年”，无年号时只写朝代；不在表内时返回 None"""
+        era = self.era_at(year)
+        if era:
+            return f"{era.label}{cn_numeral(year - era.start + 1)}年"
+        dynasty = self.dynasty_at(year)
+        return dynasty.name if dynasty else None
+
+
+@lru_cache(maxsize=1)
+def get_chronology() -> ChronologyIndex:
+    """共享的索引（第一次使用时加载 app/data/chronology 下的数据）"""
+    return ChronologyIndex.from_directory()
@@ -0,0 +1,277 @@
+"""
+年代提取
+把公历年份、年号纪年（如“乾隆三十年”“民国三十八年”）、朝代/时期（如“唐朝”“明末”“北宋”“明清时期”）、
+世纪和年代（如“19世纪”“1830s”“20世纪80年代”）编译成一个正则，对文本只扫描一遍；
+朝代表和年号表放在 app/data/chronology 下，第一次使用时加载并编译
+"""
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from itertools import accumulate
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from app.utils.chronology import CHRONOLOGY_DIR, ChronologyIndex, get_chronology
+
+# 单字朝代名只有带这些后缀时才算朝代（避免“明年”“元年”“清明”等误判）
+_DYNASTY_SUFFIX = "朝|代|时期"
+# 朝代限定词：初 / 中 / 末，对应跨度的前 1/4、中间一半、后 1/4
+_QUALIFIER = "初年|初期|初|中后期|中期|中叶|末年|末期|末"
+# 这些单字朝代名与常用词冲突（如“周末”），不能只跟限定词
+_QUALIFIER_BLOCKED = set("周新陈梁吴魏蜀")
+# 与族谱常用说法冲突的名称（“五代同堂”“往上数五代”“春秋两祭”），只在带“时期”或初 / 中 / 末时匹配
+_QUALIFIED_ONLY = {"春秋", "五代"}
+# 只在写作“X朝”时匹配的单字朝代名（“新时期”“新时代”不是新朝）
+_CHAO_ONLY = set("新")
+# 两个朝代连写（明清、宋元）后面必须跟这些词，避免“汉明帝”“唐明皇”之类的误判
+_PAIR_SUFFIX = "时期|两代|两朝|之际|之交|之间|年间|以来|朝|代"
+
+_CN_DIGITS = {"〇": 0, "零": 0, "一": 1, "二": 2, "两": 2, "三": 3, "四": 4, "五": 5, "六": 6, "七": 7, "八": 8, "九": 9}
+_NUMERAL = r"[元\d〇零一二两三四五六七八九十廿卅]{1,4}"
+# 公历年份后面跟这些字时是数量而不是年份（如“1200余人”）
+_NOT_YEAR_AFTER = r"余多万千亿人元米户名个位次号页字斤里%％"
+
+_RESOLVED_CACHE_SIZE = 4096
+_MISSING = object()
+
+
+@dataclass(frozen=True)
+class DateMention:
+    """一次命中：类型（year / era / dynasty / century / decade）、原文、在文本中的位置和对应的公历年份区间 [start, end]"""
+    kind: str
+    text: str
+    pos: int
+    start: int
+    end: int
+    label: str = ""
+
+    @property
+    def year(self) -> int:
+        """代表年份：精确到年时就是该年，否则取区间中点"""
+        return (self.start + self.end) // 2
+
+
+def parse_numeral(text: str) -> Optional[int]:
+    """解析年号纪年里的数字：元、阿拉伯数字或一到九十九的中文数字"""
+    if text == "元":
+        return 1
+    if text.isdigit():
+        return int(text)
+    text = text.replace("廿", "二十").replace("卅", "三十")
+    if "十" in text:
+        tens, _, ones = text.partition("十")
+        if len(tens) > 1 or len(ones) > 1:
+            return None
+        value = (_CN_DIGITS.get(tens) if tens else 1), (_CN_DIGITS.get(ones) if ones else 0)
+        return None if None in value else value[0] * 10 + value[1]
+    if len(text) == 1:
+        return _CN_DIGITS.get(text)
+    return None
+
+
+def format_year(year: int) -> str:
+    """公元前年份写成“公元前N”"""
+    return f"公元前{-year}" if year < 0 else str(year)
+
+
+def _trie_regex(words: Iterable[str]) -> str:
+    """把一组词编译成前缀树形式的正则：每个位置只比较一次首字，而不是逐个尝试上百个分支"""
+    trie: Dict[str, dict] = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def emit(node: dict) -> str:
+        optional = "" in node
+        branches = [re.escape(ch) + emit(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        if optional:
+            return f"(?:{body})?" if len(branches) > 1 or len(body) > 1 else f"{body}?"
+        return body
+
+    return emit(trie)
+
+
+def _qualify(start: int, end: int, qualifier: Optional[str]) -> Tuple[int, int]:
+    """按“初 / 中 / 末”收窄朝代区间"""
+    if not qualifier:
+        return start, end
+    quarter = max((end - start) // 4, 1)
+    if qualifier.startswith("初"):
+        return start, min(start + quarter, end)
+    if qualifier.startswith("末"):
+        return max(end - quarter, start), end
+    if qualifier == "中后期":
+        return start + (end - start) // 2, max(end - quarter, start)
+    return start + quarter, max(end - quarter, start)
+
+
+class DateExtractor:
+    """预编译的年代提取器"""
+
+    def __init__(self, chronology: ChronologyIndex):
+        self.chronology = chronology
+        self._resolved: Dict[Tuple[str, str], Optional[tuple]] = {}
+        # 名称 / 别名 -> (规范名, 起, 止)；同名取索引中的默认项
+        self.dynasties: Dict[str, Tuple[str, int, int]] = {
+            key: (ps[0].name, ps[0].start, ps[0].end) for key, ps in chronology.dynasties.items()
+        }
+        # 年号 -> (朝代, 起, 止)
+        self.eras: Dict[str, Tuple[str, int, int]] = {
+            key: (ps[0].dynasty, ps[0].start, ps[0].end) for key, ps in chronology.eras.items()
+        }
+
+        multi = [k for k in self.dynasties if len(k) > 1 and k not in _QUALIFIED_ONLY]
+        qualified_only = [k for k in self.dynasties if k in _QUALIFIED_ONLY]
+        single = [k for k in self.dynasties if len(k) == 1 and k not in _CHAO_ONLY]
+        single_q = [k for k in single if k not in _QUALIFIER_BLOCKED]
+        chao_only = [k for k in self.dynasties if k in _CHAO_ONLY]
+        paired = [k for k in self.dynasties if k not in _QUALIFIED_ONLY and k not in _CHAO_ONLY]
+        # 每个分支外面包一层命名分组，匹配后按 lastgroup 直接分派，不必逐个检查分组
+        branches = {
+            # 年号纪年 / 年号年间：乾隆三十年、光绪元年、康熙年间
+            "era": rf"(?P<era_name>{_trie_regex(self.eras)})(?:(?P<era_n>{_NUMERAL})年|年间|时期|朝)",
+            # 世纪（可带年代）：19世纪、十九世纪末、20世纪80年代、公元前3世纪、19th century
+            "century": rf"(?P<c_bc>公元前)?(?P<c_n>\d{{1,2}}|[一二三四五六七八九十]{{1,3}})世纪"
+                       rf"(?:(?P<c_dec>\d0|[一二三四五六七八九]十)年代|(?P<c_q>{_QUALIFIER}|上半叶|下半叶))?",
+            "en_century": r"(?i:(?P<ec_n>\d{1,2})(?:st|nd|rd|th)\s*century)",
+            # 年代：1830s、1980年代
+            "decade": r"(?<!\d)(?P<dec>1\d{2}|20\d)0(?:s|年代)",
+            # 两个朝代连写：明清时期、宋元之际、隋唐两代，取两者合起来的跨度
+            "dynasty_pair": rf"(?P<dp_a>{_trie_regex(paired)})(?P<dp_b>{_trie_regex(paired)})(?:{_PAIR_SUFFIX})",
+            # 朝代 / 时期：北宋、东汉末年、唐朝、明末、清中叶
+            "dynasty": rf"(?P<dyn>{_trie_regex(multi)})(?:{_DYNASTY_SUFFIX})?(?P<dyn_q>{_QUALIFIER})?"
+                       rf"|(?P<dyn1>[{''.join(single)}])(?:{_DYNASTY_SUFFIX})(?P<dyn1_q>{_QUALIFIER})?"
+                       rf"|(?P<dyn2>[{''.join(single_q)}])(?P<dyn2_q>{_QUALIFIER})"
+                       rf"|(?P<dyn3>{_trie_regex(qualified_only)})(?=时期|{_QUALIFIER})(?:时期)?(?P<dyn3_q>{_QUALIFIER})?"
+                       rf"|(?P<dyn4>[{''.join(chao_only)}])朝(?P<dyn4_q>{_QUALIFIER})?",
+            # 公历：公元前221年、前221年、公元618年、1765年、1990-05-01
+            "bc": r"公元前(?P<bc1>\d{1,4})年?|(?<![之以年])前(?P<bc2>\d{1,4})年",
+            "ad": rf"公元(?P<ad_n>\d{{1,4}})年?|(?<![\d.])(?P<y>1\d{{3}}|20\d{{2}})(?![\d{_NOT_YEAR_AFTER}])",
+        }
+        # 所有分支可能的首字：先用前瞻排除不可能的起点，省去在每个位置逐个尝试分支
+        first_chars = {k[0] for k in (*self.eras, *self.dynasties)} | set("0123456789一二三四五六七八九十公前")
+        self.pattern = re.compile(
+            f"(?=[{re.escape(''.join(sorted(first_chars)))}])(?:"
+            + "|".join(f"(?P<{name}>{rx})" for name, rx in branches.items())
+            + ")"
+        )
+
+    @classmethod
+    def from_directory(cls, path: str = CHRONOLOGY_DIR) -> "DateExtractor":
+        return cls(ChronologyIndex.from_directory(path))
+
+    def _mention(self, m: "re.Match", offset: int = 0) -> Optional[DateMention]:
+        # 命中的原文和分支唯一确定结果，同一说法在语料中反复出现时只解析一次
+        key = (m.lastgroup, m.group(0))
+        resolved = self._resolved.get(key, _MISSING)
+        if resolved is _MISSING:
+            if len(self._resolved) >= _RESOLVED_CACHE_SIZE:
+                self._resolved.clear()
+            resolved = self._resolved[key] = self._resolve(m)
+        return DateMention(resolved[0], key[1], m.start() - offset, *resolved[1:]) if resolved else None
+
+    def _resolve(self, m: "re.Match") -> Optional[tuple]:
+        """(类型, 起, 止[, 标签])"""
+        branch, g = m.lastgroup, m.group
+        if branch == "ad":
+            year = int(g("ad_n") or g("y"))
+            return ("year", year, year) if year else None
+        if branch == "dynasty":
+            group = next(name for name in ("dyn", "dyn1", "dyn2", "dyn3", "dyn4") if g(name))
+            key, q = g(group), g(group + "_q")
+            name, start, end = self.dynasties[key]
+            return ("dynasty", *_qualify(start, end, q), name)
+        if branch == "dynasty_pair":
+            (name_a, start_a, end_a), (name_b, start_b, end_b) = self.dynasties[g("dp_a")], self.dynasties[g("dp_b")]
+            # 只接受按先后顺序连写的（“清明”不是清到明）
+            if start_b <= start_a or end_b <= end_a:
+                return None
+            return ("dynasty", start_a, end_b, name_a + name_b)
+        if branch == "era":
+            era = self.chronology.era(g("era_name"))
+            if g("era_n"):
+                # 超出年号实际年数的（多为识别错误）只保留年号区间
+                year = self.chronology.era_year(era.name, parse_numeral(g("era_n")) or 0)
+                if year is not None:
+                    return ("year", year, year, era.label)
+            return ("era", era.start, era.end, era.label)
+        if branch == "decade":
+            start = int(g("dec")) * 10
+            return ("decade", start, start + 9)
+        if branch == "bc":
+            year = -int(g("bc1") or g("bc2"))
+            return ("year", year, year)
+        n = int(g("ec_n")) if branch == "en_century" else parse_numeral(g("c_n"))
+        if not n:
+            return None
+        if branch == "en_century":
+            return ("century", (n - 1) * 100, n * 100 - 1)
+        if g("c_bc"):
+            return ("century", -n * 100, -(n - 1) * 100 - 1)
+        start, end = (n - 1) * 100, n * 100 - 1
+        if g("c_dec"):
+            decade = parse_numeral(g("c_dec"))
+            return ("decade", start + decade, start + decade + 9)
+        q = g("c_q")
+        if q in ("上半叶", "下半叶"):
+            return ("century", *((start, start + 49) if q == "上半叶" else (start + 50, end)))
+        return ("century", *_qualify(start, end, q))
+
+    def finditer(self, text: str) -> Iterator[DateMention]:
+        """按出现顺序产出文本中的所有年代"""
+        for m in self.pattern.finditer(text or ""):
+            mention = self._mention(m)
+            if mention:
+                yield mention
+
+    def extract(self, text: str) -> List[DateMention]:
+        return list(self.finditer(text))
+
+    def extract_batch(self, texts: Sequence[str]) -> List[List[DateMention]]:
+        """把一批文本（如一个会话的全部搜索摘要）拼成一个语料只扫描一遍，按原文本拆分结果"""
+        texts = [text or "" for text in texts]
+        results: List[List[DateMention]] = [[] for _ in texts]
+        # 第 i 段文本的结束位置；命中按位置递增，只需顺序推进当前段
+        ends = list(accumulate(len(text) + 1 for text in texts))
+        index, offset = 0, 0
+        mention = self._mention
+        # \x00 不会被任何模式匹配，命中不会跨越两段文本
+        for m in self.pattern.finditer("\x00".join(texts)):
+            start = m.start()
+            if start >= ends[index]:
+                while start >= ends[index]:
+                    index += 1
+                offset = ends[index - 1]
+            found = mention(m, offset)
+            if found:
+                results[index].append(found)
+        return results
+
+    def first(self, text: str, kinds: Optional[Iterable[str]] = None) -> Optional[DateMention]:
+        """第一个（指定类型的）年代"""
+        kinds = set(kinds) if kinds else None
+        for mention in self.finditer(text):
+            if kinds is None or mention.kind in kinds:
+                return mention
+        return None
+
+    def period(self, mention: DateMention) -> Optional[str]:
+        """命中对应的朝代纪年：精确到年时如“清·乾隆三十年”，否则为朝代或年号名"""
+        if mention.start == mention.end:
+            return self.chronology.describe(mention.start)
+        return mention.label or None
+
+    def first_year(self, text: str) -> Optional[int]:
+        """第一个年代的代表年份"""
+        mention = self.first(str(text or ""))
+        return mention.year if mention else None
+
+
+@lru_cache(maxsize=1)
+def get_date_extractor() -> DateExtractor:
+    """共享的提取器（与 get_chronology() 共用同一份朝代和年号索引）"""
+    return DateExtractor(get_chronology())
@@ -0,0 +1,53 @@
+"""
+请求截止时间（deadline budget）
+在一次请求内通过 contextvars 传递剩余时间预算，嵌套调用只会收紧、不会放宽
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+# 当前请求的截止时间（time.monotonic() 绝对值），None 表示不限制
+_deadline: ContextVar[Optional[float]] = ContextVar("request_deadline", default=None)
+
+
+class DeadlineExceeded(TimeoutError):
+    """请求的时间预算已经用完"""
+
+
+def get_deadline() -> Optional[float]:
+    """当前截止时间（monotonic 绝对值）"""
+    return _deadline.get()
+
+
+def remaining() -> Optional[float]:
+    """剩余时间预算（秒），没有设置截止时间时返回 None"""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def check(stage: str = "") -> None:
+    """预算已耗尽时抛出 DeadlineExceeded"""
+    left = remaining()
+    if left is not None and left <= 0:
+        raise DeadlineExceeded(f"请求时间预算已用完{f'（{stage}）' if stage else ''}")
+
+
+@contextmanager
+def deadline_scope(seconds: Optional[float]) -> Iterator[Optional[float]]:
+    """
+    在代码块内设置时间预算
+    如果外层已有更早的截止时间，则保留外层的（只收紧不放宽）
+    """
+    current = _deadline.get()
+    new_deadline = current
+    if seconds is not None:
+        candidate = time.monotonic() + seconds
+        new_deadline = candidate if current is None else min(current, candidate)
+    token = _deadline.set(new_deadline)
+    try:
+        yield new_deadline
+    finally:
+        _deadline.reset(token)
@@ -0,0 +1,13 @@
+"""
+输入指纹
+对任意 JSON 结构计算稳定的摘要（键排序、不依赖字典插入顺序），用于判断报告输入是否变化
+"""
+import hashlib
+import json
+from typing import Any
+
+
+def fingerprint(*parts: Any) -> str:
+    """返回 parts 的 SHA-256 摘要（前 32 位十六进制）"""
+    raw = json.dumps(parts, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
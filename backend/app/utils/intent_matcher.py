@@ -0,0 +1,147 @@
+"""
+回答意图匹配
+把各意图（结束对话、跳过等）的关键词编译成一个 Aho-Corasick 自动机，
+对回答只扫描一遍就能得到命中的意图、关键词和位置；关键词词典放在 app/data/intents/<意图>.txt
+容易误伤的关键词可以加锚点：^ 要求位于分句开头，$ 要求位于分句末尾（后面只能跟语气词）
+"""
+import os
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+INTENTS_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "intents")
+
+# 分句边界：标点和空白
+_CLAUSE_BREAKS = frozenset("，。！？、；：…～,.!?;:~ \t\n")
+# 分句末尾可以跟在关键词后面的语气词（“就到这里吧”“先这样啦”）
+_TRAILING_PARTICLES = frozenset("吧啦了啊呀哈喔嘞咯哦嘛呢里儿")
+
+
+@dataclass(frozen=True)
+class IntentMatch:
+    """一次命中：意图、关键词和在（小写化后的）文本中的位置 [start, end)"""
+    intent: str
+    keyword: str
+    start: int
+    end: int
+
+
+def _is_word_char(ch: str) -> bool:
+    return ch.isascii() and (ch.isalnum() or ch == "_")
+
+
+def _at_clause_start(text: str, pos: int) -> bool:
+    return pos == 0 or text[pos - 1] in _CLAUSE_BREAKS
+
+
+def _at_clause_end(text: str, pos: int) -> bool:
+    while pos < len(text) and text[pos] in _TRAILING_PARTICLES:
+        pos += 1
+    return pos == len(text) or text[pos] in _CLAUSE_BREAKS
+
+
+class IntentMatcher:
+    """多意图 Aho-Corasick 关键词匹配器（匹配前统一转小写）"""
+
+    def __init__(self, dictionaries: Dict[str, Iterable[str]]):
+        # 状态 0 为根；_goto[state][ch] -> state
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        # 每个状态结束的 (意图, 关键词, 要求分句开头, 要求分句末尾)，含沿失败链继承的输出
+        self._out: List[List[Tuple[str, str, bool, bool]]] = [[]]
+        self.intents = tuple(dictionaries)
+        for intent, keywords in dictionaries.items():
+            for keyword in keywords:
+                keyword = keyword.strip().lower()
+                if keyword:
+                    self._add(intent, keyword)
+        self._build()
+
+    @classmethod
+    def from_directory(cls, path: str = INTENTS_DIR) -> "IntentMatcher":
+        """从目录加载词典：每个 .txt 文件是一个意图，每行一个关键词（可带 ^ / $ 锚点），# 开头为注释"""
+        dictionaries: Dict[str, List[str]] = {}
+        for name in sorted(os.listdir(path)):
+            if not name.endswith(".txt"):
+                continue
+            with open(os.path.join(path, name), encoding="utf-8") as f:
+                dictionaries[name[:-4]] = [
+                    line.strip() for line in f if line.strip() and not line.lstrip().startswith("#")
+                ]
+        return cls(dictionaries)
+
+    def _add(self, intent: str, keyword: str) -> None:
+        head, tail = keyword.startswith("^"), keyword.endswith("$")
+        keyword = keyword[1 if head else 0:len(keyword) - 1 if tail else None]
+        if not keyword:
+            return
+        state = 0
+        for ch in keyword:
+            nxt = self._goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            state = nxt
+        self._out[state].append((intent, keyword, head, tail))
+
+    def _build(self) -> None:
+        """按 BFS 计算失败链接"""
+        queue = list(self._goto[0].values())
+        head = 0
+        while head < len(queue):
+            state = queue[head]
+            head += 1
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fail = self._fail[state]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                target = self._goto[fail].get(ch, 0)
+                self._fail[nxt] = target if target != nxt else 0
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def finditer(self, text: str) -> Iterator[IntentMatch]:
+        """按结束位置顺序产出所有命中（纯英文关键词只在整词边界处命中，带锚点的关键词只在分句边界处命中）"""
+        text = (text or "").lower()
+        goto, fail, out = self._goto, self._fail, self._out
+        state = 0
+        for i, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            for intent, keyword, head, tail in out[state]:
+                start = i + 1 - len(keyword)
+                if (head and not _at_clause_start(text, start)) or (tail and not _at_clause_end(text, i + 1)):
+                    continue
+                if keyword.isascii() and (
+                    (start > 0 and _is_word_char(text[start - 1]) and _is_word_char(keyword[0]))
+                    or (i + 1 < len(text) and _is_word_char(text[i + 1]) and _is_word_char(keyword[-1]))
+                ):
+                    continue
+                yield IntentMatch(intent, keyword, start, i + 1)
+
+    def detect(self, text: str) -> Dict[str, IntentMatch]:
+        """一次扫描，返回每个命中意图的第一个命中"""
+        found: Dict[str, IntentMatch] = {}
+        for match in self.finditer(text):
+            if match.intent not in found:
+                found[match.intent] = match
+                if len(found) == len(self.intents):
+                    break
+        return found
+
+    def match(self, text: str, intent: str) -> Optional[IntentMatch]:
+        """指定意图的第一个命中"""
+        for m in self.finditer(text):
+            if m.intent == intent:
+                return m
+        return None
+
+
+@lru_cache(maxsize=1)
+def get_intent_matcher() -> IntentMatcher:
+    """共享的匹配器（第一次使用时加载 app/data/intents 下的词典）"""
+    return IntentMatcher.from_directory()
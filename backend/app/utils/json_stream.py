@@ -0,0 +1,67 @@
+"""
+增量 JSON 数组解析
+LLM 以流式返回 ["问题1", "问题2", ...] 时，每收到一段文本就喂给解析器，
+数组中的字符串元素一完整就立即产出，调用方拿到第一个可用元素后即可停止生成
+"""
+import json
+from typing import List
+
+
+class JSONStringArrayParser:
+    """
+    流式解析顶层 JSON 数组中的字符串元素
+    - 忽略 "[" 之前的任何内容（如 ```json 代码块标记或说明文字）
+    - 非字符串元素（数字、对象、嵌套数组）被跳过
+    - 遇到顶层 "]" 后 done 为 True，之后的内容全部忽略
+    """
+
+    def __init__(self):
+        self.done = False
+        self._started = False
+        self._in_string = False
+        self._escape = False
+        self._depth = 0  # 顶层数组内嵌套的 [] / {} 层数（跳过非字符串元素用）
+        self._buf: List[str] = []
+
+    def feed(self, text: str) -> List[str]:
+        """输入一段文本，返回这段文本中新完成的字符串元素"""
+        out: List[str] = []
+        for ch in text:
+            if self.done:
+                break
+            if not self._started:
+                if ch == "[":
+                    self._started = True
+                continue
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                    self._buf.append(ch)
+                elif ch == "\\":
+                    self._escape = True
+                    self._buf.append(ch)
+                elif ch == '"':
+                    self._in_string = False
+                    raw = "".join(self._buf)
+                    self._buf = []
+                    if self._depth == 0:
+                        try:
+                            out.append(json.loads(f'"{raw}"'))
+                        except ValueError:
+                            # 转义不合法时按原文返回
+                            out.append(raw)
+                else:
+                    self._buf.append(ch)
+                continue
+
+            if ch == '"':
+                self._in_string = True
+            elif ch in "[{":
+                self._depth += 1
+            elif ch in "]}":
+                if self._depth == 0:
+                    self.done = True
+                else:
+                    self._depth -= 1
+        return out
@@ -0,0 +1,62 @@
+"""
+调用延迟统计
+按调用点（call site）记录最近的调用耗时，用于计算分位数
+"""
+import threading
+from collections import deque
+from typing import Deque, Dict, Optional
+
+
+class LatencyTracker:
+    """按调用点保存最近 N 次耗时的滑动窗口"""
+
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        self.window = window
+        self.min_samples = min_samples
+        self._samples: Dict[str, Deque[float]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, call_site: str, seconds: float) -> None:
+        """记录一次调用耗时（秒）"""
+        with self._lock:
+            samples = self._samples.get(call_site)
+            if samples is None:
+                samples = deque(maxlen=self.window)
+                self._samples[call_site] = samples
+            samples.append(seconds)
+
+    def count(self, call_site: str) -> int:
+        """调用点当前的样本数"""
+        with self._lock:
+            return len(self._samples.get(call_site, ()))
+
+    def percentile(self, call_site: str, q: float) -> Optional[float]:
+        """
+        计算分位数（q 取 0-1）
+        样本不足 min_samples 时返回 None，调用方应使用默认值
+        """
+        with self._lock:
+            samples = self._samples.get(call_site)
+            if not samples or len(samples) < self.min_samples:
+                return None
+            ordered = sorted(samples)
+        idx = min(len(ordered) - 1, max(0, int(round(q * (len(ordered) - 1)))))
+        return ordered[idx]
+
+    def snapshot(self) -> Dict[str, Dict[str, Optional[float]]]:
+        """导出各调用点的统计（用于健康检查接口）"""
+        with self._lock:
+            sites = list(self._samples.keys())
+        return {
+            site: {
+                "samples": self.count(site),
+                "p50": self.percentile(site, 0.5),
+                "p90": self.percentile(site, 0.9),
+                "p99": self.percentile(site, 0.99),
+            }
+            for site in sites
+        }
+
+
+# 全局实例（各服务共享同一份统计）
+latency_tracker = LatencyTracker()
@@ -0,0 +1,120 @@
+"""
+问题近似重复检测
+对问题文本取字符 n-gram（去掉标点和空白），用 MinHash 签名估计 Jaccard 相似度，
+同义称谓、地点说法先统一，换个说法的重复问题（如“你爸爸的老家在哪里？”与“你父亲的老家在哪儿呢？”）也能识别出来
+纯 Python 实现，签名按文本缓存，一个会话最多几十个已问问题，线性比较即可
+"""
+import re
+import zlib
+from functools import lru_cache
+from typing import Iterable, List, Optional, Tuple
+
+from app.config import settings
+
+
+NUM_PERM = 64
+NGRAM = 2
+_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+# 固定种子生成的 (a, b) 参数，保证不同进程的签名一致
+_PERMUTATIONS: List[Tuple[int, int]] = []
+_seed = 0x9E3779B97F4A7C15
+for _ in range(NUM_PERM):
+    _seed = (_seed * 6364136223846793005 + 1442695040888963407) & ((1 << 64) - 1)
+    _a = (_seed >> 3) % _PRIME or 1
+    _seed = (_seed * 6364136223846793005 + 1442695040888963407) & ((1 << 64) - 1)
+    _b = (_seed >> 3) % _PRIME
+    _PERMUTATIONS.append((_a, _b))
+
+# 标点、空白和常见语气词不参与比较
+_NOISE_RE = re.compile(r"[\s\W_]+|[吗呢吧啊呀哦嘛]", re.UNICODE)
+
+# 同义说法统一成一种写法（长词在前）
+_SYNONYMS = (
+    ("外祖父", "外公"), ("外祖母", "外婆"), ("祖父", "爷爷"), ("祖母", "奶奶"),
+    ("父亲", "爸爸"), ("老爸", "爸爸"), ("母亲", "妈妈"), ("老妈", "妈妈"),
+    ("什么地方", "哪里"), ("哪个地方", "哪里"), ("哪儿", "哪里"),
+    ("籍贯", "祖籍"), ("提起过", "提过"), ("提起", "提过"),
+)
+
+# 亲属称谓：两个问题问的是不同的亲属时（如爷爷 / 奶奶、本人 / 爸爸），即使措辞几乎相同也不算重复
+_KINSHIP_RE = re.compile(r"太爷爷|太奶奶|曾祖|爷爷|奶奶|外公|外婆|爸爸|妈妈|叔叔|伯伯|姑姑|舅舅")
+
+
+def normalize(text: str) -> str:
+    s = _NOISE_RE.sub("", (text or "").lower())
+    for old, new in _SYNONYMS:
+        s = s.replace(old, new)
+    return s
+
+
+def kinship_terms(text: str) -> frozenset:
+    return frozenset(_KINSHIP_RE.findall(normalize(text)))
+
+
+def shingles(text: str, n: int = NGRAM) -> frozenset:
+    """字符 n-gram 集合；文本短于 n 时整体作为一个元素"""
+    s = normalize(text)
+    if len(s) <= n:
+        return frozenset([s]) if s else frozenset()
+    return frozenset(s[i:i + n] for i in range(len(s) - n + 1))
+
+
+@lru_cache(maxsize=4096)
+def signature(text: str) -> Optional[Tuple[int, ...]]:
+    """MinHash 签名；文本没有可比较的内容时返回 None"""
+    grams = shingles(text)
+    if not grams:
+        return None
+    hashes = [zlib.crc32(g.encode("utf-8")) for g in grams]
+    return tuple(
+        min(((a * h + b) % _PRIME) & _MAX_HASH for h in hashes)
+        for a, b in _PERMUTATIONS
+    )
+
+
+def similarity(sig_a: Tuple[int, ...], sig_b: Tuple[int, ...]) -> float:
+    """两个签名估计的 Jaccard 相似度"""
+    return sum(1 for x, y in zip(sig_a, sig_b) if x == y) / NUM_PERM
+
+
+class NearDuplicateIndex:
+    """已问问题的相似度索引"""
+
+    def __init__(self, texts: Iterable[str] = (), threshold: Optional[float] = None):
+        self.threshold = settings.question_dedup_threshold if threshold is None else threshold
+        self._exact = set()
+        self._entries: List[Tuple[Tuple[int, ...], frozenset]] = []
+        for text in texts:
+            self.add(text)
+
+    def add(self, text: str) -> None:
+        text = (text or "").strip()
+        if not text:
+            return
+        self._exact.add(text)
+        sig = signature(text)
+        if sig is not None:
+            self._entries.append((sig, kinship_terms(text)))
+
+    def max_similarity(self, text: str) -> float:
+        """
+        与已有问题的最大估计相似度
+        只和问同一（组）亲属的问题比较：称谓不同，或一个问的是用户本人、另一个问的是某位亲属，都不参与比较
+        """
+        sig = signature((text or "").strip())
+        if sig is None:
+            return 0.0
+        kin = kinship_terms(text)
+        return max(
+            (similarity(sig, other) for other, other_kin in self._entries if kin == other_kin),
+            default=0.0,
+        )
+
+    def is_duplicate(self, text: str) -> bool:
+        """与某个已有问题完全相同，或估计相似度达到阈值"""
+        text = (text or "").strip()
+        if text in self._exact:
+            return True
+        return self.max_similarity(text) >= self.threshold
@@ -0,0 +1,91 @@
+"""
+JSON 序列化层
+Redis 会话状态、缓存、提示词中的结构化数据和 API 响应统一经过这里序列化：
+优先使用 orjson，其次 msgspec，都未安装时退回标准库 json（输出保持 UTF-8，不转义中文）
+"""
+import json
+from typing import Any, Union
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+msgspec = None
+if orjson is None:
+    try:
+        import msgspec
+    except ImportError:
+        msgspec = None
+
+
+def _default(obj: Any) -> Any:
+    """无法直接序列化的对象（ObjectId、集合等）：集合转列表，其余转字符串"""
+    if isinstance(obj, (set, frozenset, tuple)):
+        return list(obj)
+    return str(obj)
+
+
+if orjson is not None:
+    BACKEND = "orjson"
+    _OPTS = orjson.OPT_NON_STR_KEYS
+
+    def _dumps_bytes(obj: Any, indent: bool) -> bytes:
+        return orjson.dumps(obj, default=_default, option=_OPTS | (orjson.OPT_INDENT_2 if indent else 0))
+
+    def _loads(data: Union[str, bytes, bytearray]) -> Any:
+        return orjson.loads(data)
+
+elif msgspec is not None:
+    BACKEND = "msgspec"
+    _encoder = msgspec.json.Encoder(enc_hook=_default)
+
+    def _dumps_bytes(obj: Any, indent: bool) -> bytes:
+        raw = _encoder.encode(obj)
+        return msgspec.json.format(raw, indent=2) if indent else raw
+
+    def _loads(data: Union[str, bytes, bytearray]) -> Any:
+        try:
+            return msgspec.json.decode(data)
+        except msgspec.DecodeError as e:
+            # 与标准库保持一致，调用方只需捕获 ValueError / JSONDecodeError
+            raise json.JSONDecodeError(str(e), data if isinstance(data, str) else "", 0) from e
+
+else:
+    BACKEND = "json"
+
+    def _dumps_bytes(obj: Any, indent: bool) -> bytes:
+        return json.dumps(
+            obj,
+            ensure_ascii=False,
+            default=_default,
+            indent=2 if indent else None,
+            separators=None if indent else (",", ":"),
+        ).encode("utf-8")
+
+    def _loads(data: Union[str, bytes, bytearray]) -> Any:
+        return json.loads(data)
+
+
+def dumps_bytes(obj: Any, indent: bool = False) -> bytes:
+    """序列化为 UTF-8 字节（写 Redis / HTTP 响应体）"""
+    return _dumps_bytes(obj, indent)
+
+
+def dumps(obj: Any, indent: bool = False) -> str:
+    """序列化为字符串（提示词、日志），中文不转义"""
+    return _dumps_bytes(obj, indent).decode("utf-8")
+
+
+def loads(data: Union[str, bytes, bytearray]) -> Any:
+    """反序列化，格式错误时抛出 json.JSONDecodeError（ValueError 子类）"""
+    return _loads(data)
+
+
+class FastJSONResponse(JSONResponse):
+    """使用上面的序列化后端输出的 JSON 响应（作为应用默认响应类）"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps_bytes(content)
@@ -0,0 +1,151 @@
+"""
+Redis 会话状态编码
+session:{id} 中的问答状态默认用 msgpack 编码，超过阈值时再压缩（zstd / lz4 / zlib），
+并在开头写入带版本号的 4 字节头，便于以后迁移格式；没有头的旧数据按 JSON 读取
+
+头格式：b"RJ" + 版本号(1 字节) + 标志(1 字节，高 4 位为编码，低 4 位为压缩算法)
+"""
+import zlib
+from typing import Any, Dict, Optional, Tuple, Union
+
+from app.config import settings
+from app.utils import serialization
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:
+    lz4_frame = None
+
+
+MAGIC = b"RJ"
+FORMAT_VERSION = 1
+HEADER_SIZE = 4
+
+# 编码（标志高 4 位）
+ENCODINGS = {"json": 0, "msgpack": 1}
+# 压缩算法（标志低 4 位）
+COMPRESSIONS = {"none": 0, "zlib": 1, "zstd": 2, "lz4": 3}
+
+_ENCODING_NAMES = {v: k for k, v in ENCODINGS.items()}
+_COMPRESSION_NAMES = {v: k for k, v in COMPRESSIONS.items()}
+
+
+def _msgpack_default(obj: Any) -> Any:
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    return str(obj)
+
+
+class StateCodecError(ValueError):
+    """会话状态无法解码（格式版本未知或缺少对应的编码库）"""
+
+
+def available_encodings() -> Tuple[str, ...]:
+    return tuple(name for name in ENCODINGS if name != "msgpack" or msgpack is not None)
+
+
+def available_compressions() -> Tuple[str, ...]:
+    libs = {"none": True, "zlib": True, "zstd": zstandard is not None, "lz4": lz4_frame is not None}
+    return tuple(name for name, ok in libs.items() if ok)
+
+
+def _resolve_encoding(name: str) -> str:
+    """配置的编码不可用时退回 JSON"""
+    return name if name in available_encodings() else "json"
+
+
+def _resolve_compression(name: str) -> str:
+    """配置的压缩算法不可用时退回 zlib（标准库）"""
+    if name not in COMPRESSIONS:
+        return "none"
+    return name if name in available_compressions() else "zlib"
+
+
+def _compress(data: bytes, compression: str) -> bytes:
+    if compression == "zstd":
+        return zstandard.ZstdCompressor(level=3).compress(data)
+    if compression == "lz4":
+        return lz4_frame.compress(data)
+    if compression == "zlib":
+        return zlib.compress(data, 6)
+    return data
+
+
+def _decompress(data: bytes, compression: str) -> bytes:
+    if compression == "zstd":
+        if zstandard is None:
+            raise StateCodecError("zstandard is not installed")
+        return zstandard.ZstdDecompressor().decompress(data)
+    if compression == "lz4":
+        if lz4_frame is None:
+            raise StateCodecError("lz4 is not installed")
+        return lz4_frame.decompress(data)
+    if compression == "zlib":
+        return zlib.decompress(data)
+    return data
+
+
+def encode(
+    state: Dict[str, Any],
+    encoding: Optional[str] = None,
+    compression: Optional[str] = None,
+    threshold: Optional[int] = None,
+) -> bytes:
+    """
+    编码会话状态
+    encoding / compression / threshold 默认取配置；body 小于 threshold 字节时不压缩
+    encoding="json" 且不压缩时写入无头的 JSON，与旧格式完全兼容
+    """
+    encoding = _resolve_encoding(encoding or settings.session_state_encoding)
+    compression = _resolve_compression(compression or settings.session_state_compression)
+    threshold = settings.session_state_compress_threshold if threshold is None else threshold
+
+    if encoding == "msgpack":
+        body = msgpack.packb(state, use_bin_type=True, default=_msgpack_default)
+    else:
+        body = serialization.dumps_bytes(state)
+
+    if compression != "none" and len(body) >= threshold:
+        body = _compress(body, compression)
+    else:
+        compression = "none"
+
+    if encoding == "json" and compression == "none":
+        return body
+    flags = (ENCODINGS[encoding] << 4) | COMPRESSIONS[compression]
+    return MAGIC + bytes((FORMAT_VERSION, flags)) + body
+
+
+def decode(raw: Union[bytes, str]) -> Dict[str, Any]:
+    """解码会话状态（兼容无头的旧 JSON 数据）"""
+    if isinstance(raw, str):
+        return serialization.loads(raw)
+    if not raw.startswith(MAGIC):
+        return serialization.loads(raw)
+    if len(raw) < HEADER_SIZE:
+        raise StateCodecError("Truncated session state header")
+
+    version, flags = raw[2], raw[3]
+    if version != FORMAT_VERSION:
+        raise StateCodecError(f"Unsupported session state version: {version}")
+    encoding = _ENCODING_NAMES.get(flags >> 4)
+    compression = _COMPRESSION_NAMES.get(flags & 0x0F)
+    if encoding is None or compression is None:
+        raise StateCodecError(f"Unknown session state flags: {flags:#04x}")
+
+    body = _decompress(raw[HEADER_SIZE:], compression)
+    if encoding == "msgpack":
+        if msgpack is None:
+            raise StateCodecError("msgpack is not installed")
+        return msgpack.unpackb(body, raw=False, strict_map_key=False)
+    return serialization.loads(body)
@@ -0,0 +1,20 @@
+"""
+姓氏拆分
+从姓名中取姓：常见复姓（欧阳、司马、诸葛等）取前两个字，其余取首字
+"""
+
+# 常见复姓
+COMPOUND_SURNAMES = frozenset((
+    "欧阳", "司马", "上官", "诸葛", "东方", "皇甫", "尉迟", "公孙", "慕容", "长孙",
+    "宇文", "司徒", "司空", "夏侯", "轩辕", "令狐", "钟离", "独孤", "南宫", "西门",
+    "澹台", "公冶", "宗政", "濮阳", "淳于", "单于", "太叔", "申屠", "闻人", "赫连",
+    "万俟", "端木", "百里", "东郭", "呼延", "拓跋", "即墨", "第五", "左丘", "公羊",
+))
+
+
+def surname_of(name: str) -> str:
+    """姓名中的姓氏；姓名为空时返回空字符串"""
+    name = (name or "").strip()
+    if name[:2] in COMPOUND_SURNAMES:
+        return name[:2]
+    return name[:1]
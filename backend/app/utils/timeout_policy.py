@@ -0,0 +1,132 @@
+"""
+自适应超时策略
+按调用点学习延迟分布，用高分位数 × 系数作为超时时间，并限制在配置的上下限之内；
+同时不会超过当前请求剩余的时间预算
+"""
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from app.config import settings
+from app.utils import deadline
+from app.utils.latency_tracker import LatencyTracker, latency_tracker
+
+
+@dataclass(frozen=True)
+class TimeoutBounds:
+    """调用点的超时配置（秒）"""
+    default: float  # 样本不足时使用
+    minimum: float
+    maximum: float
+
+
+# 各调用点的默认超时上下限（保留原先硬编码的值作为默认值和上限）
+DEFAULT_TIMEOUT_BOUNDS: Dict[str, TimeoutBounds] = {
+    "llm_chat": TimeoutBounds(240.0, 10.0, 240.0),
+    # 交互式调用（/user/input、/ai/chat）：之前没有超时
+    "candidate_questions": TimeoutBounds(30.0, 5.0, 60.0),
+    "extract_family_info": TimeoutBounds(30.0, 5.0, 60.0),
+    "soft_clarify": TimeoutBounds(30.0, 5.0, 60.0),
+    # WebSocket 对话：流式生成下一个问题
+    "question_stream": TimeoutBounds(30.0, 5.0, 60.0),
+    # 离线生成问题库
+    "question_bank": TimeoutBounds(60.0, 10.0, 120.0),
+    # 批量导入访谈：一次抽取多轮问答
+    "extract_family_info_batch": TimeoutBounds(120.0, 15.0, 180.0),
+    # 搜索与分析
+    "family_match": TimeoutBounds(120.0, 15.0, 120.0),
+    "search_summary": TimeoutBounds(120.0, 15.0, 120.0),
+    "bocha_search": TimeoutBounds(30.0, 3.0, 30.0),
+    # 报告与时间轴
+    "report": TimeoutBounds(240.0, 30.0, 240.0),
+    "report_chapter": TimeoutBounds(120.0, 15.0, 180.0),
+    "report_text": TimeoutBounds(240.0, 30.0, 240.0),
+    "biography": TimeoutBounds(240.0, 30.0, 240.0),
+    # 时间轴本地推导，只有覆盖不足时调用一次补充空档（提示词很短）
+    "timeline_gaps": TimeoutBounds(60.0, 10.0, 120.0),
+    "memories": TimeoutBounds(240.0, 20.0, 240.0),
+    "memories_delta": TimeoutBounds(60.0, 10.0, 120.0),
+    # 图片
+    "image_prompts": TimeoutBounds(60.0, 10.0, 60.0),
+    "seedream_image": TimeoutBounds(120.0, 20.0, 120.0),
+}
+
+
+class TimeoutPolicy:
+    """超时策略引擎"""
+
+    def __init__(
+        self,
+        tracker: LatencyTracker,
+        percentile: float = 0.99,
+        multiplier: float = 1.5,
+        bounds: Optional[Dict[str, TimeoutBounds]] = None,
+    ):
+        self.tracker = tracker
+        self.percentile = percentile
+        self.multiplier = multiplier
+        self.bounds = dict(DEFAULT_TIMEOUT_BOUNDS)
+        if bounds:
+            self.bounds.update(bounds)
+
+    def _bounds_for(self, call_site: str) -> TimeoutBounds:
+        return self.bounds.get(call_site) or self.bounds["llm_chat"]
+
+    def learned_timeout(self, call_site: str) -> float:
+        """只根据延迟分布计算的超时（不考虑请求预算）"""
+        bounds = self._bounds_for(call_site)
+        observed = self.tracker.percentile(call_site, self.percentile)
+        if observed is None:
+            return bounds.default
+        return min(bounds.maximum, max(bounds.minimum, observed * self.multiplier))
+
+    def timeout_for(self, call_site: str, requested: Optional[float] = None) -> float:
+        """
+        计算调用点的超时时间
+        requested: 调用方显式指定的超时（仍会受请求预算限制）
+        预算已经用完时抛出 DeadlineExceeded
+        """
+        timeout = requested if requested is not None else self.learned_timeout(call_site)
+        left = deadline.remaining()
+        if left is not None:
+            if left <= 0:
+                raise deadline.DeadlineExceeded(f"请求时间预算已用完（{call_site}）")
+            timeout = min(timeout, left)
+        return timeout
+
+    def record_timeout(self, call_site: str, timeout: float) -> None:
+        """
+        超时也计入延迟分布（按超时值记录，真实延迟至少这么长），避免分布只包含成功的快请求；
+        但只记录学习到的超时本身耗尽的情况：被请求预算（X-Request-Timeout）截短的超时不说明上游变慢，
+        记录下来会把分位数（以及对冲阈值）拉低，让学习到的超时越缩越短
+        """
+        if timeout >= self.learned_timeout(call_site) - 1e-6:
+            self.tracker.record(call_site, timeout)
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        """导出各调用点当前的超时（用于健康检查接口）"""
+        return {
+            site: {
+                "timeout": self.learned_timeout(site),
+                "minimum": bounds.minimum,
+                "maximum": bounds.maximum,
+            }
+            for site, bounds in self.bounds.items()
+        }
+
+
+def _configured_bounds() -> Dict[str, TimeoutBounds]:
+    """从配置读取调用点超时覆盖，格式：{"call_site": [default, minimum, maximum]}"""
+    overrides: Dict[str, TimeoutBounds] = {}
+    for site, values in (settings.timeout_bounds or {}).items():
+        if isinstance(values, (list, tuple)) and len(values) == 3:
+            overrides[site] = TimeoutBounds(*(float(v) for v in values))
+    return overrides
+
+
+# 全局实例
+timeout_policy = TimeoutPolicy(
+    latency_tracker,
+    percentile=settings.timeout_percentile,
+    multiplier=settings.timeout_multiplier,
+    bounds=_configured_bounds(),
+)
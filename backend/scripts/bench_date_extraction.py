@@ -0,0 +1,105 @@
+"""
+年代提取基准测试
+在随机生成的大规模搜索摘要语料上，对比原先的做法（每次调用 import re 找公历年份、逐个遍历 7 个朝代）、
+同样做法换成完整朝代表和年号表（逐个 in 查找再解析纪年），与预编译的年代提取器（逐条提取、整批一次扫描），
+并统计各自识别出年代的摘要数
+
+用法：python scripts/bench_date_extraction.py [--snippets 20000]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.date_extraction import get_date_extractor, parse_numeral
+
+
+FRAGMENTS = [
+    "陈氏一族自河南固始南迁", "乾隆三十年迁居福建泉州", "始祖于南宋绍兴年间入闽", "民国二十六年族人避战乱西迁",
+    "清末族中多人下南洋谋生", "1949年后祠堂改作学校", "据族谱记载，明洪武二年奉诏迁徙", "东汉末年天下大乱",
+    "唐朝开元年间官至刺史", "族人约1200余人", "19世纪中叶修订族谱", "20世纪80年代重修宗祠",
+    "公元前221年秦统一六国", "宗祠占地3000平方米", "光绪元年重修", "该支派世居江西吉安",
+]
+
+LEGACY_DYNASTIES = {"唐朝": 700, "宋朝": 1000, "元朝": 1300, "明朝": 1400, "清朝": 1700, "民国": 1920, "现代": 1950}
+
+
+def legacy_extract(text: str):
+    """原实现：朝代字典遍历 + 每次编译的公历年份正则"""
+    for dynasty, year in LEGACY_DYNASTIES.items():
+        if dynasty in text:
+            return year
+    import re
+    matches = re.findall(r'\b(19|20)\d{2}\b', text)
+    if matches:
+        try:
+            return int(matches[0] + matches[1] if len(matches) > 1 else matches[0])
+        except Exception:
+            pass
+    return None
+
+
+def table_scan_extract(text: str, extractor) -> list:
+    """逐个遍历完整朝代表和年号表的做法（与提取器覆盖范围相同时的对照）"""
+    import re
+    found = []
+    for era, (_, start, _) in extractor.eras.items():
+        if era in text:
+            m = re.search(era + r"([元\d〇一二三四五六七八九十]{1,4})年", text)
+            found.append(start + (parse_numeral(m.group(1)) or 1) - 1 if m else start)
+    for name, (_, start, end) in extractor.dynasties.items():
+        if name in text:
+            found.append((start + end) // 2)
+    found += [int(y) for y in re.findall(r"(?<!\d)(?:1\d{3}|20\d{2})(?!\d)", text)]
+    return found
+
+
+def corpus(size: int, seed: int = 7) -> list:
+    rng = random.Random(seed)
+    return ["，".join(rng.sample(FRAGMENTS, rng.randint(1, 4))) + "。" for _ in range(size)]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="年代提取基准")
+    parser.add_argument("--snippets", type=int, default=20000)
+    args = parser.parse_args()
+
+    snippets = corpus(args.snippets)
+    extractor = get_date_extractor()
+    print(f"snippets: {len(snippets)}, pattern: {len(extractor.pattern.pattern)} chars")
+
+    started = time.perf_counter()
+    legacy = [legacy_extract(s) for s in snippets]
+    legacy_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    table_scan = [table_scan_extract(s, extractor) for s in snippets]
+    table_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    single = [extractor.first_year(s) for s in snippets]
+    single_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    each = [extractor.extract(s) for s in snippets]
+    each_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    batch = extractor.extract_batch(snippets)
+    batch_seconds = time.perf_counter() - started
+
+    print(f"  legacy           {legacy_seconds / len(snippets) * 1e6:8.2f} us/snippet, dated {sum(y is not None for y in legacy)}")
+    print(f"  full-table scan  {table_seconds / len(snippets) * 1e6:8.2f} us/snippet, dated {sum(1 for y in table_scan if y)}")
+    print(f"  compiled first   {single_seconds / len(snippets) * 1e6:8.2f} us/snippet, dated {sum(y is not None for y in single)}")
+    print(f"  compiled all     {each_seconds / len(snippets) * 1e6:8.2f} us/snippet, mentions {sum(len(m) for m in each)}")
+    print(f"  compiled batch   {batch_seconds / len(snippets) * 1e6:8.2f} us/snippet, dated {sum(1 for m in batch if m)}, "
+          f"mentions {sum(len(m) for m in batch)}")
+    mismatches = sum(1 for a, b in zip(each, batch) if a != b)
+    print(f"  batch mismatches {mismatches}")
+
+
+if __name__ == "__main__":
+    main()
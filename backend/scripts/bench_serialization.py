@@ -0,0 +1,98 @@
+"""
+JSON 序列化基准测试
+用接近真实规模的会话状态（Redis）和家族报告（API 响应）对比标准库 json 与当前序列化后端
+
+用法：python scripts/bench_serialization.py [--number 2000]
+"""
+import argparse
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils import serialization
+
+
+def session_state() -> dict:
+    """一次进行到第 12 轮的问答会话状态"""
+    return {
+        "session_id": "2f1c7a7e-5b8e-4d1c-9d6f-2a3b4c5d6e7f",
+        "step": "surname_clue",
+        "current_question": "你家族的姓氏是？你有没有见过家谱、祠堂、或者听过“堂号/宗祠”之类的说法？",
+        "asked_questions": [f"第{i}个问题：你印象里爷爷那边的老家大概在哪个省市？不确定也没关系。" for i in range(12)],
+        "collected_data": {
+            "user_profile": {"name": "张三", "birth_date": "1990-05-01", "birth_place": "湖南长沙", "current_location": "上海"},
+            "self": {"origin": "湖南湘潭", "surname": "张", "generation_name": "德"},
+            "father": {"origin": "湖南湘潭", "name": "张建国", "birth_year": 1962},
+            "grandfather": {"origin": "江西吉安", "name": "张德明", "story": "抗战时期从江西迁到湖南" * 3},
+            "_unparsed": [
+                {"question": f"问题{i}", "answer": "小时候听奶奶说祖上是从江西填湖广过来的，具体哪一年不清楚。"}
+                for i in range(8)
+            ],
+        },
+        "question_count": 12,
+    }
+
+
+def report() -> dict:
+    """一份完整的家族历史报告（含大家族分析和时间轴）"""
+    families = [
+        {
+            "family_name": f"清河张氏第{i}支",
+            "main_regions": ["河北清河", "江西吉安", "湖南湘潭"],
+            "confidence": 0.8 - i * 0.1,
+            "famous_figures": [
+                {"name": f"张{j}", "dynasty_period": "明朝", "achievements": "官至礼部尚书，主持修订家谱" * 2, "story": "少年苦读，中进士" * 5}
+                for j in range(6)
+            ],
+            "migration_history": "元末明初自江西吉安迁往湖南湘潭，清代分支迁入四川。" * 4,
+        }
+        for i in range(4)
+    ]
+    return {
+        "title": "张三家族历史报告",
+        "summary": "基于张三提供的信息和联网搜索，为您生成的家族历史报告",
+        "report_text": "这是一段家族历史叙述，讲述了家族从江西迁徙到湖南的过程。" * 200,
+        "possible_families": families,
+        "family_histories": {f["family_name"]: {"history": f["migration_history"] * 3} for f in families},
+        "search_summary": {"total_results": 42, "sources": ["bochaai", "deepseek"]},
+        "generated_at": "2024-05-01T12:00:00",
+        "session_id": "2f1c7a7e-5b8e-4d1c-9d6f-2a3b4c5d6e7f",
+        "user_info": {"name": "张三", "birth_place": "湖南长沙", "current_location": "上海"},
+        "timeline": {
+            "events": [
+                {"year": 1368 + i * 8, "event": f"第{i}代先祖迁居新地，修建祠堂", "location": "湖南湘潭", "source": "family:清河张氏"}
+                for i in range(80)
+            ]
+        },
+    }
+
+
+def bench(name: str, payload: dict, number: int) -> None:
+    std_raw = json.dumps(payload, ensure_ascii=False)
+    fast_raw = serialization.dumps_bytes(payload)
+    cases = [
+        ("dumps  stdlib", lambda: json.dumps(payload, ensure_ascii=False)),
+        (f"dumps  {serialization.BACKEND}", lambda: serialization.dumps_bytes(payload)),
+        ("loads  stdlib", lambda: json.loads(std_raw)),
+        (f"loads  {serialization.BACKEND}", lambda: serialization.loads(fast_raw)),
+    ]
+    print(f"\n{name}: {len(std_raw.encode('utf-8'))} bytes (stdlib), {len(fast_raw)} bytes ({serialization.BACKEND})")
+    for label, fn in cases:
+        seconds = min(timeit.repeat(fn, number=number, repeat=3))
+        print(f"  {label:<16} {seconds / number * 1e6:9.1f} us/op")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="JSON 序列化基准")
+    parser.add_argument("--number", type=int, default=2000)
+    args = parser.parse_args()
+    print(f"backend: {serialization.BACKEND}")
+    bench("session state", session_state(), args.number)
+    bench("family report", report(), max(1, args.number // 10))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+启动耗时基准测试
+在独立子进程中测量：
+1. import app.main 的耗时
+2. 从进程内导入到第一个 /health/ 请求成功返回的耗时（time-to-first-ready，跳过连接预热）
+并检查 openai / motor / redis / httpx / pymongo / reportlab 是否在导入阶段被加载
+
+用法：python scripts/bench_startup.py [--runs 5] [--budget 3.0]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = ("openai", "motor", "redis", "httpx", "pymongo", "reportlab")
+
+_PROBE = r"""
+import json, sys, time
+t0 = time.perf_counter()
+import app.main
+t1 = time.perf_counter()
+loaded = [m for m in %r if m in sys.modules]
+from fastapi.testclient import TestClient
+with TestClient(app.main.app) as client:
+    assert client.get("/health/").status_code == 200
+t2 = time.perf_counter()
+print(json.dumps({"import": t1 - t0, "ready": t2 - t0, "loaded": loaded}))
+""" % (HEAVY_MODULES,)
+
+
+def run_once() -> dict:
+    env = dict(os.environ, WARMUP_ON_STARTUP="false")
+    out = subprocess.run(
+        [sys.executable, "-c", _PROBE],
+        cwd=BACKEND_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="RootJourney 启动耗时基准")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget", type=float, default=None, help="import 耗时中位数上限（秒），超出时返回非零")
+    args = parser.parse_args()
+
+    results = [run_once() for _ in range(args.runs)]
+    imports = [r["import"] for r in results]
+    ready = [r["ready"] for r in results]
+    loaded = sorted({m for r in results for m in r["loaded"]})
+
+    print(f"runs: {args.runs}")
+    print(f"import app.main   median {statistics.median(imports) * 1000:8.1f} ms   max {max(imports) * 1000:8.1f} ms")
+    print(f"time-to-ready     median {statistics.median(ready) * 1000:8.1f} ms   max {max(ready) * 1000:8.1f} ms")
+    print(f"heavy modules loaded at import: {loaded or 'none'}")
+
+    if args.budget is not None and statistics.median(imports) > args.budget:
+        print(f"FAIL: import median exceeds budget {args.budget:.2f}s")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,84 @@
+"""
+Redis 会话状态编码对比
+对比 JSON / msgpack 以及各压缩算法下单个会话状态的大小、编解码耗时；
+指定 --redis 时把每种编码各写入 N 个键，用 MEMORY USAGE 统计 Redis 实际占用
+
+用法：
+    python scripts/bench_state_encoding.py
+    python scripts/bench_state_encoding.py --redis redis://localhost:6379/15 --keys 1000
+"""
+import argparse
+import asyncio
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils import serialization, state_codec
+from bench_serialization import session_state
+
+
+def variants():
+    """(名称, encoding, compression) 列表，第一项为旧格式基准"""
+    result = [("json (legacy)", "json", "none")]
+    for encoding in state_codec.available_encodings():
+        for compression in state_codec.available_compressions():
+            if (encoding, compression) != ("json", "none"):
+                result.append((f"{encoding}+{compression}", encoding, compression))
+    return result
+
+
+def offline_report(state: dict, number: int) -> None:
+    baseline = len(serialization.dumps_bytes(state))
+    print(f"{'variant':<18}{'bytes':>8}{'ratio':>8}{'encode us':>12}{'decode us':>12}")
+    for name, encoding, compression in variants():
+        raw = state_codec.encode(state, encoding=encoding, compression=compression, threshold=0)
+        enc = min(timeit.repeat(
+            lambda: state_codec.encode(state, encoding=encoding, compression=compression, threshold=0),
+            number=number, repeat=3,
+        )) / number * 1e6
+        dec = min(timeit.repeat(lambda: state_codec.decode(raw), number=number, repeat=3)) / number * 1e6
+        print(f"{name:<18}{len(raw):>8}{len(raw) / baseline:>8.2f}{enc:>12.1f}{dec:>12.1f}")
+
+
+async def redis_report(url: str, state: dict, keys: int) -> None:
+    from redis import asyncio as aioredis
+
+    client = aioredis.from_url(url, decode_responses=False)
+    print(f"\nRedis MEMORY USAGE ({keys} keys per variant, {url})")
+    print(f"{'variant':<18}{'avg bytes/key':>15}{'total MiB':>12}")
+    try:
+        for name, encoding, compression in variants():
+            prefix = f"bench:state:{name}:"
+            raw = state_codec.encode(state, encoding=encoding, compression=compression, threshold=0)
+            pipe = client.pipeline()
+            for i in range(keys):
+                pipe.set(f"{prefix}{i}", raw, ex=600)
+            await pipe.execute()
+            pipe = client.pipeline()
+            for i in range(keys):
+                pipe.memory_usage(f"{prefix}{i}")
+            usage = [u or 0 for u in await pipe.execute()]
+            total = sum(usage)
+            print(f"{name:<18}{total / keys:>15.0f}{total / 1024 / 1024:>12.2f}")
+            await client.delete(*[f"{prefix}{i}" for i in range(keys)])
+    finally:
+        await client.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Redis 会话状态编码对比")
+    parser.add_argument("--number", type=int, default=2000)
+    parser.add_argument("--redis", default=None, help="Redis URL（建议使用空闲的 db）")
+    parser.add_argument("--keys", type=int, default=1000)
+    args = parser.parse_args()
+
+    state = session_state()
+    offline_report(state, args.number)
+    if args.redis:
+        asyncio.run(redis_report(args.redis, state, args.keys))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""
+刷新问题库
+为每个 FLOW 步骤、语气（warm / neutral）和用户分组重新生成问题模板并写入 Redis；
+服务也会按 QUESTION_BANK_REFRESH_INTERVAL 在后台定期刷新，这个脚本用于首次部署或手动更新
+
+用法：
+    python scripts/refresh_question_bank.py
+    python scripts/refresh_question_bank.py --step self_origin --tone warm
+    python scripts/refresh_question_bank.py --show
+"""
+import argparse
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.dependencies.db import close_db_connections
+from app.repositories.question_bank_repository import BUCKETS, TONES, question_bank_repository
+from app.services.ai_service import AIService
+
+
+async def main(args: argparse.Namespace) -> None:
+    try:
+        if not args.show:
+            result = await AIService().refresh_question_bank(
+                steps=args.step or None,
+                tones=args.tone or None,
+                buckets=args.bucket or None,
+            )
+            failed = [name for name, count in result.items() if not count]
+            print(f"refreshed {len(result) - len(failed)}/{len(result)} banks")
+            for name in failed:
+                print(f"  failed: {name}")
+        for key, size in sorted((await question_bank_repository.sizes()).items()):
+            print(f"{key:<60}{size:>4}")
+    finally:
+        await close_db_connections()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--step", action="append", choices=[item[0] for item in AIService.FLOW])
+    parser.add_argument("--tone", action="append", choices=TONES)
+    parser.add_argument("--bucket", action="append", choices=BUCKETS)
+    parser.add_argument("--show", action="store_true", help="只显示现有问题库的大小，不重新生成")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,65 @@
+"""
+密钥池单元测试
+"""
+import pytest
+
+from app.config import settings
+from app.services.ai_service import AIService
+from app.utils.api_key_manager import APIKeyManager
+from app.utils.api_key_pool import APIKeyPool
+
+
+def test_acquire_prefers_headroom():
+    """优先选择剩余额度更多的密钥"""
+    pool = APIKeyPool()
+    pool.sync(["sk-aaaaaaaaaaaa", "sk-bbbbbbbbbbbb"])
+    key = pool.acquire()
+    pool.release(key, headers={"x-ratelimit-remaining-requests": "1"})
+    other = pool.acquire()
+    pool.release(other, headers={"x-ratelimit-remaining-requests": "100"})
+    assert pool.acquire() == other
+
+
+def test_rate_limited_key_cools_down():
+    """返回 429 的密钥进入冷却，请求转到其他密钥"""
+    pool = APIKeyPool(rate_limit_cooldown=60)
+    pool.sync(["sk-aaaaaaaaaaaa", "sk-bbbbbbbbbbbb"])
+    key = pool.acquire()
+    pool.release(key, error="rate_limit")
+    assert pool.has_available(exclude=key)
+    for _ in range(3):
+        picked = pool.acquire()
+        assert picked != key
+        pool.release(picked)
+    assert sum(s["rate_limited"] for s in pool.stats()) == 1
+
+
+def test_sync_removes_keys():
+    """同步时移除已删除的密钥"""
+    pool = APIKeyPool()
+    pool.sync(["sk-aaaaaaaaaaaa", "sk-bbbbbbbbbbbb"])
+    pool.sync(["sk-bbbbbbbbbbbb"])
+    assert pool.size() == 1
+    assert pool.acquire() == "sk-bbbbbbbbbbbb"
+
+
+@pytest.fixture
+def key_config(monkeypatch):
+    monkeypatch.setattr(settings, "deepseek_api_key", None)
+    APIKeyManager.clear_runtime_keys()
+    yield monkeypatch
+    APIKeyManager.clear_runtime_keys()
+
+
+def test_placeholder_first_key_does_not_block_pool(key_config):
+    """密钥池第一个是占位符时，只要还有真实密钥就可以使用"""
+    key_config.setattr(settings, "deepseek_api_keys", "YOUR_API_KEY,sk-bbbbbbbbbbbb")
+    service = AIService(gateway_service=object())
+    service._ensure_llm()
+    assert service._llm_ready
+
+
+def test_pool_of_placeholders_is_rejected(key_config):
+    key_config.setattr(settings, "deepseek_api_keys", "YOUR_API_KEY, DEEPSEEK_API_KEY")
+    with pytest.raises(RuntimeError):
+        AIService(gateway_service=object())._ensure_llm()
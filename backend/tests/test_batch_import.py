@@ -0,0 +1,110 @@
+"""
+批量导入访谈单元测试
+"""
+import asyncio
+import json
+
+from app.config import settings
+from app.services.ai_service import AIService
+
+
+class ChunkGateway:
+    """按调用顺序返回每段的抽取结果，并记录每段提示词"""
+
+    def __init__(self, results):
+        self.results = list(results)
+        self.prompts = []
+
+    async def llm_chat(self, messages, **kwargs):
+        assert kwargs["call_site"] == "extract_family_info_batch"
+        self.prompts.append(messages[0]["content"])
+        result = self.results[len(self.prompts) - 1]
+        if isinstance(result, Exception):
+            raise result
+        return json.dumps(result, ensure_ascii=False)
+
+
+class BatchService(AIService):
+    """不连接 Redis / MongoDB：状态放在内存中"""
+
+    def __init__(self, gateway, state=None):
+        super().__init__(gateway_service=gateway)
+        self._llm_ready = True
+        self.state = state or {"collected_data": {}, "question_count": 1}
+        self.persisted = None
+
+    async def _load_state(self, session_id):
+        return self.state
+
+    async def _save_state(self, session_id, state):
+        self.state = state
+
+    async def _persist_mongo(self, session_id, collected):
+        self.persisted = collected
+
+
+def pair(q, a):
+    return {"question": q, "answer": a}
+
+
+def test_batch_chunks_respect_max_chars(monkeypatch):
+    monkeypatch.setattr(settings, "batch_extract_max_chars", 10)
+    service = BatchService(ChunkGateway([]))
+    pairs = [{"q": "问题", "a": "回答回答"}, {"q": "问", "a": "答答"}, {"q": "长问题长问题", "a": "长回答长回答"}, {"q": "问", "a": "答"}]
+    chunks = service._batch_chunks(pairs)
+    # 每段不超过 10 个字符；单个问答超过上限时独占一段，不会被丢弃
+    assert [len(c) for c in chunks] == [2, 1, 1]
+    assert [p for c in chunks for p in c] == pairs
+
+
+def test_batch_extracts_per_chunk_and_merges(monkeypatch):
+    """分段抽取：后一段能看到前一段的结果；一段失败不影响其他段；跳过的回答不参与抽取但保留在对话历史"""
+    monkeypatch.setattr(settings, "batch_extract_max_chars", 30)
+    gateway = ChunkGateway([
+        {"self": {"origin": "福建泉州"}},
+        RuntimeError("upstream error"),
+        {"father": {"origin": "福建晋江"}, "self": {"surname": "陈"}},
+    ])
+    service = BatchService(gateway)
+    pairs = [
+        pair("你的祖籍在哪里？", "福建泉州，小时候常听奶奶说"),
+        pair("爷爷的老家呢？", "不知道"),
+        pair("家里有辈分字吗？", "好像有，但是想不起来是哪个字了"),
+        pair("你爸爸的老家在哪里？", "晋江，姓陈"),
+    ]
+    result = asyncio.run(service.process_batch("s-1", pairs))
+
+    assert len(gateway.prompts) == 3
+    assert "不知道" not in "".join(gateway.prompts)
+    assert "福建泉州" in gateway.prompts[2].split("【已有数据】")[1]
+    assert result["extracted"] == {"self": {"origin": "福建泉州", "surname": "陈"}, "father": {"origin": "福建晋江"}}
+    assert result["imported"] == 4
+
+    collected = service.state["collected_data"]
+    assert collected["self"] == {"origin": "福建泉州", "surname": "陈"}
+    assert [turn["a"] for turn in collected["_unparsed"]] == [p["answer"] for p in pairs]
+    # 下一步是第一个仍缺字段的步骤（爷爷籍贯），使用兜底问法
+    assert result["status"] == "continue" and result["step"] == "grandfather_origin"
+    assert service.state["current_question"] == result["question"]
+    assert service.state["question_count"] == 5
+    assert service.persisted is collected
+
+
+def test_batch_completes_when_all_fields_known():
+    gateway = ChunkGateway([{
+        "self": {"origin": "福建泉州", "surname": "陈", "generation_name": "德"},
+        "father": {"origin": "福建晋江"},
+        "grandfather": {"origin": "福建晋江"},
+    }])
+    service = BatchService(gateway)
+    result = asyncio.run(service.process_batch("s-1", [pair("说说你的家族", "……")]))
+    assert result["status"] == "complete" and result["question"] is None
+    assert service.state["step"] == "complete" and service.state["current_question"] is None
+
+
+def test_all_skipped_answers_make_no_llm_call():
+    gateway = ChunkGateway([])
+    service = BatchService(gateway)
+    result = asyncio.run(service.process_batch("s-1", [pair("爷爷的老家？", "不记得了"), pair("辈分字？", "")]))
+    assert gateway.prompts == [] and result["extracted"] == {}
+    assert [turn["a"] for turn in service.state["collected_data"]["_unparsed"]] == ["不记得了"]
@@ -0,0 +1,46 @@
+"""
+朝代与年号区间索引单元测试
+"""
+from app.utils.chronology import ChronologyIndex, Period, cn_numeral, get_chronology
+
+
+def test_era_lookups_both_directions():
+    index = get_chronology()
+    qianlong = index.era("乾隆")
+    assert (qianlong.start, qianlong.end, qianlong.label) == (1736, 1795, "清·乾隆")
+    assert index.era_year("乾隆", 30) == 1765
+    assert index.era_year("乾隆", 80) is None
+    # 年号末年（康熙六十一年 = 1722）有效，再往后一年不存在
+    assert index.era_year("康熙", 61) == 1722
+    assert index.era_year("康熙", 62) is None
+    assert index.era_year("光绪", 35) is None
+    assert index.describe(1765) == "清·乾隆三十年"
+    # 改元当年取新年号
+    assert index.describe(1457) == "明·天顺元年"
+    # 同名年号都保留，默认取先出现的
+    assert [p.dynasty for p in index.eras["建武"]] == ["汉", "晋"]
+
+
+def test_dynasty_priority_for_overlapping_regimes():
+    index = get_chronology()
+    assert index.dynasty_at(1000).name == "北宋"
+    assert index.dynasty_at(1150).name == "南宋"
+    assert index.dynasty_at(230).name == "三国"
+    assert {p.name for p in index.dynasties_at(1150)} >= {"宋", "南宋", "金"}
+    assert index.describe(-210) == "秦"
+    assert index.describe(-3000) is None
+    assert index.dynasty("民国").name == "中华民国"
+
+
+def test_segments_match_linear_scan():
+    periods = [
+        Period("甲", 0, 99, "朝代"), Period("乙", 50, 149, "政权"),
+        Period("子", 0, 9, "年号", dynasty="甲"), Period("丑", 9, 30, "年号", dynasty="甲"),
+    ]
+    index = ChronologyIndex(periods)
+    for year in range(-5, 160):
+        expected = {p for p in periods if p.start <= year <= p.end}
+        assert set(index.dynasties_at(year)) | set(index._segment(year)[1]) == expected
+    assert index.era_at(9).name == "丑"
+    assert index.dynasty_at(60).name == "甲"
+    assert cn_numeral(1) == "元" and cn_numeral(10) == "十" and cn_numeral(38) == "三十八"
@@ -0,0 +1,124 @@
+"""
+全局宗族图谱单元测试
+"""
+import asyncio
+
+from app.repositories import clan_repository as clan_module
+from app.repositories.clan_repository import clan_id, clan_key, extract_halls, rank_clans, region_keys
+from app.services.search_service import SearchService
+
+
+def test_clan_keys_are_canonical():
+    """同一支宗族的不同写法得到同一个 ID；无郡望时按省份区分"""
+    assert clan_key("王", "琅琊王氏家族", ["山东临沂"]) == ("王", "琅琊", "")
+    assert clan_id("王", "琅琊王氏", ["山东临沂"]) == clan_id("王", "王氏家族（琅琊王氏）", ["江苏南京"])
+    assert clan_id("王", "琅琊王氏", []) != clan_id("王", "太原王氏", [])
+    assert clan_key("陈", "历史上的陈氏家族", ["福建省泉州市"]) == ("陈", "", "福建")
+    assert region_keys(["山东省临沂市、江苏南京"]) == ["山东临沂", "江苏南京", "山东", "江苏"]
+    assert extract_halls(["我们家堂号是三槐堂，祠堂在村口", "王氏百忍堂"]) == ["三槐", "百忍"]
+
+
+def test_rank_clans():
+    clans = [
+        {"_id": "a", "region_keys": ["山东", "山东青岛"], "halls": [], "session_count": 9},
+        {"_id": "b", "region_keys": ["山东临沂", "山东"], "halls": [], "session_count": 1},
+        {"_id": "c", "region_keys": ["河南"], "halls": ["三槐"], "session_count": 0},
+        {"_id": "d", "region_keys": ["河北"], "halls": [], "session_count": 5},
+    ]
+    ranked = rank_clans(clans, ["山东临沂"], ["三槐"])
+    assert [(score, clan["_id"]) for score, clan in ranked] == [(3, "c"), (2, "b"), (1, "a")]
+
+
+class FakeClanRepository:
+    """内存中的宗族图谱"""
+
+    def __init__(self):
+        self.clans = {}
+        self.links = set()
+
+    async def find_clans(self, surname, regions=(), halls=(), fresh_after=None, limit=20):
+        keys, halls = set(region_keys(regions)), set(halls)
+        return [
+            c for c in self.clans.values()
+            if c["surname"] == surname and (keys & set(c["region_keys"]) or halls & set(c["halls"]))
+        ]
+
+    async def save_clan(self, surname, family, history, halls=()):
+        cid = clan_id(surname, family["family_name"], family["main_regions"])
+        self.clans[cid] = {
+            "_id": cid, "surname": surname, "family": family, "history": history,
+            "region_keys": region_keys(family["main_regions"]), "halls": list(halls), "names": [family["family_name"]],
+        }
+        return cid
+
+    async def link_sessions(self, session_ids, families):
+        self.links.update((s, f["clan_id"]) for s in session_ids for f in families if f.get("clan_id"))
+
+
+class GraphSearchService(SearchService):
+    """不调用 LLM 和联网搜索：记录分析次数"""
+
+    def __init__(self):
+        super().__init__(gateway_service=object())
+        self.analyses = 0
+
+    async def analyze_family_associations(self, collected_data):
+        self.analyses += 1
+        return [{
+            "family_name": "琅琊王氏", "main_regions": ["山东临沂", "江苏南京"], "relevance": "中",
+            "famous_figures": [{"name": "王羲之", "dynasty_period": "东晋"}],
+        }]
+
+    async def search_family_history(self, family_name, location=None):
+        return [{"title": f"{family_name}源流", "snippet": "……", "url": "https://example.com"}]
+
+
+def test_second_user_attaches_to_existing_clan(monkeypatch):
+    """第一位用户分析后写入宗族节点，同姓同乡的第二位用户直接引用，不再分析"""
+    repo = FakeClanRepository()
+    monkeypatch.setattr(clan_module.clan_repository, "find_clans", repo.find_clans)
+    monkeypatch.setattr(clan_module.clan_repository, "save_clan", repo.save_clan)
+    service = GraphSearchService()
+
+    first = asyncio.run(service.search_for_collected_data({"surname": "王", "self_origin": "山东临沂"}))
+    assert service.analyses == 1 and len(first["clan_ids"]) == 1
+
+    second = asyncio.run(service.search_for_collected_data({"surname": "王", "self": {"origin": "山东省临沂市"}}))
+    assert service.analyses == 1
+    assert second["clan_ids"] == first["clan_ids"]
+    family = second["possible_families"][0]
+    assert family["clan_id"] == first["clan_ids"][0] and family["relevance"] == "高"
+    assert second["family_histories"]["琅琊王氏"]["history"][0]["title"] == "琅琊王氏源流"
+
+    # 不同姓的用户不会挂到这个宗族上
+    asyncio.run(service.search_for_collected_data({"surname": "李", "self_origin": "山东临沂"}))
+    assert service.analyses == 2
+
+
+class FailingGateway:
+    async def llm_chat(self, **kwargs):
+        raise RuntimeError("LLM unavailable")
+
+
+def test_failed_analysis_is_not_written_to_graph(monkeypatch):
+    """大家族分析失败时的兜底结果（以及没搜到历史的大家族）不写入宗族图谱"""
+    repo = FakeClanRepository()
+    monkeypatch.setattr(clan_module.clan_repository, "find_clans", repo.find_clans)
+    monkeypatch.setattr(clan_module.clan_repository, "save_clan", repo.save_clan)
+
+    class FailingSearchService(SearchService):
+        async def search_family_history(self, family_name, location=None):
+            return [{"title": f"{family_name}", "snippet": "……", "url": "https://example.com"}]
+
+    service = FailingSearchService(gateway_service=FailingGateway())
+    results = asyncio.run(service.search_for_collected_data({"surname": "王", "self_origin": "山东临沂"}))
+    assert results["possible_families"] and results["possible_families"][0].get("placeholder")
+    assert not results.get("clan_ids")
+    assert repo.clans == {}
+
+    class EmptyHistoryService(GraphSearchService):
+        async def search_family_history(self, family_name, location=None):
+            return []
+
+    results = asyncio.run(EmptyHistoryService().search_for_collected_data({"surname": "王", "self_origin": "山东临沂"}))
+    assert not results.get("clan_ids") and repo.clans == {}
@@ -0,0 +1,88 @@
+"""
+宗亲批量服务与路由单元测试
+"""
+import asyncio
+
+from fastapi.testclient import TestClient
+
+from app.dependencies.resources import get_cohort_service
+from app.main import app
+from app.services.cohort_service import CohortService
+from app.services.search_service import SearchService
+from app.utils.surnames import surname_of
+
+
+class FakeAIService:
+    gateway_service = object()
+
+    async def start_sessions_bulk(self, profiles):
+        return [f"s-{i}" for i in range(len(profiles))]
+
+
+class FakeSearchService(SearchService):
+    """不调用 LLM：记录每组搜索用的收集数据"""
+
+    def __init__(self):
+        super().__init__(gateway_service=object())
+        self.searched = []
+
+    async def search_for_collected_data(self, collected_data):
+        self.searched.append(collected_data)
+        return {"possible_families": [{"family_name": f"{collected_data['surname']}氏"}], "family_histories": {}}
+
+
+class FakeOutputService:
+    def __init__(self):
+        self.reports = []
+
+    async def generate_report(self, session_id, search_results=None):
+        self.reports.append((session_id, search_results["possible_families"][0]["family_name"]))
+        if session_id == "s-2":
+            raise RuntimeError("report failed")
+
+
+def make_service():
+    search, output = FakeSearchService(), FakeOutputService()
+    return CohortService(ai_service=FakeAIService(), search_service=search, output_service=output), search, output
+
+
+def test_compound_surnames():
+    assert surname_of("欧阳修") == "欧阳" and surname_of("司马光") == "司马"
+    assert surname_of("王羲之") == "王" and surname_of("") == ""
+
+
+def test_one_search_per_group_and_report_per_member():
+    """同姓同乡的成员共享一次搜索；复姓不会被拆成单姓分组；单个报告失败不影响其他成员"""
+    service, search, output = make_service()
+    profiles = [
+        {"name": "欧阳明", "birth_place": "江西吉安"},
+        {"name": "欧阳华", "birth_place": "江西吉安"},
+        {"name": "欧晓", "birth_place": "江西吉安"},
+        {"name": "陈东", "surname": "陈", "birth_place": "福建泉州"},
+    ]
+    result = asyncio.run(service.run(profiles))
+
+    groups = {(g["surname"], g["origin"]): g["session_ids"] for g in result["groups"]}
+    assert groups == {("欧阳", "江西吉安"): ["s-0", "s-1"], ("欧", "江西吉安"): ["s-2"], ("陈", "福建泉州"): ["s-3"]}
+    assert len(search.searched) == 3
+    assert search.searched[0]["self_origin"] == "江西吉安"
+    assert sorted(output.reports) == [("s-0", "欧阳氏"), ("s-1", "欧阳氏"), ("s-2", "欧氏"), ("s-3", "陈氏")]
+    statuses = {r["session_id"]: r["status"] for r in result["reports"]}
+    assert statuses == {"s-0": "ok", "s-1": "ok", "s-2": "error", "s-3": "ok"}
+
+
+def test_cohort_router():
+    service, search, output = make_service()
+    app.dependency_overrides[get_cohort_service] = lambda: service
+    try:
+        client = TestClient(app)
+        response = client.post("/cohort/batch", json={
+            "members": [{"name": "陈东", "birth_place": "福建泉州"}], "generate_reports": False,
+        })
+        assert response.status_code == 200
+        assert response.json()["groups"] == [{"surname": "陈", "origin": "福建泉州", "session_ids": ["s-0"]}]
+        assert search.searched == [] and output.reports == []
+
+        assert client.post("/cohort/batch", json={"members": []}).status_code == 422
+    finally:
+        app.dependency_overrides.pop(get_cohort_service, None)
@@ -0,0 +1,57 @@
+"""
+年代提取单元测试
+"""
+from app.services.graph_service import GraphService
+from app.utils.date_extraction import format_year, get_date_extractor, parse_numeral
+
+
+def spans(text):
+    return [(m.kind, m.start, m.end) for m in get_date_extractor().extract(text)]
+
+
+def test_gregorian_years_are_not_truncated():
+    """原正则只返回捕获的前两位（“19”），现在返回完整年份"""
+    service = GraphService()
+    assert service._extract_year("出生于1956年") == 1956
+    assert service._extract_year("1990-05-01") == 1990
+    assert service._extract_year("族人约1200余人，电话13800138000") is None
+    assert spans("公元前221年") == [("year", -221, -221)]
+    assert format_year(-221) == "公元前221"
+
+
+def test_era_names_and_dynasties():
+    assert parse_numeral("三十八") == 38 and parse_numeral("廿一") == 21 and parse_numeral("元") == 1
+    assert spans("乾隆三十年（1765年）迁居泉州") == [("year", 1765, 1765), ("year", 1765, 1765)]
+    assert spans("民国三十八年") == [("year", 1949, 1949)]
+    assert spans("康熙年间") == [("era", 1662, 1722)]
+    assert spans("唐朝") == [("dynasty", 618, 907)]
+    assert spans("明末清初")[0][0] == "dynasty" and spans("明末清初")[0][2] == 1644
+    # 单字朝代名只在带后缀时算数；地名与年号同名时不带纪年不算
+    assert spans("明年周末回绍兴") == []
+    assert spans("20世纪80年代") == [("decade", 1980, 1989)]
+
+
+def test_batch_matches_individual_extraction():
+    extractor = get_date_extractor()
+    texts = ["始祖于南宋绍兴年间入闽", "", "无年代", None, "光绪元年重修，1949年后改作学校"]
+    assert extractor.extract_batch(texts) == [extractor.extract(t) for t in texts]
+
+
+def test_genealogy_phrases_are_not_dynasties():
+    """族谱常用说法不当作朝代：五代同堂、往上数五代、春秋两祭、新时期"""
+    assert spans("家里五代同堂") == []
+    assert spans("往上数五代都是种地的") == []
+    assert spans("每年春秋两祭") == []
+    assert spans("改革开放新时期") == []
+    assert spans("五代十国") == [("dynasty", 907, 979)]
+    assert spans("五代时期")[0][1:] == (907, 979)
+    assert spans("春秋末年")[0][0] == "dynasty"
+    assert spans("新朝") == [("dynasty", 9, 23)]
+
+
+def test_joined_dynasties_give_combined_span():
+    """两个朝代连写时取合起来的跨度；顺序颠倒或没有后缀时不匹配（清明、汉明帝）"""
+    assert spans("明清时期的族谱") == [("dynasty", 1368, 1912)]
+    assert spans("宋元之际南迁") == [("dynasty", 960, 1368)]
+    assert spans("清明时期") == []
+    assert spans("汉明帝时") == []
@@ -0,0 +1,102 @@
+"""
+LLM 对冲请求单元测试
+"""
+import asyncio
+
+import pytest
+
+from app.config import settings
+from app.services import gateway_service as gateway_module
+from app.services.gateway_service import GatewayService
+
+
+class FakeGateway(GatewayService):
+    """不连接 DeepSeek：按顺序取每次请求的 (耗时, 结果)，结果为异常时抛出"""
+
+    def __init__(self, plan):
+        super().__init__()
+        self.plan = list(plan)
+        self.started = []
+        self.cancelled = []
+
+    async def _create_completion(self, request_params):
+        index = len(self.started)
+        delay, result = self.plan[index]
+        self.started.append(index)
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            self.cancelled.append(index)
+            raise
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+
+@pytest.fixture(autouse=True)
+def hedge_env(monkeypatch):
+    """p90 固定为 0.02 秒；统计清零"""
+    monkeypatch.setattr(gateway_module, "_hedge_stats", {"eligible": 0, "hedged": 0, "hedge_wins": 0})
+    monkeypatch.setattr(gateway_module.latency_tracker, "percentile", lambda site, p: 0.02)
+    monkeypatch.setattr(settings, "llm_hedge_budget_ratio", 1.0)
+
+
+def hedged(gateway):
+    return asyncio.run(gateway._hedged_create({}, "candidate_questions"))
+
+
+def test_fast_primary_is_not_hedged():
+    gateway = FakeGateway([(0.0, "primary")])
+    assert hedged(gateway) == "primary"
+    assert gateway.started == [0]
+    stats = GatewayService.get_hedge_stats()
+    assert (stats["eligible"], stats["hedged"], stats["hedge_rate"]) == (1, 0, 0.0)
+
+
+def test_slow_primary_fires_hedge_and_loser_is_cancelled():
+    """主请求超过 p90 未返回时发出对冲请求，先返回的胜出，另一个被取消"""
+    gateway = FakeGateway([(1.0, "primary"), (0.0, "hedge")])
+    assert hedged(gateway) == "hedge"
+    assert gateway.started == [0, 1] and gateway.cancelled == [0]
+    stats = GatewayService.get_hedge_stats()
+    assert (stats["hedged"], stats["hedge_wins"], stats["win_rate"]) == (1, 1, 1.0)
+
+
+def test_primary_can_still_win_after_hedge():
+    """对冲请求失败时等待主请求；主请求胜出不计入胜率"""
+    gateway = FakeGateway([(0.05, "primary"), (0.0, RuntimeError("hedge failed"))])
+    assert hedged(gateway) == "primary"
+    stats = GatewayService.get_hedge_stats()
+    assert (stats["hedged"], stats["hedge_wins"], stats["win_rate"]) == (1, 0, 0.0)
+
+
+def test_both_failing_raises_last_error():
+    gateway = FakeGateway([(0.05, RuntimeError("primary failed")), (0.0, RuntimeError("hedge failed"))])
+    with pytest.raises(RuntimeError, match="primary failed"):
+        hedged(gateway)
+
+
+def test_hedge_budget_caps_hedge_rate(monkeypatch):
+    """对冲次数不超过可对冲调用数 × llm_hedge_budget_ratio"""
+    monkeypatch.setattr(settings, "llm_hedge_budget_ratio", 0.5)
+    gateway = FakeGateway([(0.04, "p1"), (0.04, "p2"), (0.0, "h2"), (0.04, "p3")])
+    # 第 1 次：预算 0.5，不对冲；第 2 次：预算 1，对冲；第 3 次：预算 1.5，已用 1 次，不对冲
+    assert [hedged(gateway) for _ in range(3)] == ["p1", "h2", "p3"]
+    stats = GatewayService.get_hedge_stats()
+    assert (stats["eligible"], stats["hedged"], stats["hedge_wins"]) == (3, 1, 1)
+    assert stats["hedge_rate"] == pytest.approx(1 / 3)
+
+
+def test_no_samples_means_no_hedge(monkeypatch):
+    monkeypatch.setattr(gateway_module.latency_tracker, "percentile", lambda site, p: None)
+    gateway = FakeGateway([(0.05, "primary")])
+    assert hedged(gateway) == "primary"
+    assert gateway.started == [0]
+
+
+def test_outer_timeout_cancels_both_requests():
+    """调用方超时打断时，主请求和对冲请求都被取消"""
+    gateway = FakeGateway([(1.0, "primary"), (1.0, "hedge")])
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(asyncio.wait_for(gateway._hedged_create({}, "candidate_questions"), 0.05))
+    assert sorted(gateway.cancelled) == [0, 1]
@@ -0,0 +1,52 @@
+"""
+回答意图匹配单元测试
+"""
+from app.services.ai_service import AIService
+from app.utils.intent_matcher import IntentMatcher, get_intent_matcher
+
+
+def test_overlapping_keywords_and_spans():
+    matcher = IntentMatcher({"end": ["结束", "结束对话"], "skip": ["不知道", "知道"]})
+    found = matcher.detect("我不知道，结束对话吧")
+    assert found["skip"].keyword == "不知道" and (found["skip"].start, found["skip"].end) == (1, 4)
+    assert found["end"].keyword == "结束"
+    assert [m.keyword for m in matcher.finditer("结束对话")] == ["结束", "结束对话"]
+
+
+def test_ascii_keywords_match_whole_words_only():
+    matcher = IntentMatcher({"end": ["stop", "that's all"]})
+    assert matcher.match("Please STOP now", "end") is not None
+    assert matcher.match("unstoppable", "end") is None
+    assert matcher.match("ok, that's all.", "end") is not None
+
+
+def test_bundled_dictionaries_keep_original_behaviour():
+    assert set(get_intent_matcher().intents) >= {"end", "skip"}
+    service = AIService(gateway_service=object())
+    assert service._is_end_request("我们结束吧")
+    assert not service._is_end_request("我爷爷是福建人")
+    assert service._is_skip("")
+    assert service._is_skip("这个我真不记得了")
+    assert service._is_skip("唔知喔")
+    assert not service._is_skip("在广东梅州")
+
+
+def test_anchored_keywords_only_match_at_clause_boundaries():
+    """容易误伤的短词只在单独成句时命中：迁徙回答里的“就到这”、粤语“冇错”都不算结束 / 跳过"""
+    matcher = IntentMatcher({"end": ["就到这$"], "skip": ["^冇$"]})
+    assert matcher.match("今天就到这里吧，谢谢", "end") is not None
+    assert matcher.match("就到这", "end") is not None
+    assert matcher.match("我们家清朝时候就到这里落户了", "end") is None
+    assert matcher.match("冇啊", "skip") is not None
+    assert matcher.match("冇错，就是梅州", "skip") is None
+
+    service = AIService(gateway_service=object())
+    assert service._is_end_request("好，先这样吧")
+    assert not service._is_end_request("我们家清朝时候就到这里落户了")
+    assert not service._is_end_request("爷爷那辈就到这边来了")
+    assert not service._is_end_request("先这样安顿下来，后来才去的广州")
+    assert service._is_skip("冇")
+    assert service._is_skip("没得")
+    assert not service._is_skip("冇错，就是梅州")
+    assert not service._is_skip("冇问题")
+    assert not service._is_skip("没得说，老家就在自贡")
@@ -0,0 +1,50 @@
+"""
+增量 JSON 数组解析单元测试
+"""
+import asyncio
+
+from app.services.ai_service import AIService
+from app.utils.json_stream import JSONStringArrayParser
+
+
+def test_parser_emits_strings_as_they_complete():
+    """按任意切分喂入，元素一完整就产出；跳过代码块标记、非字符串元素和转义"""
+    text = '```json\n["你好，\\"老家\\"在哪？", 3, {"a": "x"}, "第二个\\u95ee题"]\n```'
+    parser = JSONStringArrayParser()
+    out = []
+    for i in range(0, len(text), 3):
+        out.extend(parser.feed(text[i:i + 3]))
+    assert out == ['你好，"老家"在哪？', "第二个问题"]
+    assert parser.done
+
+
+def test_parser_first_element_before_array_ends():
+    parser = JSONStringArrayParser()
+    assert parser.feed('["问题一", "问') == ["问题一"]
+    assert not parser.done
+
+
+class FakeGateway:
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.yielded = 0
+        self.closed = False
+
+    async def llm_chat_stream(self, **kwargs):
+        try:
+            for chunk in self.chunks:
+                self.yielded += 1
+                yield chunk
+        finally:
+            self.closed = True
+
+
+def test_first_candidate_stops_stream_early():
+    """第一个未问过的问题完整后立即返回并关闭流"""
+    gateway = FakeGateway(['["问过的', '问题", "新', '问题", ', '"第三个', '"]'])
+    service = AIService(gateway_service=gateway)
+    service._ensure_llm = lambda: None
+    q = asyncio.run(service._first_candidate_question("主题", {}, avoid=["问过的问题"]))
+    assert q == "新问题"
+    assert gateway.yielded == 3
+    assert gateway.closed
@@ -0,0 +1,55 @@
+"""
+记忆卡片增量总结单元测试
+"""
+import asyncio
+
+from app.services.ai_service import AIService
+
+
+class MemoryService(AIService):
+    """不连接 Redis / MongoDB：状态和已保存的卡片都放在内存中"""
+
+    def __init__(self, unparsed, stored=None):
+        super().__init__(gateway_service=object())
+        self.state = {"collected_data": {"_unparsed": unparsed}}
+        self.stored = stored or {}
+        self.prompts = []
+
+    async def _load_state(self, session_id):
+        return self.state
+
+    async def _load_memories(self, session_id):
+        return self.stored
+
+    async def _save_memories(self, session_id, cards, source, covered_turns, data_fp=None):
+        self.stored = {"cards": cards, "source": source, "covered_turns": covered_turns}
+
+    async def _call_memory_llm(self, prompt, call_site):
+        self.prompts.append((call_site, prompt))
+        if call_site == "memories":
+            return [{"title": "老家的井", "content": "村口有一口井。"}]
+        return [
+            {"title": "老家的井（补记）", "content": "井边有棵槐树。", "replaces": "老家的井"},
+            {"title": "祠堂", "content": "逢年过节去祠堂。"},
+        ]
+
+
+def test_memories_cached_and_delta_merged():
+    turns = [{"q": "老家有什么？", "a": "有一口井"}]
+    service = MemoryService(turns)
+    first = asyncio.run(service.summarize_memories("s-1"))
+    assert first == [{"title": "老家的井", "content": "村口有一口井。"}]
+    assert service.stored["covered_turns"] == 1
+
+    # 没有新对话：直接返回已保存的卡片
+    assert asyncio.run(service.summarize_memories("s-1")) == first
+    assert len(service.prompts) == 1
+
+    # 新增一轮：只总结新增的对话并合并
+    turns.append({"q": "还记得什么？", "a": "逢年过节去祠堂"})
+    merged = asyncio.run(service.summarize_memories("s-1"))
+    call_site, prompt = service.prompts[-1]
+    assert call_site == "memories_delta"
+    assert "逢年过节去祠堂" in prompt and "有一口井\n" not in prompt
+    assert [c["title"] for c in merged] == ["老家的井（补记）", "祠堂"]
+    assert service.stored["covered_turns"] == 2
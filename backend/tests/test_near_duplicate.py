@@ -0,0 +1,38 @@
+"""
+问题近似重复检测单元测试
+"""
+from app.services.ai_service import AIService
+from app.utils.near_duplicate import NearDuplicateIndex
+
+
+ASKED = [
+    "你爸爸常提起过他的老家吗？你印象里大概在哪个省市？",
+    "那你对爷爷那边的老家有没有任何印象？",
+]
+
+
+def test_paraphrase_is_duplicate():
+    index = NearDuplicateIndex(ASKED)
+    assert index.is_duplicate(ASKED[0])
+    assert index.is_duplicate("你父亲有没有常提起他的老家？印象里大概是哪个省市呢？")
+
+
+def test_different_topic_or_relative_is_not_duplicate():
+    index = NearDuplicateIndex(ASKED)
+    assert not index.is_duplicate("你们家族有没有辈分字？")
+    # 措辞几乎相同，但问的是另一位亲属
+    assert not index.is_duplicate("你对奶奶那边的老家有没有任何印象？")
+
+
+def test_self_and_relative_are_different_subjects():
+    """问本人的问题和问某位亲属的问题不算重复"""
+    index = NearDuplicateIndex(["你的祖籍在哪里？"])
+    assert not index.is_duplicate("你爸爸的祖籍在哪里？")
+    assert NearDuplicateIndex(["你爸爸的祖籍在哪里？"]).max_similarity("你的祖籍在哪里？") == 0.0
+    assert index.is_duplicate("你的籍贯在什么地方？")
+
+
+def test_pick_best_question_skips_paraphrase():
+    service = AIService(gateway_service=object())
+    candidates = ["你父亲有没有常提起他的老家？印象里大概是哪个省市呢？", "你们家族有没有辈分字？"]
+    assert service._pick_best_question(candidates, "兜底", ASKED) == "你们家族有没有辈分字？"
@@ -0,0 +1,41 @@
+"""
+问题库单元测试
+"""
+import asyncio
+
+from app.repositories import question_bank_repository as bank
+from app.repositories.question_bank_repository import personalize, pick_question, profile_bucket
+
+
+def test_profile_bucket():
+    assert profile_bucket({"birth_date": "1990-05-01"}, now_year=2024) == "middle"
+    assert profile_bucket({"birth_date": "2001年3月"}, now_year=2024) == "young"
+    assert profile_bucket({"birth_date": "1950"}, now_year=2024) == "senior"
+    assert profile_bucket({}, now_year=2024) == "unknown"
+
+
+def test_personalize_skips_missing_fields():
+    """模板用到的字段缺失时返回 None，由调用方换下一个模板"""
+    profile = {"name": "陈明", "birth_place": ""}
+    assert personalize("{name}，你家里人常提起老家吗？", profile) == "陈明，你家里人常提起老家吗？"
+    assert personalize("你在{birth_place}长大吗？", profile) is None
+    assert personalize("{unknown}是哪里？", profile) is None
+
+
+def test_pick_question_rotates_and_falls_back_to_unknown_bucket(monkeypatch):
+    """先查用户分组，跳过无法填充或已问过的模板，再查 unknown 分组"""
+    banks = {
+        "middle": ["你在{birth_place}长大吗？", "问过的问题"],
+        "unknown": ["{name}，你的祖籍在哪里？"],
+    }
+    calls = []
+
+    async def rotate(step, tone, bucket):
+        calls.append(bucket)
+        return banks.get(bucket, [])
+
+    monkeypatch.setattr(bank.question_bank_repository, "rotate", rotate)
+    profile = {"name": "陈明", "birth_date": "1980-01-01"}
+    q = asyncio.run(pick_question("self_origin", "warm", profile, avoid=["问过的问题"]))
+    assert q == "陈明，你的祖籍在哪里？"
+    assert calls == ["middle", "unknown"]
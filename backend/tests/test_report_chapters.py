@@ -0,0 +1,130 @@
+"""
+报告分章节并行生成单元测试
+"""
+import asyncio
+
+from app.services.output_service import REPORT_CHAPTERS, OutputService
+
+
+class FlakyGateway:
+    """第二章第一次调用失败，其余章节直接返回"""
+
+    def __init__(self):
+        self.calls = []
+
+    async def llm_chat(self, messages, **kwargs):
+        prompt = messages[0]["content"]
+        title = next(t for _, t, _, _ in REPORT_CHAPTERS if t in prompt)
+        self.calls.append(title)
+        if title == REPORT_CHAPTERS[1][1] and self.calls.count(title) == 1:
+            raise RuntimeError("upstream error")
+        return f"{title}的正文。" * 20
+
+
+def make_service(gateway):
+    return OutputService(ai_service=object(), graph_service=object(), gateway_service=gateway, search_service=object())
+
+
+def test_chapters_retry_individually_and_assemble_in_order():
+    gateway = FlakyGateway()
+    service = make_service(gateway)
+    user_input = {"name": "陈明", "birth_place": "福建泉州"}
+    context = service._report_context(user_input, {"self_origin": "泉州"}, {"possible_families": []})
+
+    chapters = asyncio.run(service._generate_chapters(context, "陈明"))
+    assert [c["key"] for c in chapters] == [key for key, _, _, _ in REPORT_CHAPTERS]
+    assert all(c["status"] == "ok" for c in chapters)
+    # 只有失败的章节被重试
+    assert len(gateway.calls) == len(REPORT_CHAPTERS) + 1
+
+    text = service._assemble_report(user_input, chapters)
+    positions = [text.index(title) for _, title, _, _ in REPORT_CHAPTERS]
+    assert positions == sorted(positions)
+    assert text.startswith("# 一脉相承，薪火相传——陈明家族历史寻根报告")
+
+
+def test_failed_chapter_uses_fallback():
+    service = make_service(FlakyGateway())
+    chapters = [{"key": "origin", "title": REPORT_CHAPTERS[0][1], "text": None, "status": "fallback"}]
+    text = service._assemble_report({"name": "陈明"}, chapters)
+    assert "祖籍/籍贯：待补充" in text
+
+
+def test_only_affected_chapters_are_regenerated():
+    """新增辈分字只重新生成用到 generation 分区的章节，其余章节复用上一版本"""
+    gateway = FlakyGateway()
+    gateway.calls = [REPORT_CHAPTERS[1][1]]  # 跳过第二章的首次失败
+    service = make_service(gateway)
+    user_input = {"name": "陈明"}
+    collected = {"self": {"origin": "泉州", "surname": "陈"}}
+    context = service._report_context(user_input, collected, {"possible_families": []})
+    first = asyncio.run(service._generate_chapters(context, "陈明"))
+
+    gateway.calls = [REPORT_CHAPTERS[1][1]]
+    collected = {"self": {"origin": "泉州", "surname": "陈", "generation_name": "德"}}
+    context = service._report_context(user_input, collected, {"possible_families": []})
+    second = asyncio.run(service._generate_chapters(context, "陈明", previous=first))
+
+    regenerated = {key for key, title, _, _ in REPORT_CHAPTERS if title in gateway.calls[1:]}
+    assert regenerated == {"culture", "personal"}
+    assert [c["text"] for c in second[:2]] == [c["text"] for c in first[:2]]
+
+
+class OkGateway:
+    async def llm_chat(self, messages, **kwargs):
+        prompt = messages[0]["content"]
+        title = next((t for _, t, _, _ in REPORT_CHAPTERS if t in prompt), "正文")
+        return f"{title}的正文。" * 20
+
+
+class FailingSearch:
+    def __init__(self):
+        self.calls = 0
+
+    async def perform_search(self, session_id):
+        self.calls += 1
+        raise RuntimeError("search upstream timeout")
+
+
+def test_failed_search_and_timeline_are_not_reused(monkeypatch):
+    """搜索出错、时间轴为空的报告不记录这两项指纹：下一次重新搜索、重新构建时间轴，而不是整体判定“未变化”"""
+    from app.services import output_service as output_module
+
+    saved = []
+    session = {"_id": "s-1", "collected_data": {"self": {"surname": "陈", "origin": "泉州"}}, "user_input": {"name": "陈明"}}
+
+    async def get(session_id, view="full"):
+        return dict(session, report_version=len(saved)) if saved else dict(session)
+
+    async def update(session_id, fields, upsert=False, unset=None):
+        return None
+
+    async def save_report(session_id, report_data):
+        saved.append(dict(report_data))
+        return len(saved)
+
+    async def load_report(session, include_timeline=False):
+        return {**saved[-1], "version": len(saved)}
+
+    monkeypatch.setattr(output_module.session_repository, "get", get)
+    monkeypatch.setattr(output_module.session_repository, "update", update)
+    monkeypatch.setattr(output_module.report_repository, "save_report", save_report)
+    monkeypatch.setattr(output_module, "load_session_report", load_report)
+
+    search = FailingSearch()
+    service = OutputService(ai_service=object(), graph_service=object(), gateway_service=OkGateway(), search_service=search)
+    timeline_calls = []
+
+    async def broken_timeline(session_id, search_results=None):
+        timeline_calls.append(session_id)
+        raise RuntimeError("timeline failed")
+
+    monkeypatch.setattr(service, "_build_timeline", broken_timeline)
+
+    first = asyncio.run(service.generate_report("s-1"))
+    assert first["input_fingerprints"] == {}
+    assert first["timeline"] == {"events": []}
+
+    second = asyncio.run(service.generate_report("s-1"))
+    assert not second.get("reused")
+    assert search.calls == 2 and len(timeline_calls) == 2
@@ -0,0 +1,145 @@
+"""
+请求取消与时间预算单元测试
+"""
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.config import settings
+from app.dependencies.request_context import RequestCancelled, RequestContext, checkpoint
+from app.dependencies.resources import get_graph_service, get_search_service
+from app.main import app
+from app.services.ai_service import AIService
+from app.utils import deadline
+from app.utils.deadline import DeadlineExceeded
+
+
+class FakeURL:
+    path = "/search/family"
+
+
+class FakeRequest:
+    """第 n 次检查时报告客户端已断开"""
+
+    url = FakeURL()
+
+    def __init__(self, disconnect_after: int):
+        self.checks = 0
+        self.disconnect_after = disconnect_after
+
+    async def is_disconnected(self):
+        self.checks += 1
+        return self.checks >= self.disconnect_after
+
+
+async def _slow_work(state):
+    try:
+        await asyncio.sleep(5)
+    except asyncio.CancelledError:
+        state["cancelled"] = True
+        raise
+
+
+def test_disconnect_cancels_remaining_work(monkeypatch):
+    """客户端断开后取消未完成的工作，抛出 RequestCancelled；之后的检查点也会抛出"""
+    monkeypatch.setattr(settings, "request_disconnect_poll_interval", 0.01)
+    state = {}
+    ctx = RequestContext(FakeRequest(disconnect_after=2))
+    with pytest.raises(RequestCancelled):
+        asyncio.run(ctx.run(_slow_work(state)))
+    assert state == {"cancelled": True}
+    assert ctx.cancel_reason == "disconnected"
+    with pytest.raises(RequestCancelled):
+        ctx.check("after")
+
+
+def test_deadline_expiry_cancels_work(monkeypatch):
+    """时间预算用完时取消工作并抛出 DeadlineExceeded，不必等到下游自己超时"""
+    monkeypatch.setattr(settings, "request_disconnect_poll_interval", 1.0)
+    state = {}
+    ctx = RequestContext(FakeRequest(disconnect_after=1000), timeout=0.05)
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(asyncio.wait_for(ctx.run(_slow_work(state)), 2))
+    assert state == {"cancelled": True}
+    assert ctx.cancel_reason == "deadline"
+
+
+def test_checkpoint_uses_context_budget():
+    """上下文内的检查点按上下文预算判断，下游通过 contextvars 拿到同一个截止时间"""
+    seen = {}
+
+    async def work():
+        seen["remaining"] = deadline.remaining()
+        checkpoint("stage")
+        await asyncio.sleep(0.06)
+        checkpoint("late")
+
+    ctx = RequestContext(timeout=0.05)
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(ctx.run(work()))
+    assert 0 < seen["remaining"] <= 0.05
+    # 不在请求中时，检查点不做任何事
+    checkpoint("idle")
+
+
+class AbortingSearchService:
+    def __init__(self, exc):
+        self.exc = exc
+
+    async def perform_search(self, session_id):
+        raise self.exc
+
+
+@pytest.mark.parametrize("exc, status", [(RequestCancelled("gone"), 499), (DeadlineExceeded("late"), 504)])
+def test_exception_handler_maps_status(exc, status):
+    """路由直接抛出取消 / 超时异常，由应用统一转换为 499 / 504"""
+    app.dependency_overrides[get_search_service] = lambda: AbortingSearchService(exc)
+    app.dependency_overrides[get_graph_service] = lambda: object()
+    try:
+        response = TestClient(app).get("/search/family", params={"session_id": "s-1"})
+        assert response.status_code == status
+        assert response.json() == {"detail": str(exc)}
+    finally:
+        app.dependency_overrides.pop(get_search_service, None)
+        app.dependency_overrides.pop(get_graph_service, None)
+
+
+class ExpiredGateway:
+    """LLM 调用时请求预算已经用完"""
+
+    def __init__(self):
+        self.calls = []
+
+    async def llm_chat(self, messages, **kwargs):
+        self.calls.append(kwargs["call_site"])
+        raise DeadlineExceeded(kwargs["call_site"])
+
+
+class BudgetAIService(AIService):
+    """不连接 Redis / MongoDB：记录写回的状态"""
+
+    def __init__(self, gateway):
+        super().__init__(gateway_service=gateway)
+        self._llm_ready = True
+        self.saved = []
+
+    async def _load_state(self, session_id):
+        return {"session_id": session_id, "step": "self_origin", "collected_data": {}, "question_count": 0}
+
+    async def _save_state(self, session_id, state):
+        self.saved.append(state)
+
+
+def test_deadline_in_llm_call_aborts_turn_without_saving():
+    """抽取时预算用完：异常直接传出，不把回答记为未解析、不生成兜底追问、不写回状态"""
+    gateway = ExpiredGateway()
+    service = BudgetAIService(gateway)
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(service.process_answer("s-1", "福建泉州"))
+    assert gateway.calls == ["extract_family_info"] and service.saved == []
+
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(service._generate_candidate_questions("祖籍", {}))
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(service._generate_soft_clarify("你的祖籍在哪里？", "不太清楚", "祖籍"))
@@ -0,0 +1,18 @@
+"""
+序列化层单元测试
+"""
+from datetime import datetime
+
+from app.utils import serialization
+
+
+def test_roundtrip_keeps_chinese_and_handles_unknown_types():
+    """中文不转义；非字符串键、集合、datetime 等对象可以序列化"""
+    payload = {"name": "张三", 1: "一", "tags": {"祠堂"}, "at": datetime(2024, 1, 1)}
+    raw = serialization.dumps(payload)
+    assert "张三" in raw
+    data = serialization.loads(serialization.dumps_bytes(payload))
+    assert data["name"] == "张三"
+    assert data["1"] == "一"
+    assert data["tags"] == ["祠堂"]
+    assert data["at"].startswith("2024-01-01")
@@ -0,0 +1,33 @@
+"""
+会话列表 keyset 分页单元测试
+"""
+import pytest
+from app.repositories.session_repository import (
+    InvalidCursor,
+    decode_cursor,
+    encode_cursor,
+    keyset_query,
+)
+
+
+def test_cursor_roundtrip():
+    """游标可以还原出最后一条会话的 (created_at, _id)"""
+    cursor = encode_cursor({"_id": "s-1", "created_at": "2024-01-01T00:00:00"})
+    assert decode_cursor(cursor) == ("2024-01-01T00:00:00", "s-1")
+    with pytest.raises(InvalidCursor):
+        decode_cursor("not-a-cursor")
+
+
+def test_keyset_query_after_cursor():
+    """游标之后的条件：更早创建，或同一时间 _id 更小，或没有创建时间"""
+    assert keyset_query({"archived": True}, None) == {"archived": True}
+    cursor = encode_cursor({"_id": "s-1", "created_at": "2024-01-01"})
+    query = keyset_query({"archived": True}, cursor)
+    assert query["$and"][0] == {"archived": True}
+    assert query["$and"][1]["$or"] == [
+        {"created_at": {"$lt": "2024-01-01"}},
+        {"created_at": "2024-01-01", "_id": {"$lt": "s-1"}},
+        {"created_at": None},
+    ]
+    legacy = encode_cursor({"_id": "s-0"})
+    assert keyset_query({}, legacy) == {"created_at": None, "_id": {"$lt": "s-0"}}
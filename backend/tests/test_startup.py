@@ -0,0 +1,70 @@
+"""
+启动耗时测试
+导入 app.main 时不应加载 openai / motor / redis / httpx / pymongo / reportlab，
+并且导入耗时不超过预算（可通过 STARTUP_IMPORT_BUDGET 环境变量调整，单位秒）；
+预热各项都受 warmup_timeout 约束
+"""
+import asyncio
+import json
+import os
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ("openai", "motor", "redis", "httpx", "pymongo", "reportlab")
+
+_PROBE = r"""
+import json, sys, time
+t0 = time.perf_counter()
+import app.main
+print(json.dumps({"import": time.perf_counter() - t0, "loaded": [m for m in %r if m in sys.modules]}))
+""" % (HEAVY_MODULES,)
+
+
+def test_import_is_lazy_and_within_budget():
+    """导入应用时不加载重依赖，且在启动预算内完成"""
+    out = subprocess.run(
+        [sys.executable, "-c", _PROBE],
+        cwd=BACKEND_DIR,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    result = json.loads(out.stdout.strip().splitlines()[-1])
+    assert result["loaded"] == []
+    assert result["import"] < float(os.environ.get("STARTUP_IMPORT_BUDGET", "5.0"))
+
+
+class FakeStore:
+    async def command(self, name):
+        return {"ok": 1}
+
+    async def ping(self):
+        return True
+
+
+def test_slow_index_creation_does_not_block_startup(monkeypatch):
+    """MongoDB 建索引很慢时，启动在 warmup_timeout 后继续"""
+    from app.config import settings
+    from app.dependencies import resources as resources_module
+
+    async def store():
+        return FakeStore()
+
+    async def slow_indexes():
+        await asyncio.sleep(5)
+
+    async def no_client():
+        return None
+
+    monkeypatch.setattr(settings, "warmup_on_startup", True)
+    monkeypatch.setattr(settings, "warmup_timeout", 0.05)
+    monkeypatch.setattr(settings, "question_bank_enabled", False)
+    for name in ("get_mongodb_db", "get_redis", "get_redis_binary"):
+        monkeypatch.setattr(resources_module, name, store)
+    monkeypatch.setattr(resources_module, "get_http_client", no_client)
+    monkeypatch.setattr(resources_module.session_repository, "ensure_indexes", slow_indexes)
+
+    resources = resources_module.Resources()
+    monkeypatch.setattr(resources, "gateway_service", type("G", (), {"warm_up": lambda self: None})())
+    asyncio.run(asyncio.wait_for(resources.startup(), 2))
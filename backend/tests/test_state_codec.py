@@ -0,0 +1,33 @@
+"""
+会话状态编码单元测试
+"""
+import pytest
+from app.utils import serialization, state_codec
+
+
+STATE = {
+    "session_id": "s-1",
+    "step": "father_origin",
+    "asked_questions": ["你爸爸常提起过他的老家吗？你印象里大概在哪个省市？"] * 20,
+    "collected_data": {"self": {"origin": "湖南湘潭"}, "_unparsed": []},
+    "question_count": 3,
+}
+
+
+@pytest.mark.parametrize("encoding", state_codec.available_encodings())
+@pytest.mark.parametrize("compression", state_codec.available_compressions())
+def test_roundtrip(encoding, compression):
+    """所有可用的编码 / 压缩组合都能还原状态，超过阈值时确实压缩"""
+    raw = state_codec.encode(STATE, encoding=encoding, compression=compression, threshold=64)
+    assert state_codec.decode(raw) == STATE
+    if compression != "none":
+        assert len(raw) < len(serialization.dumps_bytes(STATE))
+
+
+def test_legacy_json_and_unknown_version():
+    """无头的旧 JSON 可以读取；未知版本号报错"""
+    legacy = serialization.dumps(STATE)
+    assert state_codec.decode(legacy) == STATE
+    assert state_codec.decode(legacy.encode("utf-8")) == STATE
+    with pytest.raises(state_codec.StateCodecError):
+        state_codec.decode(state_codec.MAGIC + bytes((99, 0)) + b"{}")
@@ -0,0 +1,71 @@
+"""
+本地时间轴构建单元测试
+"""
+import asyncio
+
+from app.services import output_service as output_module
+from app.services.output_service import OutputService
+from app.services.timeline_builder import TimelineBuilder
+
+
+USER_INPUT = {"name": "陈明", "birth_date": "1990-05-01"}
+COLLECTED = {
+    "self": {"surname": "陈", "origin": "福建泉州"},
+    "_unparsed": [{"q": "老家的事？", "a": "听说乾隆三十年从河南固始迁到泉州。爷爷民国三十年出生"}],
+}
+SEARCH = {
+    "possible_families": [{
+        "family_name": "颍川陈氏",
+        "famous_figures": [{"name": "陈元光", "dynasty_period": "唐朝", "achievements": "开漳圣王"}],
+    }],
+    "family_histories": {"颍川陈氏": {"history": [{"title": "陈氏族谱", "snippet": "明洪武二年，陈氏一支入闽。", "url": "u"}]}},
+}
+
+
+class RecordingGateway:
+    def __init__(self, response='{"events": [{"date": "1368", "title": "补充事件", "type": "event"}]}'):
+        self.prompts = []
+        self.response = response
+
+    async def llm_chat(self, messages, **kwargs):
+        self.prompts.append((kwargs.get("call_site"), messages[0]["content"]))
+        return self.response
+
+
+def build(monkeypatch, collected, search, gateway):
+    async def get(session_id, view=None):
+        return {"user_input": USER_INPUT, "collected_data": collected}
+
+    monkeypatch.setattr(output_module.session_repository, "get", get)
+    service = OutputService(ai_service=object(), graph_service=object(), gateway_service=gateway, search_service=object())
+    return asyncio.run(service._build_timeline("s-1", search_results=search))
+
+
+def test_local_events_are_dated_from_collected_facts_and_search():
+    events = TimelineBuilder().finalize(TimelineBuilder().local_events(USER_INPUT, COLLECTED, SEARCH))
+    by_title = {e["title"]: e for e in events}
+    assert by_title["迁徙记录"]["date"] == "1765" and by_title["迁徙记录"]["period"] == "清·乾隆三十年"
+    assert by_title["家族记忆"]["year"] == 1941
+    assert by_title["陈元光（颍川陈氏）"]["date"] == "唐朝"
+    assert by_title["陈氏族谱"]["period"] == "明·洪武二年"
+    assert [e["year"] for e in events] == sorted(e["year"] for e in events)
+
+
+def test_llm_not_called_when_coverage_is_sufficient(monkeypatch):
+    gateway = RecordingGateway()
+    timeline = build(monkeypatch, COLLECTED, SEARCH, gateway)
+    assert gateway.prompts == []
+    assert timeline["coverage"] == 1.0
+    assert all(e["source"] != "llm" for e in timeline["events"])
+
+
+def test_llm_fills_only_listed_gaps_once(monkeypatch):
+    gateway = RecordingGateway()
+    timeline = build(monkeypatch, {"self": {"origin": "福建泉州"}}, {}, gateway)
+    assert len(gateway.prompts) == 1
+    call_site, prompt = gateway.prompts[0]
+    assert call_site == "timeline_gaps"
+    assert "历史名人" in prompt and "家族迁徙" in prompt
+    filled = [e for e in timeline["events"] if e["source"] == "llm"]
+    assert filled and filled[0]["period"] == "明·洪武元年"
+    assert len(timeline["events"]) >= 3
@@ -0,0 +1,98 @@
+"""
+自适应超时策略单元测试
+"""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from app.services import gateway_service as gateway_module
+from app.services.gateway_service import GatewayService
+from app.utils import deadline
+from app.utils.latency_tracker import LatencyTracker
+from app.utils.timeout_policy import TimeoutBounds, TimeoutPolicy
+
+
+def test_default_until_enough_samples():
+    """样本不足时使用默认超时，之后按分位数 × 系数并限制在上下限内"""
+    tracker = LatencyTracker(min_samples=5)
+    policy = TimeoutPolicy(tracker, percentile=0.99, multiplier=2.0, bounds={"site": TimeoutBounds(60.0, 5.0, 30.0)})
+    assert policy.timeout_for("site") == 60.0
+    for _ in range(5):
+        tracker.record("site", 4.0)
+    assert policy.timeout_for("site") == 8.0
+    for _ in range(5):
+        tracker.record("site", 100.0)
+    assert policy.timeout_for("site") == 30.0
+
+
+def test_deadline_budget_caps_timeout():
+    """请求时间预算会收紧超时，预算用完时抛出 DeadlineExceeded"""
+    policy = TimeoutPolicy(LatencyTracker())
+    with deadline.deadline_scope(2.0):
+        assert policy.timeout_for("report") <= 2.0
+        with deadline.deadline_scope(100.0):
+            assert policy.timeout_for("report") <= 2.0
+    with deadline.deadline_scope(0):
+        with pytest.raises(deadline.DeadlineExceeded):
+            policy.timeout_for("report")
+
+
+def test_budget_limited_timeouts_are_not_recorded():
+    """被请求预算截短的超时不计入延迟分布；学习到的超时耗尽时才记录"""
+    tracker = LatencyTracker(min_samples=1)
+    policy = TimeoutPolicy(tracker, bounds={"site": TimeoutBounds(30.0, 5.0, 60.0)})
+    with deadline.deadline_scope(1.0):
+        timeout = policy.timeout_for("site")
+    assert timeout <= 1.0
+    policy.record_timeout("site", timeout)
+    assert tracker.percentile("site", 0.99) is None
+
+    policy.record_timeout("site", policy.timeout_for("site"))
+    assert tracker.percentile("site", 0.99) == 30.0
+
+
+class StallingStream:
+    """首包之后不再返回数据的流"""
+
+    def __init__(self):
+        self.closed = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if not hasattr(self, "sent"):
+            self.sent = True
+            return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content="你"))])
+        await asyncio.sleep(5)
+
+    async def close(self):
+        self.closed = True
+
+
+def test_stream_stalled_after_first_chunk_times_out(monkeypatch):
+    """流在首包后停滞时按剩余时间超时，而不是等到下一段到达"""
+    stream = StallingStream()
+
+    async def create(**kwargs):
+        return SimpleNamespace(headers={}, parse=lambda: stream)
+
+    client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(
+        with_raw_response=SimpleNamespace(create=create))))
+    gateway = GatewayService()
+    monkeypatch.setattr(gateway, "_ensure_key_pool", lambda: None)
+    monkeypatch.setattr(gateway, "_client_for_key", lambda key: client)
+    monkeypatch.setattr(gateway_module.deepseek_key_pool, "acquire", lambda: "k")
+    monkeypatch.setattr(gateway_module.deepseek_key_pool, "release", lambda key, **kwargs: None)
+    monkeypatch.setattr(gateway_module.timeout_policy, "timeout_for", lambda site, timeout=None: 0.05)
+
+    async def consume():
+        parts = []
+        async for delta in gateway.llm_chat_stream([], call_site="stream_test"):
+            parts.append(delta)
+        return parts
+
+    # 由网关自己的超时打断（外层的 2 秒只是兜底）
+    with pytest.raises(TimeoutError, match="DeepSeek"):
+        asyncio.run(asyncio.wait_for(consume(), 2))
+    assert stream.closed
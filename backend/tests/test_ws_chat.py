@@ -0,0 +1,108 @@
+"""
+WebSocket 问答通道单元测试
+"""
+import pytest
+from fastapi import WebSocketDisconnect
+from fastapi.testclient import TestClient
+
+from app.dependencies.resources import get_ai_service
+from app.main import app
+from app.services.ai_service import AIService
+
+
+class FakeAIService(AIService):
+    """不连接 Redis / LLM：状态只读一次，每轮流式输出下一个问题"""
+
+    def __init__(self):
+        super().__init__(gateway_service=object())
+        self.loads = 0
+        self.saved = []
+
+    async def _load_state(self, session_id):
+        self.loads += 1
+        if session_id != "s-1":
+            raise ValueError(f"Session {session_id} not found")
+        return {"session_id": session_id, "step": "self_origin", "question_count": 0}
+
+    async def _save_state(self, session_id, state):
+        self.saved.append(dict(state))
+
+    async def _persist_mongo(self, session_id, collected):
+        pass
+
+    async def _extract_family_info(self, answer, current_question, existing_data):
+        return {"self": {"origin": answer}}
+
+    async def _stream_question(self, topic, collected_data, avoid, on_token):
+        for part in ("你爸爸", "的老家在哪？"):
+            await on_token(part)
+        return "你爸爸的老家在哪？"
+
+
+def test_websocket_streams_question_without_reloading_state():
+    """连接期间只读一次状态；下一个问题先以 token 推送，再发送完整问题"""
+    service = FakeAIService()
+    app.dependency_overrides[get_ai_service] = lambda: service
+    try:
+        with TestClient(app).websocket_connect("/ai/ws/s-1") as ws:
+            first = ws.receive_json()
+            assert first["type"] == "question" and first["step"] == "self_origin"
+
+            ws.send_json({"answer": "福建泉州"})
+            tokens = [ws.receive_json(), ws.receive_json()]
+            assert [t["text"] for t in tokens] == ["你爸爸", "的老家在哪？"]
+            final = ws.receive_json()
+            assert final["type"] == "question"
+            assert final["question"] == "你爸爸的老家在哪？"
+
+            ws.send_text("广东梅州")
+            while (message := ws.receive_json())["type"] == "token":
+                pass
+            assert message["type"] == "question"
+        assert service.loads == 1
+        assert len(service.saved) == 2
+        assert service.saved[-1]["question_count"] == 2
+    finally:
+        app.dependency_overrides.pop(get_ai_service, None)
+
+
+def test_websocket_unknown_session():
+    """会话不存在时返回错误并关闭连接"""
+    service = FakeAIService()
+    app.dependency_overrides[get_ai_service] = lambda: service
+    try:
+        with TestClient(app).websocket_connect("/ai/ws/missing") as ws:
+            message = ws.receive_json()
+            assert message["type"] == "error" and message["code"] == 404
+    finally:
+        app.dependency_overrides.pop(get_ai_service, None)
+
+
+class ExpiringAIService(FakeAIService):
+    """本轮处理失败，且重新读取状态时会话已过期"""
+
+    async def process_answer(self, session_id, answer, state=None, on_token=None):
+        self.expired = True
+        raise RuntimeError("extract failed")
+
+    async def _load_state(self, session_id):
+        if getattr(self, "expired", False):
+            raise ValueError(f"Session {session_id} not found")
+        return await super()._load_state(session_id)
+
+
+def test_websocket_expired_state_after_error():
+    """本轮失败后重新读取状态时会话已过期：先发送本轮错误，再发送 404 并关闭连接"""
+    service = ExpiringAIService()
+    app.dependency_overrides[get_ai_service] = lambda: service
+    try:
+        with TestClient(app).websocket_connect("/ai/ws/s-1") as ws:
+            ws.receive_json()
+            ws.send_json({"answer": "福建泉州"})
+            assert ws.receive_json()["code"] == 500
+            assert ws.receive_json()["code"] == 404
+            with pytest.raises(WebSocketDisconnect) as closed:
+                ws.receive_json()
+            assert closed.value.code == 4404
+    finally:
+        app.dependency_overrides.pop(get_ai_service, None)